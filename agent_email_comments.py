@@ -1,5 +1,10 @@
 import json
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from deck_model import DeckDocument
+from comment_evaluation import prepare_evaluation, unevaluated
+from deadline import Deadline
+from comment_stream import EMAIL_STREAMING, CommentStreamParser, EvaluationQueue, text_deltas
+from workflow_engine import AgentOutput, Workflow, WorkflowRun, agent_node, run_agent, user_message
 from agents import RunContextWrapper, Agent, ModelSettings, TResponseInputItem, Runner, RunConfig, trace
 
 class EvaluateCommentsSchema__CommentsItem(BaseModel):
@@ -108,64 +113,127 @@ class WorkflowInput(BaseModel):
   input_as_text: str
 
 
-# Main code entrypoint
-async def run_workflow(workflow_input: WorkflowInput):
-  with trace("email_comments_agent"):
-    workflow = workflow_input.model_dump()
-    parsed_input = json.loads(workflow["input_as_text"])
-    state = {
-      "email_text": parsed_input.get("email_text") or "",
-      "original_doc": json.dumps(parsed_input.get("original_doc", {}), indent=2),
-      "revised_doc": json.dumps(parsed_input.get("revised_doc", {}), indent=2)
-    }
-    conversation_history: list[TResponseInputItem] = [
-      {
-        "role": "user",
-        "content": [
-          {
-            "type": "input_text",
-            "text": state["email_text"]
-          }
-        ]
-      }
-    ]
-    email_comments_result_temp = await Runner.run(
-      email_comments,
-      input=[
-        *conversation_history
-      ],
-      run_config=RunConfig(trace_metadata={
-        "__trace_source__": "agent-builder",
-        "workflow_id": "wf_691becdb885c81909c25a55a63af7fb7011e9c4b4016aaf8"
-      }),
-      context=EmailCommentsContext(state_email_text=state["email_text"])
-    )
+# Requested edits land in visible content; speaker notes are not checked.
+DECK_FIELDS = ("text", "tables", "charts")
 
-    conversation_history.extend([item.to_input_item() for item in email_comments_result_temp.new_items])
-
-    email_comments_result = {
-      "output_text": email_comments_result_temp.final_output.json(),
-      "output_parsed": email_comments_result_temp.final_output.model_dump()
-    }
-    evaluate_comments_result_temp = await Runner.run(
-      evaluate_comments,
-      input=[
-        *conversation_history
-      ],
-      run_config=RunConfig(trace_metadata={
-        "__trace_source__": "agent-builder",
-        "workflow_id": "wf_691becdb885c81909c25a55a63af7fb7011e9c4b4016aaf8"
-      }),
-      context=EvaluateCommentsContext(state_original_doc=state["original_doc"], state_revised_doc=state["revised_doc"])
-    )
 
-    conversation_history.extend([item.to_input_item() for item in evaluate_comments_result_temp.new_items])
+WORKFLOW_ID = "wf_691becdb885c81909c25a55a63af7fb7011e9c4b4016aaf8"
+
+
+async def extract_stage(email_text: str) -> AgentOutput:
+  return await run_agent(email_comments, [user_message(email_text)], WORKFLOW_ID, EmailCommentsContext(state_email_text=email_text))
+
 
-    evaluate_comments_result = {
-      "output_text": evaluate_comments_result_temp.final_output.json(),
-      "output_parsed": evaluate_comments_result_temp.final_output.model_dump()
-    }
-    return evaluate_comments_result["output_parsed"]
+async def evaluate_comment_batch(comments: list, email_text: str, original_doc: DeckDocument, revised_doc: DeckDocument, deferred: list | None = None) -> list:
+  # Only the slides the comments reference (aligned across the two decks) go to the evaluator.
+  # With `deferred`, comments that would need both whole decks are set aside there for one final batch.
+  evaluation = prepare_evaluation(comments, original_doc, revised_doc, DECK_FIELDS, defer_whole_deck=deferred is not None)
+  if deferred is not None:
+    deferred.extend(evaluation.deferred)
+  if not evaluation.comments:
+    # Every comment was settled locally; nothing left for the model.
+    return evaluation.merge()["comments"]
+  result = await run_agent(
+    evaluate_comments,
+    [user_message(email_text), *evaluation.input_items()],
+    WORKFLOW_ID,
+    EvaluateCommentsContext(state_original_doc=evaluation.original_doc, state_revised_doc=evaluation.revised_doc)
+  )
+  return evaluation.merge(result.parsed)["comments"]
+
+
+async def evaluate_stage(extract: AgentOutput, email_text: str, original_doc: DeckDocument, revised_doc: DeckDocument) -> dict:
+  return {"comments": await evaluate_comment_batch(extract.parsed["comments"], email_text, original_doc, revised_doc)}
+
+
+async def stream_stage(email_text: str, original_doc: DeckDocument, revised_doc: DeckDocument, queues: list[EvaluationQueue]) -> dict:
+  # Each comment is queued for evaluation as soon as its JSON object is complete (see comment_stream.py).
+  # The queue is recorded in `queues` so a run stopped by its deadline can still report the verdicts it got.
+  deferred: list = []
+  queue = EvaluationQueue(lambda batch: evaluate_comment_batch(batch, email_text, original_doc, revised_doc, deferred))
+  queues.append(queue)
+  email_comments_result_temp = Runner.run_streamed(
+    email_comments,
+    input=[
+      user_message(email_text)
+    ],
+    run_config=RunConfig(trace_metadata={
+      "__trace_source__": "agent-builder",
+      "workflow_id": WORKFLOW_ID
+    }),
+    context=EmailCommentsContext(state_email_text=email_text)
+  )
+  parser = CommentStreamParser()
+  queued = set()
+  try:
+    async for delta in text_deltas(email_comments_result_temp):
+      for item in parser.feed(delta):
+        try:
+          comment = EmailCommentsSchema__CommentsItem(**item).model_dump()
+        except ValidationError:
+          continue  # picked up from the final output below
+        queued.add(comment["id"])
+        await queue.put(comment)
+    # Anything the incremental parser could not take is in the validated final output.
+    for comment in email_comments_result_temp.final_output.model_dump()["comments"]:
+      if comment["id"] not in queued:
+        queued.add(comment["id"])
+        await queue.put(comment)
+  except BaseException:
+    queue.cancel()
+    email_comments_result_temp.cancel()
+    raise
+  results = await queue.close()
+  if deferred:
+    # Comments that need both whole decks go to the evaluator together, once.
+    results = queue.in_order(results + await evaluate_comment_batch(deferred, email_text, original_doc, revised_doc))
+  return {"comments": results}
+
+
+def email_workflow() -> Workflow:
+  if EMAIL_STREAMING:
+    # Extraction and evaluation overlap inside one node. No retry: it would re-stream the
+    # extraction and evaluate the batches that already came back a second time.
+    return Workflow("email_comments", [
+      agent_node("evaluate", stream_stage, ("email_text", "original_doc", "revised_doc", "queues"), retries=0),
+    ])
+  return Workflow("email_comments", [
+    agent_node("extract", extract_stage, ("email_text",)),
+    agent_node("evaluate", evaluate_stage, ("extract", "email_text", "original_doc", "revised_doc")),
+  ])
+
+
+def partial_output(run: WorkflowRun) -> dict:
+  # Verdicts that came back before the run stopped; the other extracted comments come back unclear.
+  if run.outputs["queues"]:
+    queue = run.outputs["queues"][-1]
+    comments = queue.in_order(queue.results + unevaluated(queue.pending(), run.stopped))
+  elif run.outputs.get("extract") is not None:
+    comments = unevaluated(run.outputs["extract"].parsed["comments"], run.stopped)
+  else:
+    comments = []
+  return {"comments": comments, "partial": run.partial_info()}
+
+
+# Main code entrypoint
+async def run_workflow(workflow_input: WorkflowInput | None = None, email_text: str | None = None, original_doc: DeckDocument | None = None, revised_doc: DeckDocument | None = None, deadline: Deadline | None = None):
+  with trace("email_comments_agent"):
+    if workflow_input is not None:
+      workflow = workflow_input.model_dump()
+      parsed_input = json.loads(workflow["input_as_text"])
+      email_text = parsed_input.get("email_text")
+      original_doc = DeckDocument.from_struct(parsed_input.get("original_doc"))
+      revised_doc = DeckDocument.from_struct(parsed_input.get("revised_doc"))
+    run = await email_workflow().run(
+      deadline=deadline,
+      email_text=email_text or "",
+      original_doc=DeckDocument.coerce(original_doc),
+      revised_doc=DeckDocument.coerce(revised_doc),
+      queues=[]
+    )
+    if run.partial:
+      return partial_output(run)
+    return run.outputs["evaluate"]
 
 
 # Alias expected by agent_runner
@@ -1,57 +1,112 @@
 from __future__ import annotations
 
 import asyncio
-import json
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Union
 
-from agent_workflow import WorkflowInput as TagsWorkflowInput, run_agent_workflow as _run_tags_workflow
-from agent_email_comments import WorkflowInput as EmailWorkflowInput, run_agent_workflow as _run_email_workflow
-from agent_tick_tie_workflow import WorkflowInput as TickTieWorkflowInput, run_workflow as _run_tick_tie_workflow
+from agent_workflow import run_agent_workflow as _run_tags_workflow
+from agent_email_comments import run_agent_workflow as _run_email_workflow
+from agent_tick_tie_workflow import run_workflow as _run_tick_tie_workflow
+from boilerplate import STRIP_BOILERPLATE, TICK_TIE_STRIP_BOILERPLATE, strip_boilerplate
+from deadline import Deadline
+from deck_model import DeckDocument
+from planner import EMAIL_COMMENTS, TAGS, TICK_TIE, ExecutionPlan, plan_for_email
+from slide_index import index_decks
 
+DeckLike = Union[DeckDocument, Dict[str, Any]]
 
-def _run_tags(email_text: str, original_doc: Dict[str, Any], revised_doc: Dict[str, Any]) -> Dict[str, Any]:
-    payload = {
-        "original_doc": original_doc,
-        "revised_doc": revised_doc,
-    }
-    wf_input = TagsWorkflowInput(input_as_text=json.dumps(payload))
-    return asyncio.run(_run_tags_workflow(wf_input)) or {}
 
+def _run_tags(email_text: str, original_doc: DeckDocument, revised_doc: DeckDocument, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    return asyncio.run(_run_tags_workflow(original_doc=original_doc, revised_doc=revised_doc, deadline=deadline)) or {}
 
-def _run_email_comments(email_text: str, original_doc: Dict[str, Any], revised_doc: Dict[str, Any]) -> Dict[str, Any]:
-    payload = {
-        "email_text": email_text,
-        "original_doc": original_doc,
-        "revised_doc": revised_doc,
-    }
-    wf_input = EmailWorkflowInput(input_as_text=json.dumps(payload))
-    return asyncio.run(_run_email_workflow(wf_input)) or {}
 
+def _run_email_comments(email_text: str, original_doc: DeckDocument, revised_doc: DeckDocument, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    return asyncio.run(_run_email_workflow(
+        email_text=email_text,
+        original_doc=original_doc,
+        revised_doc=revised_doc,
+        deadline=deadline,
+    )) or {}
 
-def _run_tick_tie(email_text: str, revised_doc: Dict[str, Any]) -> Dict[str, Any]:
-    payload = {
-        "email_text": email_text,
-        "revised_doc": revised_doc,
-    }
-    wf_input = TickTieWorkflowInput(input_as_text=json.dumps(payload))
-    return asyncio.run(_run_tick_tie_workflow(wf_input)) or {}
+
+def _run_tick_tie(email_text: str, revised_doc: DeckDocument, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    return asyncio.run(_run_tick_tie_workflow(email_text=email_text, revised_doc=revised_doc, deadline=deadline)) or {}
+
+
+def _strip(doc: DeckDocument, label: str) -> DeckDocument:
+    stripped, report = strip_boilerplate(doc)
+    if report.lines:
+        print(
+            f"Boilerplate ({label}): {len(report.lines)} repeated line(s) kept once, "
+            f"~{report.tokens_saved} tokens saved per prompt"
+        )
+    return stripped
 
 
 def run_agent_workflow(
     email_text: str,
-    original_doc: Dict[str, Any],
-    revised_doc: Dict[str, Any],
+    original_doc: DeckLike,
+    revised_doc: DeckLike,
     run_tick_tie: bool = False,
+    plan: Optional[ExecutionPlan] = None,
+    deadline: Optional[Deadline] = None,
 ) -> Dict[str, Any]:
-    tags_output = _run_tags(email_text, original_doc, revised_doc)
-    email_output = _run_email_comments(email_text, original_doc, revised_doc)
+    """
+    Run the workflows in `plan` (by default, planned from the email text plus
+    `run_tick_tie`). Skipped workflows come back as empty results and are
+    listed with their reason under "skipped".
+
+    With a `deadline`, workflows still running when it passes (or when it is
+    cancelled) return what they have; they are listed under "partial" with
+    their unfinished stages. Workflows not yet started are skipped.
+    """
+    # Documents are shared in-process; each serialization is computed once and cached.
+    original_doc = DeckDocument.coerce(original_doc)
+    revised_doc = DeckDocument.coerce(revised_doc)
+    if plan is None:
+        plan = plan_for_email(email_text, has_original=len(original_doc) > 0, run_tick_tie=run_tick_tie)
+
+    prompt_original, prompt_revised = original_doc, revised_doc
+    if STRIP_BOILERPLATE and (plan.runs(TAGS) or plan.runs(EMAIL_COMMENTS) or TICK_TIE_STRIP_BOILERPLATE):
+        prompt_original = _strip(original_doc, "original")
+        prompt_revised = _strip(revised_doc, "revised")
+    if plan.runs(TAGS) or plan.runs(EMAIL_COMMENTS):
+        # Used by comment evaluation to place comments that name no slide.
+        index_decks(prompt_original, prompt_revised)
+
+    skipped = dict(plan.skipped)
+    partial: Dict[str, Any] = {}
+
+    def runs(workflow: str) -> bool:
+        if not plan.runs(workflow):
+            return False
+        if deadline is not None and deadline.expired():
+            skipped[workflow] = deadline.reason()
+            return False
+        return True
+
+    def finished(workflow: str, output: Dict[str, Any]) -> Dict[str, Any]:
+        if "partial" in output:
+            partial[workflow] = output.pop("partial")
+        return output
+
+    tags_output: Dict[str, Any] = {}
+    if runs(TAGS):
+        tags_output = finished(TAGS, _run_tags(email_text, prompt_original, prompt_revised, deadline))
+
+    email_output: Dict[str, Any] = {}
+    if runs(EMAIL_COMMENTS):
+        email_output = finished(EMAIL_COMMENTS, _run_email_comments(email_text, prompt_original, prompt_revised, deadline))
 
-    tick_output: Dict[str, Any] = {}
-    if run_tick_tie:
-        tick_output = _run_tick_tie(email_text, revised_doc)
+    tick_output: Optional[Dict[str, Any]] = None
+    if runs(TICK_TIE):
+        tick_revised = prompt_revised if TICK_TIE_STRIP_BOILERPLATE else revised_doc
+        tick_output = finished(TICK_TIE, _run_tick_tie(email_text, tick_revised, deadline))
 
     return {
         "tags": tags_output.get("comments", []),
         "email_comments": email_output.get("comments", []),
         "tick_tie": tick_output,
+        "skipped": skipped,
+        "partial": partial,
+        "plan": plan.to_dict(),
     }
@@ -1,6 +1,9 @@
 import json
 from pydantic import BaseModel
-from agents import RunContextWrapper, Agent, ModelSettings, TResponseInputItem, Runner, RunConfig, trace
+from deck_model import DeckDocument
+from deadline import Deadline
+from workflow_engine import AgentOutput, Workflow, agent_node, run_agent, user_message
+from agents import RunContextWrapper, Agent, ModelSettings, TResponseInputItem, trace
 
 class ExtractValuesSchema__FactsItem(BaseModel):
   id: str
@@ -51,7 +54,7 @@ def extract_values_instructions(run_context: RunContextWrapper[ExtractValuesCont
   return f"""You are helping with a “tick and tie” consistency check on a financial slide deck. 
 
 You are helping with a “tick and tie” consistency check on a financial slide deck.
-You are given the full deck as structured data: an array of slides, each with an index (page number) and text (all visible text on that slide).
+You are given the full deck as structured data: an array of slides, each with an index (page number), text (the body text on that slide) and, where present, tables (table cell text) and charts (chart titles and data labels).
 Your job: Scan all slides from  {state_revised_doc} and extract every numeric statement that looks like a financial or operational metric worth checking for consistency across the deck. If a metric is mentioned in {state_email_text}, please carefully check through the deck to make sure that everything matches for that metrics. Numbers will often be data labels on charts, in tables outputted from excel and embedded in chunks of text. Check all potential sources  thoroughly.
 
 Examples include (but are not limited to): Revenue, revenue growth, sales, volume, EBITDA, EBITDA margin, EBIT, margins, EPS, share price, valuation multiples, Leverage, net debt, cash and capex.
@@ -147,59 +150,43 @@ class WorkflowInput(BaseModel):
   input_as_text: str
 
 
-# Main code entrypoint
-async def run_workflow(workflow_input: WorkflowInput):
-  with trace("Bifocal_Tick and Tie"):
-    workflow = workflow_input.model_dump()
-    parsed_input = json.loads(workflow["input_as_text"])
-    state = {
-      "email_text": parsed_input.get("email_text") or "",
-      "revised_doc": json.dumps(parsed_input.get("revised_doc", {}), indent=2)
-    }
-    conversation_history: list[TResponseInputItem] = [
-      {
-        "role": "user",
-        "content": [
-          {
-            "type": "input_text",
-            "text": state["email_text"]
-          }
-        ]
-      }
-    ]
-    extract_values_result_temp = await Runner.run(
-      extract_values,
-      input=[
-        *conversation_history
-      ],
-      run_config=RunConfig(trace_metadata={
-        "__trace_source__": "agent-builder",
-        "workflow_id": "wf_6918f4d9a0fc819087837d1e3949b90308dbf8fd4d026c61"
-      }),
-      context=ExtractValuesContext(state_revised_doc=state["revised_doc"], state_email_text=state["email_text"])
-    )
+# Figures to tie live in body text, tables and chart labels, not in speaker notes.
+DECK_FIELDS = ("text", "tables", "charts")
 
-    conversation_history.extend([item.to_input_item() for item in extract_values_result_temp.new_items])
-
-    extract_values_result = {
-      "output_text": extract_values_result_temp.final_output.json(),
-      "output_parsed": extract_values_result_temp.final_output.model_dump()
-    }
-    check_across_document_result_temp = await Runner.run(
-      check_across_document,
-      input=[
-        *conversation_history
-      ],
-      run_config=RunConfig(trace_metadata={
-        "__trace_source__": "agent-builder",
-        "workflow_id": "wf_6918f4d9a0fc819087837d1e3949b90308dbf8fd4d026c61"
-      })
-    )
 
-    conversation_history.extend([item.to_input_item() for item in check_across_document_result_temp.new_items])
+WORKFLOW_ID = "wf_6918f4d9a0fc819087837d1e3949b90308dbf8fd4d026c61"
+
+
+async def extract_values_stage(email_text: str, revised_doc: str) -> AgentOutput:
+  return await run_agent(extract_values, [user_message(email_text)], WORKFLOW_ID, ExtractValuesContext(state_revised_doc=revised_doc, state_email_text=email_text))
+
 
-    check_across_document_result = {
-      "output_text": check_across_document_result_temp.final_output.json(),
-      "output_parsed": check_across_document_result_temp.final_output.model_dump()
-    }
-    return check_across_document_result["output_parsed"]
+async def check_stage(email_text: str, extract_values: AgentOutput) -> dict:
+  result = await run_agent(check_across_document, [user_message(email_text), *extract_values.items], WORKFLOW_ID)
+  return result.parsed
+
+
+def tick_tie_workflow() -> Workflow:
+  return Workflow("tick_tie", [
+    agent_node("extract_values", extract_values_stage, ("email_text", "revised_doc")),
+    agent_node("check", check_stage, ("email_text", "extract_values")),
+  ])
+
+
+# Main code entrypoint
+async def run_workflow(workflow_input: WorkflowInput | None = None, email_text: str | None = None, revised_doc: DeckDocument | None = None, deadline: Deadline | None = None):
+  with trace("Bifocal_Tick and Tie"):
+    if workflow_input is not None:
+      workflow = workflow_input.model_dump()
+      parsed_input = json.loads(workflow["input_as_text"])
+      email_text = parsed_input.get("email_text")
+      revised_doc = DeckDocument.from_struct(parsed_input.get("revised_doc"))
+    run = await tick_tie_workflow().run(
+      deadline=deadline,
+      email_text=email_text or "",
+      revised_doc=DeckDocument.coerce(revised_doc).to_prompt(DECK_FIELDS)
+    )
+    if run.partial:
+      # Facts alone are not a tick & tie result; report the run as partial with nothing checked.
+      return {"ties_out": [], "check": [], "partial": run.partial_info()}
+    return run.outputs["check"]
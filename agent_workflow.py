@@ -1,5 +1,16 @@
+import hashlib
+import json
 from pydantic import BaseModel
-from agents import RunContextWrapper, Agent, ModelSettings, TResponseInputItem, Runner, RunConfig, trace
+from deck_model import DeckDocument
+from tag_detector import TAG_SEED_MODE, hints_message, tag_hint_comments, tag_seed_comments
+from comment_classifier import DeckScreen, candidates_message, screen_deck
+from comment_evaluation import prepare_evaluation, unevaluated
+from deadline import Deadline
+from comment_merge import COMMENT_COMPILER_MODE, compile_comments
+from speculation import TAGS_SPECULATIVE_EXTRACT
+from workflow_engine import AgentOutput, Node, Workflow, WorkflowRun, agent_node, run_agent, user_message
+from windowed_extraction import TAGS_EXTRACTION_MODE, extract_windowed, uses_windows, window_message
+from agents import RunContextWrapper, Agent, ModelSettings, TResponseInputItem, trace
 
 class ExtractCommentsSchema__CommentsItem(BaseModel):
   id: str
@@ -255,152 +266,200 @@ class WorkflowInput(BaseModel):
   input_as_text: str
 
 
+# Internal comments can sit anywhere: body text, table cells, chart labels or speaker notes.
+DECK_FIELDS = ("text", "tables", "charts", "notes")
+
+
+def tags_input_text(original_doc: DeckDocument, revised_doc: DeckDocument) -> str:
+  # Same text as json.dumps({"original_doc": ..., "revised_doc": ...}), built from the cached serializations
+  return f'{{"original_doc": {original_doc.to_json(DECK_FIELDS)}, "revised_doc": {revised_doc.to_json(DECK_FIELDS)}}}'
+
+
+WORKFLOW_ID = "wf_6917b09ea07c8190b49f8efe6ebc26240ad6ff7efdd78cdd"
+
+
+async def extract_window_comments(window: DeckDocument, total: int, screen: DeckScreen | None = None, hints: list = ()) -> list:
+  # One extract_comments call over a slide window (see windowed_extraction.py)
+  window_input: list[TResponseInputItem] = [window_message(window, total)]
+  indices = {slide.index for slide in window.slides}
+  window_hints = [hint for hint in hints if set(hint["slide_refs"]) & indices]
+  if window_hints:
+    window_input.append(hints_message(window_hints))
+  if screen is not None:
+    window_screen = DeckScreen(screen.has_internal_comments, [c for c in screen.candidates if c.slide_index in indices], screen.lines_scored)
+    if window_screen.candidates:
+      window_input.append(candidates_message(window_screen))
+  result = await run_agent(extract_comments, window_input, WORKFLOW_ID, ExtractCommentsContext(state_original_doc=window.to_prompt(DECK_FIELDS)))
+  return result.parsed["comments"]
+
+
+async def extract_primary_comments(conversation_history: list[TResponseInputItem], original_doc: DeckDocument, screen: DeckScreen | None, state_original_doc: str | None, hints: list = ()) -> tuple[list, list[TResponseInputItem]]:
+  # The first extraction pass: (comments, items to append to the conversation history)
+  if uses_windows(DeckDocument.coerce(original_doc), TAGS_EXTRACTION_MODE):
+    # One concurrent pass over slide windows replaces extract_comments + missed_comments.
+    deck = DeckDocument.coerce(original_doc)
+    comments = await extract_windowed(deck, lambda window: extract_window_comments(window, len(deck), screen, hints))
+    return comments, [{"role": "assistant", "content": json.dumps({"comments": comments})}]
+  items: list[TResponseInputItem] = []
+  if hints:
+    items.append(hints_message(list(hints)))
+  if screen is not None and screen.candidates:
+    items.append(candidates_message(screen))
+  result = await run_agent(extract_comments, [*conversation_history, *items], WORKFLOW_ID, ExtractCommentsContext(state_original_doc=state_original_doc))
+  return result.parsed["comments"], [*items, *result.items]
+
+
+def has_internal_comments(seeds: list, screen: DeckScreen | None, finder: AgentOutput | None) -> bool:
+  if seeds:
+    return True
+  if screen is not None and screen.has_internal_comments is not None:
+    return screen.has_internal_comments
+  return finder is not None and finder.parsed["has_internal_comments"] == True
+
+
+def seed_stage(original_doc: DeckDocument, from_input: bool) -> list:
+  # TAG_SEED_MODE=shrink/skip: overlay tags found from shape geometry stand in for comment_finder and extract_comments.
+  return [] if from_input else tag_seed_comments(DeckDocument.coerce(original_doc))
+
+
+def hints_stage(original_doc: DeckDocument, from_input: bool) -> list:
+  # TAG_SEED_MODE=hint: the same tags, only shown to extract_comments as candidates.
+  return [] if from_input else tag_hint_comments(DeckDocument.coerce(original_doc))
+
+
+def screen_stage(original_doc: DeckDocument, from_input: bool, seeds: list) -> DeckScreen | None:
+  return None if from_input or seeds else screen_deck(DeckDocument.coerce(original_doc))
+
+
+def needs_finder(seeds: list, screen: DeckScreen | None, **_) -> bool:
+  # The local classifier, when confident either way, stands in for comment_finder.
+  return not seeds and (screen is None or screen.has_internal_comments is None)
+
+
+async def finder_stage(input_text: str, seeds: list, screen: DeckScreen | None) -> AgentOutput:
+  return await run_agent(comment_finder, [user_message(input_text)], WORKFLOW_ID, CommentFinderContext(state_original_doc=None))
+
+
+def finder_cache_key(input_text: str, **_) -> str:
+  # A digest of exactly what the finder reads; the cache would otherwise hold whole decks as keys.
+  return hashlib.sha256(input_text.encode("utf-8")).hexdigest()
+
+
+def needs_extract(seeds: list, screen: DeckScreen | None, finder: AgentOutput | None = None, **_) -> bool:
+  if seeds or (screen is not None and screen.has_internal_comments is False):
+    return False
+  return TAGS_SPECULATIVE_EXTRACT or has_internal_comments(seeds, screen, finder)
+
+
+async def extract_stage(input_text: str, original_doc: DeckDocument, seeds: list, screen: DeckScreen | None, hints: list, finder: AgentOutput | None = None) -> tuple[list, list[TResponseInputItem]]:
+  return await extract_primary_comments([user_message(input_text)], original_doc, screen, None, hints)
+
+
+def primary_stage(seeds: list, extract: tuple | None) -> tuple[list, list[TResponseInputItem]]:
+  # (comments, conversation items) of the first pass, from the seeds or the extraction
+  if seeds:
+    return seeds, [{"role": "assistant", "content": json.dumps({"comments": seeds})}]
+  return extract or ([], [])
+
+
+def needs_missed(original_doc: DeckDocument, seeds: list, screen: DeckScreen | None, finder: AgentOutput | None, **_) -> bool:
+  if not has_internal_comments(seeds, screen, finder):
+    return False
+  if seeds:
+    return TAG_SEED_MODE != "skip"
+  return not uses_windows(DeckDocument.coerce(original_doc), TAGS_EXTRACTION_MODE)
+
+
+async def missed_stage(input_text: str, original_doc: DeckDocument, seeds: list, screen: DeckScreen | None, finder: AgentOutput | None, primary: tuple) -> AgentOutput:
+  return await run_agent(missed_comments, [user_message(input_text), *primary[1]], WORKFLOW_ID, MissedCommentsContext(state_original_doc=None))
+
+
+async def compile_stage(input_text: str, seeds: list, screen: DeckScreen | None, finder: AgentOutput | None, primary: tuple, missed: AgentOutput | None) -> list:
+  internal = has_internal_comments(seeds, screen, finder)
+  primary_comments = primary[0] if internal else []
+  extra_comments = missed.parsed["comments"] if missed is not None else []
+  if COMMENT_COMPILER_MODE == "local":
+    # Merge, split and renumber locally; the agent only settles borderline duplicate pairs.
+    compiled = compile_comments(primary_comments, extra_comments)
+    if not compiled.borderline:
+      return CommentCompilerSchema(comments=compiled.comments).model_dump()["comments"]
+    compiler_input = [compiled.compiler_message()]
+  else:
+    compiler_input = [user_message(input_text), *(finder.items if finder is not None else [])]
+    if internal:
+      compiler_input += [*primary[1], *(missed.items if missed is not None else [])]
+  result = await run_agent(comment_compiler, compiler_input, WORKFLOW_ID)
+  return result.parsed["comments"]
+
+
+async def evaluate_stage(compiled: list, original_doc: DeckDocument, revised_doc: DeckDocument) -> dict:
+  evaluation = prepare_evaluation(compiled, original_doc, revised_doc, DECK_FIELDS)
+  if not evaluation.comments:
+    # Every comment was settled locally; nothing left for the model.
+    return evaluation.merge()
+  result = await run_agent(
+    evaluate_comments,
+    evaluation.input_items(),
+    WORKFLOW_ID,
+    EvaluateCommentsContext(state_original_doc=evaluation.original_doc, state_revised_doc=evaluation.revised_doc)
+  )
+  return evaluation.merge(result.parsed)
+
+
+def tags_workflow() -> Workflow:
+  finder_inputs = ("input_text", "seeds", "screen")
+  # Speculative: extraction starts with the finder and is dropped if the finder finds nothing (see speculation.py).
+  extract_node = agent_node(
+    "extract", extract_stage, ("input_text", "original_doc", "seeds", "screen", "hints"), when=needs_extract,
+    discard_if=("finder", lambda finder: finder is not None and not finder.parsed["has_internal_comments"])
+  ) if TAGS_SPECULATIVE_EXTRACT else agent_node(
+    "extract", extract_stage, ("input_text", "original_doc", "seeds", "screen", "hints", "finder"), when=needs_extract
+  )
+  return Workflow("tags", [
+    Node("seeds", seed_stage, ("original_doc", "from_input")),
+    Node("screen", screen_stage, ("original_doc", "from_input", "seeds")),
+    Node("hints", hints_stage, ("original_doc", "from_input")),
+    agent_node("finder", finder_stage, finder_inputs, when=needs_finder, cache_key=finder_cache_key),
+    extract_node,
+    Node("primary", primary_stage, ("seeds", "extract")),
+    agent_node("missed", missed_stage, ("input_text", "original_doc", "seeds", "screen", "finder", "primary"), when=needs_missed),
+    agent_node("compiled", compile_stage, ("input_text", "seeds", "screen", "finder", "primary", "missed")),
+    agent_node("evaluate", evaluate_stage, ("compiled", "original_doc", "revised_doc")),
+  ])
+
+
+def partial_output(run: WorkflowRun) -> dict:
+  # What the finished stages produced; comments that never reached evaluate_comments come back unclear.
+  if run.outputs.get("evaluate") is not None:
+    comments = run.outputs["evaluate"]["comments"]
+  elif run.outputs.get("compiled") is not None:
+    comments = unevaluated(run.outputs["compiled"], run.stopped)
+  elif run.outputs.get("primary") is not None:
+    comments = unevaluated(run.outputs["primary"][0], run.stopped)
+  else:
+    comments = []
+  return {"comments": comments, "partial": run.partial_info()}
+
+
 # Main code entrypoint
-async def run_workflow(workflow_input: WorkflowInput):
+async def run_workflow(workflow_input: WorkflowInput | None = None, original_doc: DeckDocument | None = None, revised_doc: DeckDocument | None = None, deadline: Deadline | None = None):
   with trace("tags_agent"):
-    state = {
-      "original_doc": None,
-      "revised_doc": None
-    }
-    workflow = workflow_input.model_dump()
-    conversation_history: list[TResponseInputItem] = [
-      {
-        "role": "user",
-        "content": [
-          {
-            "type": "input_text",
-            "text": workflow["input_as_text"]
-          }
-        ]
-      }
-    ]
-    comment_finder_result_temp = await Runner.run(
-      comment_finder,
-      input=[
-        *conversation_history
-      ],
-      run_config=RunConfig(trace_metadata={
-        "__trace_source__": "agent-builder",
-        "workflow_id": "wf_6917b09ea07c8190b49f8efe6ebc26240ad6ff7efdd78cdd"
-      }),
-      context=CommentFinderContext(state_original_doc=state["original_doc"])
-    )
-
-    conversation_history.extend([item.to_input_item() for item in comment_finder_result_temp.new_items])
-
-    comment_finder_result = {
-      "output_text": comment_finder_result_temp.final_output.json(),
-      "output_parsed": comment_finder_result_temp.final_output.model_dump()
-    }
-    if comment_finder_result["output_parsed"]["has_internal_comments"] == True:
-      extract_comments_result_temp = await Runner.run(
-        extract_comments,
-        input=[
-          *conversation_history
-        ],
-        run_config=RunConfig(trace_metadata={
-          "__trace_source__": "agent-builder",
-          "workflow_id": "wf_6917b09ea07c8190b49f8efe6ebc26240ad6ff7efdd78cdd"
-        }),
-        context=ExtractCommentsContext(state_original_doc=state["original_doc"])
-      )
-
-      conversation_history.extend([item.to_input_item() for item in extract_comments_result_temp.new_items])
-
-      extract_comments_result = {
-        "output_text": extract_comments_result_temp.final_output.json(),
-        "output_parsed": extract_comments_result_temp.final_output.model_dump()
-      }
-      missed_comments_result_temp = await Runner.run(
-        missed_comments,
-        input=[
-          *conversation_history
-        ],
-        run_config=RunConfig(trace_metadata={
-          "__trace_source__": "agent-builder",
-          "workflow_id": "wf_6917b09ea07c8190b49f8efe6ebc26240ad6ff7efdd78cdd"
-        }),
-        context=MissedCommentsContext(state_original_doc=state["original_doc"])
-      )
-
-      conversation_history.extend([item.to_input_item() for item in missed_comments_result_temp.new_items])
-
-      missed_comments_result = {
-        "output_text": missed_comments_result_temp.final_output.json(),
-        "output_parsed": missed_comments_result_temp.final_output.model_dump()
-      }
-      comment_compiler_result_temp = await Runner.run(
-        comment_compiler,
-        input=[
-          *conversation_history
-        ],
-        run_config=RunConfig(trace_metadata={
-          "__trace_source__": "agent-builder",
-          "workflow_id": "wf_6917b09ea07c8190b49f8efe6ebc26240ad6ff7efdd78cdd"
-        })
-      )
-
-      conversation_history.extend([item.to_input_item() for item in comment_compiler_result_temp.new_items])
-
-      comment_compiler_result = {
-        "output_text": comment_compiler_result_temp.final_output.json(),
-        "output_parsed": comment_compiler_result_temp.final_output.model_dump()
-      }
-      evaluate_comments_result_temp = await Runner.run(
-        evaluate_comments,
-        input=[
-          *conversation_history
-        ],
-        run_config=RunConfig(trace_metadata={
-          "__trace_source__": "agent-builder",
-          "workflow_id": "wf_6917b09ea07c8190b49f8efe6ebc26240ad6ff7efdd78cdd"
-        }),
-        context=EvaluateCommentsContext(state_original_doc=state["original_doc"], state_revised_doc=state["revised_doc"])
-      )
-
-      conversation_history.extend([item.to_input_item() for item in evaluate_comments_result_temp.new_items])
-
-      evaluate_comments_result = {
-        "output_text": evaluate_comments_result_temp.final_output.json(),
-        "output_parsed": evaluate_comments_result_temp.final_output.model_dump()
-      }
-      return evaluate_comments_result["output_parsed"]
+    if workflow_input is not None:
+      input_text = workflow_input.model_dump()["input_as_text"]
+      parsed_input = json.loads(input_text)
+      original_doc = DeckDocument.from_struct(parsed_input.get("original_doc"))
+      revised_doc = DeckDocument.from_struct(parsed_input.get("revised_doc"))
     else:
-      comment_compiler_result_temp = await Runner.run(
-        comment_compiler,
-        input=[
-          *conversation_history
-        ],
-        run_config=RunConfig(trace_metadata={
-          "__trace_source__": "agent-builder",
-          "workflow_id": "wf_6917b09ea07c8190b49f8efe6ebc26240ad6ff7efdd78cdd"
-        })
-      )
-
-      conversation_history.extend([item.to_input_item() for item in comment_compiler_result_temp.new_items])
-
-      comment_compiler_result = {
-        "output_text": comment_compiler_result_temp.final_output.json(),
-        "output_parsed": comment_compiler_result_temp.final_output.model_dump()
-      }
-      evaluate_comments_result_temp = await Runner.run(
-        evaluate_comments,
-        input=[
-          *conversation_history
-        ],
-        run_config=RunConfig(trace_metadata={
-          "__trace_source__": "agent-builder",
-          "workflow_id": "wf_6917b09ea07c8190b49f8efe6ebc26240ad6ff7efdd78cdd"
-        }),
-        context=EvaluateCommentsContext(state_original_doc=state["original_doc"], state_revised_doc=state["revised_doc"])
-      )
-
-      conversation_history.extend([item.to_input_item() for item in evaluate_comments_result_temp.new_items])
-
-      evaluate_comments_result = {
-        "output_text": evaluate_comments_result_temp.final_output.json(),
-        "output_parsed": evaluate_comments_result_temp.final_output.model_dump()
-      }
-      return evaluate_comments_result["output_parsed"]
+      input_text = tags_input_text(DeckDocument.coerce(original_doc), DeckDocument.coerce(revised_doc))
+    run = await tags_workflow().run(
+      deadline=deadline,
+      input_text=input_text,
+      original_doc=original_doc,
+      revised_doc=revised_doc,
+      from_input=workflow_input is not None
+    )
+    if run.partial:
+      return partial_output(run)
+    return run.outputs["evaluate"]
 
 run_agent_workflow = run_workflow
@@ -1,12 +1,17 @@
+import asyncio
+import math
 import os
 import tempfile
-from typing import Dict
 
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
 from fastapi.responses import JSONResponse
 
 from agent_runner import run_agent_workflow
-from email_bot import attachment_to_struct, format_summary
+from deadline import POLL_SECONDS, Deadline
+from email_bot import format_summary
+from deck_model import DeckDocument
+from parse_sandbox import DeckParseError, parse_document
+from planner import plan_for_email
 
 
 app = FastAPI(title="Bifocal API", version="1.0.0")
@@ -27,13 +32,17 @@ async def _save_upload(upload: UploadFile) -> str:
         return tmp.name
 
 
-async def _struct_from_upload(upload: UploadFile) -> Dict:
+async def _document_from_upload(upload: UploadFile) -> DeckDocument:
     if not upload:
-        return {"slides": []}
+        return DeckDocument()
     path = await _save_upload(upload)
     attachment = {"path": path, "filename": upload.filename}
     try:
-        return attachment_to_struct(attachment)
+        # Parsing runs in a worker thread (and, by default, a sandboxed process)
+        # so a pathological deck doesn't block other requests.
+        return await asyncio.to_thread(parse_document, attachment)
+    except DeckParseError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
     finally:
         try:
             os.unlink(path)
@@ -41,6 +50,16 @@ async def _struct_from_upload(upload: UploadFile) -> Dict:
             pass
 
 
+async def _cancel_on_disconnect(request: Request, deadline: Deadline) -> None:
+    # The workflows run in a worker thread; they stop at their next check of the deadline.
+    while not deadline.expired():
+        if await request.is_disconnected():
+            print("Client disconnected; cancelling the analysis")
+            deadline.cancel()
+            return
+        await asyncio.sleep(POLL_SECONDS)
+
+
 @app.get("/health", response_class=JSONResponse)
 async def health_check():
     return {"status": "ok"}
@@ -48,32 +67,57 @@ async def health_check():
 
 @app.post("/analyze", response_class=JSONResponse)
 async def analyze_deck(
+    request: Request,
     email_text: str = Form(...),
     revised_file: UploadFile = File(...),
     original_file: UploadFile | None = File(None),
     run_tick_tie: bool = Form(False),
     only_tick: bool = Form(False),
+    deadline_seconds: float | None = Form(None),
 ):
-    revised_doc = await _struct_from_upload(revised_file)
-    original_doc = await _struct_from_upload(original_file) if original_file else {"slides": []}
+    revised_doc = await _document_from_upload(revised_file)
+    original_doc = await _document_from_upload(original_file) if original_file else DeckDocument()
 
-    result = run_agent_workflow(
-        email_text=email_text,
-        original_doc=original_doc,
-        revised_doc=revised_doc,
+    # The form flags add to what the email text itself asks for.
+    plan = plan_for_email(
+        email_text,
+        has_original=len(original_doc) > 0,
         run_tick_tie=run_tick_tie,
+        only_tick=only_tick,
     )
+    # Counted from here; deadline_seconds=0 disables the REQUEST_DEADLINE_SECONDS default,
+    # but the run is still cancelled when the client goes away.
+    deadline = Deadline.after(deadline_seconds) or Deadline(math.inf)
+    watcher = asyncio.ensure_future(_cancel_on_disconnect(request, deadline))
+    try:
+        result = await asyncio.to_thread(
+            run_agent_workflow,
+            email_text=email_text,
+            original_doc=original_doc,
+            revised_doc=revised_doc,
+            plan=plan,
+            deadline=deadline,
+        )
+    finally:
+        watcher.cancel()
 
     tags = result.get("tags", [])
     email_comments = result.get("email_comments", [])
     tick_tie = result.get("tick_tie")
-    summary = format_summary(tags, email_comments, tick_tie, show_comments=not only_tick)
+    skipped = result.get("skipped", {})
+    partial = result.get("partial", {})
+    summary = format_summary(
+        tags, email_comments, tick_tie, show_comments=not plan.only_tick, skipped=skipped, partial=partial,
+    )
 
     return {
         "summary": summary,
         "tags": tags,
         "email_comments": email_comments,
         "tick_tie": tick_tie,
+        "skipped": skipped,
+        "partial": partial,
+        "plan": result.get("plan"),
     }
 
 
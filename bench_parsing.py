@@ -0,0 +1,86 @@
+# bench_parsing.py
+#
+# Compare deck parsing strategies on real files.
+#
+#   python bench_parsing.py pdf deck.pdf --workers 4 --repeat 3
+#   python bench_parsing.py pptx deck.pptx --repeat 3
+
+import argparse
+import multiprocessing
+import os
+import resource
+import time
+
+from deck_parser import pdf_to_struct, pptx_to_struct
+
+
+def _time(fn, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_pdf(path: str, workers: int, repeat: int) -> None:
+    sequential_time, sequential = _time(lambda: pdf_to_struct(path, workers=1), repeat)
+    parallel_time, parallel = _time(lambda: pdf_to_struct(path, workers=workers), repeat)
+
+    pages = len(sequential["slides"])
+    print(f"{os.path.basename(path)}: {pages} pages, best of {repeat}")
+    print(f"  sequential:           {sequential_time:8.3f}s")
+    print(f"  parallel ({workers} workers): {parallel_time:8.3f}s  ({sequential_time / parallel_time:.2f}x)")
+    print(f"  identical output:     {sequential == parallel}")
+
+
+def _pptx_run(path: str, fast: bool, repeat: int, conn) -> None:
+    # Each strategy runs in a fresh process so peak RSS is attributable to it.
+    elapsed, result = _time(lambda: pptx_to_struct(path, fast=fast), repeat)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    conn.send((elapsed, peak_kb, result))
+    conn.close()
+
+
+def _pptx_measure(path: str, fast: bool, repeat: int):
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_pptx_run, args=(path, fast, repeat, sender))
+    process.start()
+    measured = receiver.recv()
+    process.join()
+    return measured
+
+
+def bench_pptx(path: str, repeat: int) -> None:
+    legacy_time, legacy_peak, legacy = _pptx_measure(path, False, repeat)
+    fast_time, fast_peak, fast = _pptx_measure(path, True, repeat)
+
+    size_mb = os.path.getsize(path) / 1e6
+    print(f"{os.path.basename(path)}: {len(legacy['slides'])} slides, {size_mb:.1f} MB, best of {repeat}")
+    print(f"  python-pptx:  {legacy_time:8.3f}s  peak RSS {legacy_peak / 1024:7.1f} MB")
+    print(f"  direct XML:   {fast_time:8.3f}s  peak RSS {fast_peak / 1024:7.1f} MB  ({legacy_time / fast_time:.1f}x)")
+    print(f"  identical output: {legacy == fast}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark deck parsing.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    pdf_parser = sub.add_parser("pdf", help="sequential vs process-pool PDF text extraction")
+    pdf_parser.add_argument("path")
+    pdf_parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    pdf_parser.add_argument("--repeat", type=int, default=3)
+
+    pptx_parser = sub.add_parser("pptx", help="python-pptx vs direct-XML PPTX text extraction")
+    pptx_parser.add_argument("path")
+    pptx_parser.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args()
+    if args.command == "pptx":
+        bench_pptx(args.path, args.repeat)
+    elif args.command == "pdf":
+        # Force the parallel path even for short files so the comparison is meaningful.
+        import deck_parser
+        deck_parser.PDF_PARALLEL_MIN_PAGES = 2
+        bench_pdf(args.path, args.workers, args.repeat)
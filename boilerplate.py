@@ -0,0 +1,77 @@
+"""
+Deck-level removal of repeated page furniture.
+
+Banker decks repeat footers, confidentiality disclaimers, logo alt text and
+source lines on nearly every slide. `strip_boilerplate` finds lines that
+appear on at least `min_share` of the slides, removes them from every text
+field of each slide and keeps them once in the document's `boilerplate` section,
+so the agents read them a single time instead of once per slide.
+"""
+
+import os
+from collections import Counter
+from dataclasses import dataclass
+from typing import Tuple
+
+from deck_model import DeckDocument
+
+STRIP_BOILERPLATE = os.getenv("STRIP_BOILERPLATE", "1") == "1"
+# Tick-and-tie keeps footnotes and source lines by default: they can carry the numbers being tied.
+TICK_TIE_STRIP_BOILERPLATE = os.getenv("TICK_TIE_STRIP_BOILERPLATE", "0") == "1"
+BOILERPLATE_MIN_SHARE = float(os.getenv("BOILERPLATE_MIN_SHARE", "0.6"))
+BOILERPLATE_MIN_SLIDES = int(os.getenv("BOILERPLATE_MIN_SLIDES", "3"))
+# Short repeated lines ("$100mm", "FY23", a table header) are content, not furniture.
+BOILERPLATE_MIN_CHARS = int(os.getenv("BOILERPLATE_MIN_CHARS", "12"))
+
+
+@dataclass
+class BoilerplateReport:
+    lines: Tuple[str, ...]
+    chars_before: int
+    chars_after: int
+
+    @property
+    def tokens_saved(self) -> int:
+        # ~4 characters per token for English prose; close enough for reporting.
+        return max(0, self.chars_before - self.chars_after) // 4
+
+
+def find_boilerplate(
+    doc: DeckDocument,
+    min_share: float = BOILERPLATE_MIN_SHARE,
+    min_slides: int = BOILERPLATE_MIN_SLIDES,
+    min_chars: int = BOILERPLATE_MIN_CHARS,
+) -> Tuple[str, ...]:
+    """Lines present on at least `min_share` of the non-empty slides, in first-seen order."""
+    slides = [slide for slide in doc.slides if any(slide.fields().values())]
+    if len(slides) < min_slides:
+        return ()
+    counts: Counter = Counter()
+    first_seen = {}
+    for slide in slides:
+        lines = []
+        for text in slide.fields().values():
+            lines.extend(line.strip() for line in text.split("\n") if len(line.strip()) >= min_chars)
+        counts.update(set(lines))
+        for position, line in enumerate(lines):
+            first_seen.setdefault(line, (slide.index, position))
+    threshold = max(min_slides, min_share * len(slides))
+    repeated = [line for line, count in counts.items() if count >= threshold]
+    return tuple(sorted(repeated, key=first_seen.__getitem__))
+
+
+def strip_boilerplate(doc: DeckDocument, **kwargs) -> Tuple[DeckDocument, BoilerplateReport]:
+    lines = find_boilerplate(doc, **kwargs)
+    if not lines:
+        return doc, BoilerplateReport((), len(doc.to_json()), len(doc.to_json()))
+
+    drop = set(lines)
+    slides = tuple(
+        slide.replace(**{
+            field: "\n".join(line for line in text.split("\n") if line.strip() not in drop).strip()
+            for field, text in slide.fields().items()
+        })
+        for slide in doc.slides
+    )
+    stripped = DeckDocument(slides, doc.boilerplate + lines)
+    return stripped, BoilerplateReport(lines, len(doc.to_json()), len(stripped.to_json()))
@@ -0,0 +1,126 @@
+# check_extraction_recall.py
+#
+# Compare windowed tag extraction (windowed_extraction.py) with the two-pass
+# extract_comments + missed_comments flow on stored decks.
+#
+#   python check_extraction_recall.py decks/ other_deck.pptx
+#   python check_extraction_recall.py labels.jsonl --window-slides 8 --overlap 2 --concurrency 4
+#
+# Decks are .pptx/.pdf files (directories are searched), or a JSONL of
+# {"path": ..., "comments": [...]} records as used by train_comment_classifier.py.
+# For every deck, the tags workflow runs once per mode with geometry seeding
+# off and the deck passed as both original and revised. Identical decks skip
+# evaluate_comments (comment_evaluation.py), so only the finder, the
+# extraction and the compiler call models. Recall is the share of two-pass
+# comments that windowed mode also found: same slide and similar wording.
+# Records with labeled comments also get each mode's recall against the labels.
+#
+# Needs OPENAI_API_KEY.
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Tuple
+
+os.environ["TAG_SEED_MODE"] = "off"
+os.environ["EVAL_SKIP_UNCHANGED"] = "1"
+os.environ["WORKFLOW_CACHE_SIZE"] = "0"  # time both modes from scratch
+
+import agent_workflow  # noqa: E402
+from comment_merge import content_words, similarity  # noqa: E402
+from deck_model import DeckDocument  # noqa: E402
+from deck_parser import attachment_to_struct  # noqa: E402
+from windowed_extraction import TWO_PASS, WINDOWED, extract_windowed  # noqa: E402
+
+MATCH_JACCARD = 0.5
+MATCH_CONTAINMENT = 0.8
+
+
+def load_corpus(paths: List[str]) -> List[Tuple[str, List[str]]]:
+    """(deck path, labeled comment texts) pairs."""
+    corpus: List[Tuple[str, List[str]]] = []
+    for path in paths:
+        if path.endswith(".jsonl"):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line) if line.strip() else {}
+                    if "path" in record:
+                        corpus.append((record["path"], list(record.get("comments", []))))
+        elif os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                corpus.extend((os.path.join(root, name), []) for name in sorted(files) if name.lower().endswith((".pptx", ".pdf")))
+        else:
+            corpus.append((path, []))
+    return corpus
+
+
+def _refs(comment: dict) -> set:
+    return {int(ref) for ref in comment.get("slide_refs") or []}
+
+
+def matches(reference: dict, candidate: dict) -> bool:
+    if _refs(reference) and _refs(candidate) and not _refs(reference) & _refs(candidate):
+        return False
+    jaccard, containment = similarity(content_words(reference["text"]), content_words(candidate["text"]))
+    return jaccard >= MATCH_JACCARD or containment >= MATCH_CONTAINMENT
+
+
+def recall(reference: List[dict], found: List[dict]) -> float:
+    if not reference:
+        return 1.0
+    return sum(any(matches(r, f) for f in found) for r in reference) / len(reference)
+
+
+async def extract(deck: DeckDocument, mode: str) -> Tuple[List[dict], float]:
+    agent_workflow.TAGS_EXTRACTION_MODE = mode
+    start = time.perf_counter()
+    result = await agent_workflow.run_workflow(original_doc=deck, revised_doc=deck)
+    return (result or {}).get("comments", []), time.perf_counter() - start
+
+
+async def main(args: argparse.Namespace) -> None:
+    # extract_windowed's defaults are bound at import; pass the CLI values through.
+    agent_workflow.extract_windowed = lambda doc, run: extract_windowed(doc, run, args.window_slides, args.concurrency, args.overlap)
+
+    totals: Dict[str, List[float]] = {TWO_PASS: [], WINDOWED: [], "recall": [], "label_" + TWO_PASS: [], "label_" + WINDOWED: []}
+    for path, labels in load_corpus(args.paths):
+        deck = DeckDocument.from_struct(attachment_to_struct({"path": path, "filename": path}))
+        two_pass, two_pass_time = await extract(deck, TWO_PASS)
+        windowed, windowed_time = await extract(deck, WINDOWED)
+        deck_recall = recall(two_pass, windowed)
+        totals[TWO_PASS].append(two_pass_time)
+        totals[WINDOWED].append(windowed_time)
+        totals["recall"].append(deck_recall)
+        line = (
+            f"{path}: {len(deck)} slides | two-pass {len(two_pass)} comments {two_pass_time:.1f}s | "
+            f"windowed {len(windowed)} comments {windowed_time:.1f}s | recall {deck_recall:.2f}"
+        )
+        if labels:
+            reference = [{"text": text, "slide_refs": []} for text in labels]
+            for mode, found in ((TWO_PASS, two_pass), (WINDOWED, windowed)):
+                totals["label_" + mode].append(recall(reference, found))
+            line += f" | labels: two-pass {totals['label_' + TWO_PASS][-1]:.2f}, windowed {totals['label_' + WINDOWED][-1]:.2f}"
+        print(line)
+
+    if not totals["recall"]:
+        print("No decks found.")
+        return
+    n = len(totals["recall"])
+    print(f"\n{n} deck(s)")
+    print(f"  windowed recall vs two-pass: {sum(totals['recall']) / n:.3f} (min {min(totals['recall']):.2f})")
+    print(f"  mean time: two-pass {sum(totals[TWO_PASS]) / n:.1f}s, windowed {sum(totals[WINDOWED]) / n:.1f}s")
+    for mode in (TWO_PASS, WINDOWED):
+        scores = totals["label_" + mode]
+        if scores:
+            print(f"  recall vs labels ({mode}): {sum(scores) / len(scores):.3f} over {len(scores)} labeled deck(s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Windowed vs two-pass tag extraction recall.")
+    parser.add_argument("paths", nargs="+", help="decks, directories of decks, or labeled JSONL")
+    parser.add_argument("--window-slides", type=int, default=int(os.getenv("TAGS_WINDOW_SLIDES", "6")))
+    parser.add_argument("--overlap", type=int, default=int(os.getenv("TAGS_WINDOW_OVERLAP", "1")))
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("TAGS_WINDOW_CONCURRENCY", "4")))
+    asyncio.run(main(parser.parse_args()))
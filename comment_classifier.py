@@ -0,0 +1,208 @@
+"""
+Local "internal comment vs client content" line classifier.
+
+The network is trained with Keras (`train_comment_classifier.py`) and
+exported as plain numpy weights, so scoring needs neither TensorFlow nor a
+GPU. Lines are featurized by hashing word unigrams/bigrams, word-boundary
+character trigrams and a few shape tokens (source field, length, brackets,
+question marks) into a fixed-size vector. Each line's hidden layer is then
+the weighted sum of the W1 rows it hits, which is much cheaper than a dense
+matmul. A 100-slide deck scores in a few milliseconds.
+
+Without an exported model (COMMENT_CLASSIFIER_PATH) the classifier is
+disabled and the tags workflow behaves as before.
+"""
+
+import json
+import os
+import re
+import zlib
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from deck_model import SLIDE_FIELDS, DeckDocument
+
+COMMENT_CLASSIFIER_PATH = os.getenv("COMMENT_CLASSIFIER_PATH", "models/comment_classifier.npz")
+# Scores at or above this answer has_internal_comments=True without the model ...
+COMMENT_CLASSIFIER_CONFIDENT = float(os.getenv("COMMENT_CLASSIFIER_CONFIDENT", "0.9"))
+# ... and a deck whose best line scores below this answers False.
+COMMENT_CLASSIFIER_CLEAR = float(os.getenv("COMMENT_CLASSIFIER_CLEAR", "0.05"))
+COMMENT_CLASSIFIER_MAX_CANDIDATES = int(os.getenv("COMMENT_CLASSIFIER_MAX_CANDIDATES", "40"))
+
+_WORD = re.compile(r"[a-z0#$%&]+|[^\sa-z0-9]")
+_DIGITS = re.compile(r"\d")
+
+
+def normalize_text(text: str) -> str:
+    return _DIGITS.sub("0", text.lower())
+
+
+@lru_cache(maxsize=1 << 16)
+def _bucket(token: str, dim: int) -> int:
+    return zlib.crc32(token.encode("utf-8")) % dim
+
+
+@lru_cache(maxsize=1 << 16)
+def _word_buckets(word: str, dim: int) -> Tuple[int, ...]:
+    """Buckets of a word's unigram token and its boundary-padded character trigrams."""
+    buckets = [_bucket(f"w:{word}", dim)]
+    if len(word) > 2:
+        padded = f"<{word}>"
+        buckets.extend(_bucket(f"c:{padded[i:i + 3]}", dim) for i in range(len(padded) - 2))
+    return tuple(buckets)
+
+
+def _line_buckets(text: str, field: str, dim: int) -> List[int]:
+    words = _WORD.findall(normalize_text(text))
+    buckets: List[int] = []
+    for word in words:
+        buckets.extend(_word_buckets(word, dim))
+    buckets.extend(_bucket(f"b:{a} {b}", dim) for a, b in zip(words, words[1:]))
+    buckets.append(_bucket(f"f:{field}", dim))
+    buckets.append(_bucket(f"len:{min(len(words), 40) // 4}", dim))
+    if text[:1] in "[(<{*":
+        buckets.append(_bucket("s:bracket", dim))
+    if text.rstrip().endswith("?"):
+        buckets.append(_bucket("s:question", dim))
+    if text.isupper() and len(text) > 3:
+        buckets.append(_bucket("s:caps", dim))
+    return buckets
+
+
+def featurize(texts: Sequence[str], fields: Sequence[str], dim: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sparse hashed features as (indices, scales, row_starts): row i is the
+    bag of buckets indices[row_starts[i]:row_starts[i + 1]] (repeats allowed),
+    each weighted by scales[i] = 1/sqrt(row length). Rows are never empty
+    (every line has at least its field and length tokens).
+    """
+    indices: List[int] = []
+    starts: List[int] = []
+    for text, field in zip(texts, fields):
+        starts.append(len(indices))
+        indices.extend(_line_buckets(text, field, dim))
+    starts_array = np.asarray(starts, dtype=np.int64)
+    lengths = np.diff(np.append(starts_array, len(indices)))
+    return np.asarray(indices, dtype=np.int64), (1.0 / np.sqrt(lengths)).astype(np.float32), starts_array
+
+
+def densify(indices: np.ndarray, scales: np.ndarray, starts: np.ndarray, rows: Sequence[int], dim: int) -> np.ndarray:
+    """Dense float32 matrix for the selected rows (training batches)."""
+    ends = np.append(starts[1:], len(indices))
+    out = np.zeros((len(rows), dim), dtype=np.float32)
+    for i, row in enumerate(rows):
+        np.add.at(out[i], indices[starts[row]:ends[row]], scales[row])
+    return out
+
+
+@dataclass
+class Candidate:
+    slide_index: int
+    field: str
+    text: str
+    score: float
+
+    def to_item(self) -> dict:
+        return {"slide": self.slide_index, "field": self.field, "text": self.text, "score": round(self.score, 3)}
+
+
+@dataclass
+class DeckScreen:
+    has_internal_comments: Optional[bool]  # None when the classifier is not confident either way
+    candidates: List[Candidate]
+    lines_scored: int
+
+
+def iter_lines(doc: DeckDocument) -> Iterator[Tuple[int, str, str]]:
+    """(slide_index, field, line) for every distinct non-empty line of the deck."""
+    for slide in doc.slides:
+        seen = set()
+        for field in SLIDE_FIELDS:
+            for line in getattr(slide, field).split("\n"):
+                line = line.strip()
+                if line and (field, line) not in seen:
+                    seen.add((field, line))
+                    yield slide.index, field, line
+
+
+class CommentClassifier:
+    """Numpy inference over weights exported from the Keras model."""
+
+    def __init__(self, w1: np.ndarray, b1: np.ndarray, w2: np.ndarray, b2: np.ndarray, threshold: float = 0.5):
+        self.w1 = np.ascontiguousarray(w1, dtype=np.float32)
+        self.b1 = np.asarray(b1, dtype=np.float32)
+        self.w2 = np.asarray(w2, dtype=np.float32).reshape(-1)
+        self.b2 = float(np.asarray(b2).reshape(-1)[0])
+        self.threshold = float(threshold)
+
+    @property
+    def dim(self) -> int:
+        return self.w1.shape[0]
+
+    @classmethod
+    def load(cls, path: str) -> "CommentClassifier":
+        with np.load(path) as weights:
+            return cls(weights["w1"], weights["b1"], weights["w2"], weights["b2"], float(weights["threshold"]))
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, w1=self.w1, b1=self.b1, w2=self.w2, b2=np.float32(self.b2), threshold=np.float32(self.threshold))
+
+    def predict_proba(self, texts: Sequence[str], fields: Optional[Sequence[str]] = None) -> np.ndarray:
+        if not texts:
+            return np.zeros(0, dtype=np.float32)
+        fields = fields or ["text"] * len(texts)
+        indices, scales, starts = featurize(texts, fields, self.dim)
+        hidden = np.add.reduceat(self.w1[indices], starts, axis=0)
+        hidden *= scales[:, None]
+        np.maximum(hidden + self.b1, 0, out=hidden)
+        logits = hidden @ self.w2 + self.b2
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def screen(self, doc: DeckDocument) -> DeckScreen:
+        lines = list(iter_lines(doc))
+        scores = self.predict_proba([line for _, _, line in lines], [field for _, field, _ in lines])
+        candidates = sorted(
+            (Candidate(index, field, line, float(score))
+             for (index, field, line), score in zip(lines, scores) if score >= self.threshold),
+            key=lambda c: -c.score,
+        )[:COMMENT_CLASSIFIER_MAX_CANDIDATES]
+        best = float(scores.max()) if len(scores) else 0.0
+        decided: Optional[bool] = None
+        if best >= COMMENT_CLASSIFIER_CONFIDENT:
+            decided = True
+        elif best < COMMENT_CLASSIFIER_CLEAR:
+            decided = False
+        return DeckScreen(decided, sorted(candidates, key=lambda c: c.slide_index), len(lines))
+
+
+_LOADED: dict = {}
+
+
+def load_classifier(path: str = COMMENT_CLASSIFIER_PATH) -> Optional[CommentClassifier]:
+    """The exported classifier, loaded once; None when no model has been exported."""
+    if path not in _LOADED:
+        _LOADED[path] = CommentClassifier.load(path) if path and os.path.exists(path) else None
+    return _LOADED[path]
+
+
+def candidates_message(screen: DeckScreen) -> dict:
+    """History item pointing the extraction agents at the pre-selected lines."""
+    items = json.dumps([candidate.to_item() for candidate in screen.candidates])
+    return {
+        "role": "user",
+        "content": f"A local classifier flagged these lines as likely internal comments. Check them first, but keep looking for others: {items}",
+    }
+
+
+def screen_deck(doc: DeckDocument) -> Optional[DeckScreen]:
+    classifier = load_classifier()
+    if classifier is None:
+        return None
+    result = classifier.screen(doc)
+    answer = {True: "yes", False: "no", None: "undecided"}[result.has_internal_comments]
+    print(f"Comment classifier: {result.lines_scored} lines, {len(result.candidates)} candidate(s), internal comments: {answer}")
+    return result
@@ -0,0 +1,304 @@
+"""
+Build the input for the `evaluate_comments` agents.
+
+Before any model call, `prepare_evaluation` settles what it can locally:
+
+- Slide refs: comments that name no slide ("the EBITDA bridge page") are
+  matched to their top original slides through the BM25/title index
+  (slide_index.py), so the model gets a small context. These refs are a
+  lexical guess and are marked `refs_inferred`: the steps below never
+  issue a verdict from them (a literal edit is checked against the whole
+  decks instead, as for any comment without refs).
+- Unchanged slides: a comment whose referenced slides all have identical
+  content in both decks (same content hash and shapes, compared through the
+  slide alignment) is marked not_implemented with a templated reason.
+  Comments that ask to add, move or remove slides are left to the model,
+  since those edits happen around the referenced slide. When the two decks
+  are identical, every comment is resolved this way and the evaluator is
+  not called at all.
+- Literal edits: "change 25% to 27%", "rename A to B", "delete the
+  footnote" and the like are confirmed or refuted from the slide text
+  (literal_edits.py); ambiguous ones stay with the model.
+- Context: when every remaining comment names its slides, the decks are
+  aligned (slide_alignment.py). Only the referenced original slides, their
+  aligned revised counterparts and any inserted slides are kept, plus a short
+  note on how the slides map, so a renumbered slide is not read as missing.
+  If any comment has no slide_refs, both decks go in whole as before. A
+  caller evaluating in several batches can pass `defer_whole_deck` to get
+  those comments back in `deferred` instead, and send them together once.
+
+`EvaluationInput.merge` puts the local verdicts and the model's back
+together in the original comment order. The share of comments resolved
+locally is printed on every run.
+
+Set EVAL_ALIGNED_CONTEXT=0 to always send whole decks; EVAL_SKIP_UNCHANGED=0
+and EVAL_LITERAL_EDITS=0 turn off the local verdicts, EVAL_RESOLVE_REFS=0
+the slide lookup.
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from deck_model import DeckDocument
+from literal_edits import DELETE_FOOTNOTE, IMPLEMENTED, check_edit, parse_edit, suggestion_for
+from slide_alignment import SlideAlignment, align_decks
+from slide_index import index_for
+
+EVAL_ALIGNED_CONTEXT = os.getenv("EVAL_ALIGNED_CONTEXT", "1") == "1"
+EVAL_SKIP_UNCHANGED = os.getenv("EVAL_SKIP_UNCHANGED", "1") == "1"
+EVAL_LITERAL_EDITS = os.getenv("EVAL_LITERAL_EDITS", "1") == "1"
+EVAL_RESOLVE_REFS = os.getenv("EVAL_RESOLVE_REFS", "1") == "1"
+
+NOT_IMPLEMENTED = "not_implemented"
+UNCLEAR = "unclear"
+
+# Slide-level edits ("add a slide after 4", "move this page to the appendix") leave the referenced slide itself unchanged.
+_STRUCTURAL = re.compile(
+    r"\b(add|insert|new|move|moving|reorder|swap|split|merge|combine|delete|remove|drop|appendix)\b.{0,40}\b(slides?|pages?|section)\b"
+    r"|\b(slides?|pages?)\b.{0,40}\b(before|after|appendix|order)\b",
+    re.IGNORECASE,
+)
+
+
+def comment_refs(comment: Dict[str, Any]) -> List[int]:
+    """A comment's slide_refs as ints (the tags schemas use floats)."""
+    refs = []
+    for ref in comment.get("slide_refs") or []:
+        try:
+            refs.append(int(ref))
+        except (TypeError, ValueError):
+            continue
+    return refs
+
+
+def _verdict(comment: Dict[str, Any], status: str, reason: str, suggestion: str = "") -> Dict[str, Any]:
+    return {
+        "id": str(comment.get("id", "")),
+        "text": comment.get("text", ""),
+        "slide_refs": comment_refs(comment),
+        "status": status,
+        "reason": reason,
+        "suggestion": suggestion,
+    }
+
+
+def _unchanged_verdict(comment: Dict[str, Any], refs: List[int]) -> Dict[str, Any]:
+    slides = ", ".join(str(ref) for ref in refs)
+    label = "Slide" if len(refs) == 1 else "Slides"
+    return _verdict(
+        comment,
+        NOT_IMPLEMENTED,
+        f"{label} {slides} unchanged in the revised deck (identical content), so the edit was not made.",
+        f"Apply the comment on slide {slides}.",
+    )
+
+
+def _identical_verdict(comment: Dict[str, Any]) -> Dict[str, Any]:
+    return _verdict(
+        comment,
+        NOT_IMPLEMENTED,
+        "The revised deck is identical to the original, so the edit was not made.",
+        "Apply the comment.",
+    )
+
+
+@dataclass
+class EvaluationInput:
+    comments: List[Dict[str, Any]]  # still to be judged by the model
+    original_doc: str  # prompt text for EvaluateCommentsContext
+    revised_doc: str
+    note: Optional[str] = None
+    resolved: List[Dict[str, Any]] = field(default_factory=list)
+    order: List[str] = field(default_factory=list)  # ids of all comments, as received
+    deferred: List[Dict[str, Any]] = field(default_factory=list)  # need whole decks; see `defer_whole_deck`
+
+    def input_items(self) -> List[dict]:
+        """History items handing the comments (and the alignment note) to the evaluator."""
+        text = f"Comments to evaluate (JSON): {json.dumps({'comments': self.comments})}"
+        if self.note:
+            text = f"{text}\n\n{self.note}"
+        return [{"role": "user", "content": text}]
+
+    def merge(self, evaluated: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Local verdicts plus the model's output, in the order the comments came in."""
+        items = list((evaluated or {}).get("comments", [])) + self.resolved
+        position = {comment_id: i for i, comment_id in enumerate(self.order)}
+        items.sort(key=lambda item: position.get(str(item.get("id")), len(position)))
+        return {"comments": items}
+
+
+def unevaluated(comments: Iterable[Dict[str, Any]], reason: str) -> List[Dict[str, Any]]:
+    """Verdicts for comments that were extracted but never evaluated (the run stopped early)."""
+    return [_verdict(comment, UNCLEAR, f"Not evaluated: {reason}.") for comment in comments]
+
+
+def _alignment_note(alignment: SlideAlignment, refs: Iterable[int], inserted: List[int]) -> str:
+    parts = []
+    for ref in sorted(refs):
+        target = alignment.revised_for(ref)
+        parts.append(f"original {ref} -> revised {target}" if target is not None else f"original {ref} -> deleted")
+    note = "Slide alignment (slide_refs use original numbering): " + "; ".join(parts) + "."
+    if inserted:
+        note += f" Slides inserted in the revised deck: {inserted}."
+    return note + " Only these slides are included in the documents."
+
+
+def _is_unchanged(ref: int, original: DeckDocument, revised: DeckDocument, alignment: SlideAlignment) -> bool:
+    target = alignment.revised_for(ref)
+    before, after = original.slide(ref), revised.slide(target) if target is not None else None
+    if before is None or after is None or (ref, target) in alignment.moved:
+        return False
+    return before.content_hash == after.content_hash and before.shapes == after.shapes
+
+
+def _resolve_unchanged(
+    comments: List[Dict[str, Any]],
+    original: DeckDocument,
+    revised: DeckDocument,
+    alignment: Optional[SlideAlignment],
+) -> List[Dict[str, Any]]:
+    if original.slides == revised.slides and original.boilerplate == revised.boilerplate:
+        print(f"Decks are identical: {len(comments)} comment(s) marked {NOT_IMPLEMENTED} without evaluation")
+        return [_identical_verdict(comment) for comment in comments]
+    if alignment is None or original.boilerplate != revised.boilerplate:
+        return []
+    resolved = []
+    for comment in comments:
+        refs = comment_refs(comment)
+        if not refs or comment.get("refs_inferred") or _STRUCTURAL.search(comment.get("text") or ""):
+            continue
+        if all(_is_unchanged(ref, original, revised, alignment) for ref in refs):
+            resolved.append(_unchanged_verdict(comment, refs))
+    if resolved:
+        print(f"Unchanged slides: {len(resolved)} of {len(comments)} comment(s) marked {NOT_IMPLEMENTED} locally")
+    return resolved
+
+
+def _resolve_refs(comments: List[Dict[str, Any]], original: DeckDocument) -> List[Dict[str, Any]]:
+    """Comments with empty slide_refs matched to original slides through the slide index."""
+    if not original.slides or all(comment_refs(comment) for comment in comments):
+        return comments
+    index = index_for(original)
+    filled = 0
+    result = []
+    for comment in comments:
+        if not comment_refs(comment):
+            refs = index.resolve(comment.get("text") or "")
+            if refs:
+                comment = {**comment, "slide_refs": refs, "refs_inferred": True}
+                filled += 1
+        result.append(comment)
+    if filled:
+        print(f"Slide index: slide_refs filled for {filled} comment(s)")
+    return result
+
+
+def _slide_text(doc: DeckDocument, indices: Optional[Iterable[int]], fields: Tuple[str, ...]) -> str:
+    slides = doc.slides if indices is None else doc.select(indices).slides
+    return "\n".join(getattr(slide, name) for slide in slides for name in fields)
+
+
+def _resolve_literal(
+    comments: List[Dict[str, Any]],
+    original: DeckDocument,
+    revised: DeckDocument,
+    alignment: Optional[SlideAlignment],
+    fields: Tuple[str, ...],
+) -> List[Dict[str, Any]]:
+    resolved = []
+    for comment in comments:
+        text = comment.get("text") or ""
+        edit = parse_edit(text)
+        if edit is None:
+            continue
+        refs = [] if comment.get("refs_inferred") else comment_refs(comment)
+        if refs:
+            targets = [alignment.revised_for(ref) if alignment else None for ref in refs]
+            if None in targets or any(original.slide(ref) is None for ref in refs):
+                continue
+            before, after = _slide_text(original, refs, fields), _slide_text(revised, targets, fields)
+        elif edit.kind == DELETE_FOOTNOTE:
+            continue
+        else:
+            before, after = _slide_text(original, None, fields), _slide_text(revised, None, fields)
+        result = check_edit(edit, before, after, text)
+        if result is not None:
+            status, reason = result
+            resolved.append(_verdict(comment, status, reason, suggestion_for(edit) if status != IMPLEMENTED else ""))
+    if resolved:
+        print(f"Literal edits: {len(resolved)} comment(s) checked against the slide text")
+    return resolved
+
+
+def _context(
+    pending: List[Dict[str, Any]],
+    original: DeckDocument,
+    revised: DeckDocument,
+    alignment: Optional[SlideAlignment],
+    fields: Tuple[str, ...],
+) -> Tuple[str, str, Optional[str]]:
+    """(original_doc, revised_doc, note) prompt text covering the pending comments."""
+    refs: Set[int] = set()
+    for comment in pending:
+        refs.update(comment_refs(comment))
+    if not EVAL_ALIGNED_CONTEXT or alignment is None or not all(comment_refs(comment) for comment in pending):
+        return original.to_prompt(fields), revised.to_prompt(fields), None
+
+    if alignment.is_identity():
+        # Same numbering on both sides: no note needed, just the referenced slides.
+        return original.select(refs).to_prompt(fields), revised.select(refs).to_prompt(fields), None
+
+    original_refs = {ref for ref in refs if original.slide(ref) is not None}
+    revised_refs = {alignment.revised_for(ref) for ref in original_refs} - {None}
+    # A ref past the end of the original can only mean the revised numbering.
+    revised_refs |= {ref for ref in refs - original_refs if revised.slide(ref) is not None}
+    revised_refs |= set(alignment.inserted)
+    print(f"Slide alignment: {alignment.summary()}; evaluating {len(original_refs)} original / {len(revised_refs)} revised slide(s)")
+    return (
+        original.select(original_refs).to_prompt(fields),
+        revised.select(revised_refs).to_prompt(fields),
+        _alignment_note(alignment, original_refs, alignment.inserted),
+    )
+
+
+def prepare_evaluation(
+    comments: List[Dict[str, Any]],
+    original_doc: Optional[DeckDocument],
+    revised_doc: Optional[DeckDocument],
+    fields: Iterable[str],
+    defer_whole_deck: bool = False,
+) -> EvaluationInput:
+    fields = tuple(fields)
+    original = DeckDocument.coerce(original_doc)
+    revised = DeckDocument.coerce(revised_doc)
+    order = [str(comment.get("id")) for comment in comments]
+    alignment = align_decks(original, revised) if original.slides and revised.slides else None
+
+    resolved: List[Dict[str, Any]] = []
+    pending = _resolve_refs(comments, original) if EVAL_RESOLVE_REFS else list(comments)
+    stages = (
+        (EVAL_SKIP_UNCHANGED, lambda items: _resolve_unchanged(items, original, revised, alignment)),
+        (EVAL_LITERAL_EDITS, lambda items: _resolve_literal(items, original, revised, alignment, fields)),
+    )
+    for enabled, stage in stages:
+        if enabled and pending:
+            settled = stage(pending)
+            done = {item["id"] for item in settled}
+            resolved.extend(settled)
+            pending = [comment for comment in pending if str(comment.get("id")) not in done]
+    deferred: List[Dict[str, Any]] = []
+    if defer_whole_deck and pending:
+        aligned = EVAL_ALIGNED_CONTEXT and alignment is not None
+        deferred = [comment for comment in pending if not (aligned and comment_refs(comment))]
+        pending = [comment for comment in pending if aligned and comment_refs(comment)]
+    if comments:
+        share = len(resolved) / len(comments)
+        later = f", {len(deferred)} deferred to a whole-deck batch" if deferred else ""
+        print(f"Evaluation: {len(resolved)} of {len(comments)} comment(s) resolved locally ({share:.0%}), {len(pending)} sent to the model{later}")
+    if not pending:
+        return EvaluationInput([], "", "", resolved=resolved, order=order, deferred=deferred)
+    original_text, revised_text, note = _context(pending, original, revised, alignment, fields)
+    return EvaluationInput(pending, original_text, revised_text, note, resolved=resolved, order=order, deferred=deferred)
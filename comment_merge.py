@@ -0,0 +1,203 @@
+"""
+Local replacement for the `comment_compiler` agent.
+
+`compile_comments` merges the primary and extra comment lists without a
+model call:
+
+- comments that bundle several edits (numbered or bulleted items, separate
+  lines, or sentences that each read as an instruction) are split into one
+  comment per edit;
+- comments on overlapping slides (or both on no slide) are compared by the
+  token-set similarity of their content words. Clear duplicates are merged,
+  keeping the more specific text and the union of slide_refs. Comments
+  that mention different values ("Q1" vs "Q3"), or where only one side is
+  negated ("remove the legend" vs "do not remove the legend"), are never
+  merged. A comment whose words are all contained in another's is only
+  flagged as borderline, never merged automatically. With a few
+  dozen comments per deck an exact token-set comparison is cheaper than
+  MinHash sketches and gives the same answer;
+- IDs are renumbered "C1".."Cn" in list order.
+
+Pairs that are similar but not clearly duplicates are reported as
+borderline. Only then is the `comment_compiler` agent called, with the
+compiled list and those pairs instead of the whole conversation.
+COMMENT_COMPILER_MODE=model restores the agent-only compiler.
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Sequence, Tuple
+
+from planner import EDIT_VERBS
+
+COMMENT_COMPILER_MODE = os.getenv("COMMENT_COMPILER_MODE", "local")  # local | model
+COMMENT_DUPLICATE_SIMILARITY = float(os.getenv("COMMENT_DUPLICATE_SIMILARITY", "0.7"))
+COMMENT_BORDERLINE_SIMILARITY = float(os.getenv("COMMENT_BORDERLINE_SIMILARITY", "0.4"))
+
+_WORD = re.compile(r"[a-z]+|\d+(?:[.,]\d+)*%?")
+_STOPWORDS = frozenset(
+    """a an the and or of to in on for with at by from as is are be this that these those it its
+    please pls can could would should we you our your slide page""".split()
+)
+_LIST_ITEM = re.compile(r"(?:^|\s)(?:\(?\d{1,2}[.)]|\(?[a-h][)]|[-•*])\s+")
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+(?=[A-Z])")
+# A sentence opening with one of these leans on the previous one ("Update the chart. It should show Q3.").
+_DEPENDENT = re.compile(r"^(?:it|its|this|that|these|those|they|them|also|and|but|or|so|then|e\.g|i\.e|otherwise|instead)\b", re.IGNORECASE)
+# Independent sentences are split off only when they read as instructions of their own.
+_IMPERATIVE = re.compile(rf"^(?:(?:please|pls|also)\s+)?(?:{EDIT_VERBS})\b", re.IGNORECASE)
+_ABBREVIATION = re.compile(r"(?:\b(?:adj|vs|inc|corp|co|ltd|no|approx|etc|est|fig|mr|ms|dr|st|e\.g|i\.e)|\b[A-Z])\.$", re.IGNORECASE)
+# Stemmed content words that flip an instruction ("don't" tokenizes to "don" + "t").
+_NEGATIONS = frozenset({"not", "no", "don", "never", "keep", "without"})
+MIN_PART_WORDS = 3  # sentences
+MIN_ITEM_WORDS = 2  # lines and list items
+
+
+@dataclass
+class CompiledComments:
+    comments: List[Dict[str, Any]]
+    borderline: List[Tuple[str, str]] = field(default_factory=list)  # ids in `comments`
+    merged: int = 0
+    split: int = 0
+
+    def compiler_message(self) -> dict:
+        """Input for the comment_compiler agent when borderline pairs need a decision."""
+        pairs = ", ".join(f"{a}/{b}" for a, b in self.borderline)
+        return {
+            "role": "user",
+            "content": (
+                f"primary_comments (JSON): {json.dumps(self.comments)}\n\n"
+                "extra_comments (JSON): []\n\n"
+                f"These pairs might describe the same change: {pairs}. Merge a pair only if it clearly does; "
+                "keep every other comment as it is."
+            ),
+        }
+
+
+def _refs(comment: Dict[str, Any]) -> List[int]:
+    refs = []
+    for ref in comment.get("slide_refs") or []:
+        try:
+            refs.append(int(ref))
+        except (TypeError, ValueError):
+            continue
+    return refs
+
+
+@lru_cache(maxsize=1 << 14)
+def _stem(word: str) -> str:
+    """Crude suffix stripping so "update", "updated" and "updates" compare equal."""
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[: -len(suffix)]
+            break
+    return word[:-1] if word.endswith("e") and len(word) > 3 else word
+
+
+def content_words(text: str) -> FrozenSet[str]:
+    return frozenset(_stem(word) for word in _WORD.findall(text.lower()) if word not in _STOPWORDS)
+
+
+def _values(words: FrozenSet[str]) -> FrozenSet[str]:
+    return frozenset(word for word in words if any(ch.isdigit() for ch in word))
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> Tuple[float, float]:
+    """(Jaccard, containment of the smaller set in the larger)."""
+    if not a or not b:
+        return 0.0, 0.0
+    common = len(a & b)
+    return common / len(a | b), common / min(len(a), len(b))
+
+
+def _words(part: str) -> int:
+    return len(part.split())
+
+
+def _split_sentences(item: str) -> List[str]:
+    sentences: List[str] = []
+    for sentence in _SENTENCE_END.split(item):
+        if sentences and (
+            _DEPENDENT.match(sentence) or not _IMPERATIVE.match(sentence) or not _IMPERATIVE.match(sentences[0])
+            or _words(sentence) < MIN_PART_WORDS or _words(sentences[-1]) < MIN_PART_WORDS
+            or _ABBREVIATION.search(sentences[-1])
+        ):
+            sentences[-1] = f"{sentences[-1]} {sentence}"
+        else:
+            sentences.append(sentence)
+    return sentences
+
+
+def split_comment(text: str) -> List[str]:
+    """The separate edits in one comment's text; the text itself when there is only one."""
+    text = text.strip()
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    if len(lines) > 1 and any(_words(line) < MIN_ITEM_WORDS for line in lines):
+        lines = [" ".join(lines)]
+    parts: List[str] = []
+    for line in lines:
+        items = [item.strip() for item in _LIST_ITEM.split(line) if item.strip()]
+        if len(items) < 2 or any(_words(item) < MIN_ITEM_WORDS for item in items):
+            items = [line]
+        for item in items:
+            parts.extend(_split_sentences(item))
+    return parts or [text]
+
+
+def _slides_overlap(a: List[int], b: List[int]) -> bool:
+    return bool(set(a) & set(b)) if a and b else not a and not b
+
+
+def compile_comments(*lists: Sequence[Dict[str, Any]]) -> CompiledComments:
+    """Merge the comment lists (primary first) into one renumbered, de-duplicated list."""
+    entries: List[Dict[str, Any]] = []
+    received = split = 0
+    for comments in lists:
+        for comment in comments or []:
+            received += 1
+            texts = split_comment(str(comment.get("text") or ""))
+            split += len(texts) - 1
+            for text in texts:
+                if text:
+                    entries.append({"text": text, "slide_refs": _refs(comment), "words": content_words(text)})
+
+    kept: List[Dict[str, Any]] = []
+    merged = 0
+    for entry in entries:
+        for other in kept:
+            if not _slides_overlap(entry["slide_refs"], other["slide_refs"]):
+                continue
+            if _values(entry["words"]) != _values(other["words"]):
+                continue  # "Q1" vs "Q3", "25%" vs "27%": different edits however similar the wording
+            if entry["words"] & _NEGATIONS != other["words"] & _NEGATIONS:
+                continue  # opposite instructions; left to the borderline check below
+            jaccard, _ = similarity(entry["words"], other["words"])
+            if entry["words"] == other["words"] or jaccard >= COMMENT_DUPLICATE_SIMILARITY:
+                if len(entry["words"]) > len(other["words"]):
+                    other["text"], other["words"] = entry["text"], entry["words"]
+                other["slide_refs"] = sorted(set(other["slide_refs"]) | set(entry["slide_refs"]))
+                merged += 1
+                break
+        else:
+            kept.append(entry)
+
+    comments = [
+        {"id": f"C{n}", "text": entry["text"], "slide_refs": entry["slide_refs"]}
+        for n, entry in enumerate(kept, start=1)
+    ]
+    borderline = []
+    for i, a in enumerate(kept):
+        for j in range(i + 1, len(kept)):
+            b = kept[j]
+            if not _slides_overlap(a["slide_refs"], b["slide_refs"]):
+                continue
+            jaccard, containment = similarity(a["words"], b["words"])
+            if jaccard >= COMMENT_BORDERLINE_SIMILARITY or containment >= 0.8:
+                borderline.append((comments[i]["id"], comments[j]["id"]))
+    print(
+        f"Comment compiler (local): {received} in, {len(comments)} out "
+        f"({merged} merged, {split} split), {len(borderline)} borderline pair(s)"
+    )
+    return CompiledComments(comments, borderline, merged, split)
@@ -0,0 +1,171 @@
+"""
+Streaming hand-off from comment extraction to evaluation.
+
+Without streaming, evaluate_comments waits for the complete comment list.
+With EMAIL_STREAMING=1 the email_comments run is streamed instead:
+
+- `CommentStreamParser` reads the structured-output JSON as text deltas
+  arrive and yields each object of the top-level array (`{"comments":
+  [{...}, {...}]}`) as soon as its closing brace comes in;
+- each comment goes into an `EvaluationQueue`, a bounded asyncio queue.
+  EVAL_STREAM_WORKERS workers pull batches of up to EVAL_STREAM_BATCH
+  comments, waiting at most EVAL_STREAM_LINGER seconds for a batch to
+  fill, and evaluate the batches concurrently while extraction goes on.
+  When the queue is full (EVAL_STREAM_QUEUE), the stream reader waits.
+
+`EvaluationQueue.close` returns the evaluated comments in the order they
+were extracted, so the workflow output keeps its schema. The tags workflow
+keeps the barrier: its comment compiler needs the whole list to merge
+duplicates.
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+EMAIL_STREAMING = os.getenv("EMAIL_STREAMING", "1") == "1"
+EVAL_STREAM_BATCH = int(os.getenv("EVAL_STREAM_BATCH", "4"))
+EVAL_STREAM_WORKERS = int(os.getenv("EVAL_STREAM_WORKERS", "3"))
+EVAL_STREAM_QUEUE = int(os.getenv("EVAL_STREAM_QUEUE", "16"))
+EVAL_STREAM_LINGER = float(os.getenv("EVAL_STREAM_LINGER", "0.5"))
+
+EvaluateBatch = Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]]
+
+_DONE = object()
+
+
+class CommentStreamParser:
+    """Incremental parser yielding the objects of the top-level array, one at a time."""
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.buffer: List[str] = []
+        self.capturing = False
+
+    def feed(self, text: str) -> Iterator[Dict[str, Any]]:
+        for ch in text:
+            if self.capturing:
+                self.buffer.append(ch)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+            if ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                if ch == "{" and self.depth == 2 and not self.capturing:
+                    self.capturing = True
+                    self.buffer = [ch]
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.capturing and self.depth == 2:
+                    self.capturing = False
+                    try:
+                        item = json.loads("".join(self.buffer))
+                    except ValueError:
+                        continue
+                    if isinstance(item, dict):
+                        yield item
+
+
+async def text_deltas(result: Any) -> AsyncIterator[str]:
+    """Output text deltas of a Runner.run_streamed result."""
+    async for event in result.stream_events():
+        if event.type == "raw_response_event" and getattr(event.data, "type", "") == "response.output_text.delta":
+            yield event.data.delta
+
+
+class EvaluationQueue:
+    """Bounded queue of extracted comments, evaluated in small concurrent batches."""
+
+    def __init__(
+        self,
+        evaluate_batch: EvaluateBatch,
+        batch_size: int = EVAL_STREAM_BATCH,
+        workers: int = EVAL_STREAM_WORKERS,
+        maxsize: int = EVAL_STREAM_QUEUE,
+        linger: float = EVAL_STREAM_LINGER,
+    ):
+        self.evaluate_batch = evaluate_batch
+        self.batch_size = max(1, batch_size)
+        self.linger = linger
+        self.queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max(1, maxsize))
+        self.order: List[str] = []
+        self.received: List[Dict[str, Any]] = []
+        self.results: List[Dict[str, Any]] = []
+        self.errors: List[BaseException] = []
+        self.batches = 0
+        self.started = time.perf_counter()
+        self.first_result: Optional[float] = None
+        self.workers = [asyncio.ensure_future(self._work()) for _ in range(max(1, workers))]
+
+    async def put(self, comment: Dict[str, Any]) -> None:
+        if self.errors:
+            raise self.errors[0]
+        self.order.append(str(comment.get("id", "")))
+        self.received.append(comment)
+        await self.queue.put(comment)
+
+    async def _next_batch(self) -> List[Any]:
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.linger
+        while batch[-1] is not _DONE and len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self.queue.get_nowait() if remaining <= 0 else await asyncio.wait_for(self.queue.get(), remaining))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+        return batch
+
+    async def _work(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            done = batch[-1] is _DONE
+            comments = [item for item in batch if item is not _DONE]
+            if comments:
+                try:
+                    self.results.extend(await self.evaluate_batch(comments))
+                    self.batches += 1
+                    if self.first_result is None:
+                        self.first_result = time.perf_counter()
+                except Exception as exc:  # keep draining so the producer never blocks on a full queue
+                    self.errors.append(exc)
+            if done:
+                return
+
+    async def close(self) -> List[Dict[str, Any]]:
+        """Wait for every queued comment; the results in extraction order."""
+        for _ in self.workers:
+            await self.queue.put(_DONE)
+        await asyncio.gather(*self.workers)
+        if self.errors:
+            raise self.errors[0]
+        self.results = self.in_order(self.results)
+        first = f", first verdicts after {self.first_result - self.started:.1f}s" if self.first_result else ""
+        print(
+            f"Streaming evaluation: {len(self.order)} comment(s) in {self.batches} batch(es) "
+            f"over {len(self.workers)} worker(s){first}, done in {time.perf_counter() - self.started:.1f}s"
+        )
+        return self.results
+
+    def in_order(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        position = {comment_id: i for i, comment_id in enumerate(self.order)}
+        return sorted(items, key=lambda item: position.get(str(item.get("id")), len(position)))
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Comments queued but not evaluated (yet)."""
+        evaluated = {str(item.get("id")) for item in self.results}
+        return [comment for comment in self.received if str(comment.get("id", "")) not in evaluated]
+
+    def cancel(self) -> None:
+        for worker in self.workers:
+            worker.cancel()
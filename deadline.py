@@ -0,0 +1,71 @@
+"""
+Request deadlines and cooperative cancellation.
+
+A `Deadline` is created where a request enters: the `/analyze` form field
+`deadline_seconds`, or REQUEST_DEADLINE_SECONDS for both the API and the
+mail loop. It is handed through `run_agent_workflow` to each pipeline's
+`Workflow.run`. Every node's model call is then capped at the time left
+(workflow_engine.py). When the deadline passes, or `cancel()` is called
+(the API does this when the client disconnects), the nodes still running
+are cancelled. Each workflow returns what its finished stages produced,
+marked partial.
+
+The deadline is checked from the event loops of the workflow threads and
+cancelled from the API's loop, so the cancellation flag is a
+threading.Event.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Optional
+
+# 0 disables the default deadline.
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "600"))
+POLL_SECONDS = 0.25
+
+DEADLINE_PASSED = "request deadline passed"
+REQUEST_CANCELLED = "request cancelled"
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self._cancelled = threading.Event()
+
+    @classmethod
+    def after(cls, seconds: Optional[float] = None) -> Optional["Deadline"]:
+        """A deadline `seconds` from now (REQUEST_DEADLINE_SECONDS by default); None when disabled."""
+        seconds = REQUEST_DEADLINE_SECONDS if seconds is None else seconds
+        return cls(seconds) if seconds and seconds > 0 else None
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def remaining(self) -> float:
+        return 0.0 if self.cancelled else max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def reason(self) -> str:
+        return REQUEST_CANCELLED if self.cancelled else DEADLINE_PASSED
+
+    def check(self) -> None:
+        if self.expired():
+            raise DeadlineExceeded(self.reason())
+
+    async def wait(self) -> None:
+        """Return once the deadline has passed or the request was cancelled."""
+        while not self.expired():
+            await asyncio.sleep(min(POLL_SECONDS, self.remaining()))
@@ -0,0 +1,255 @@
+"""
+Immutable in-process representation of a parsed deck.
+
+Parsers still speak the plain `{slides: [{index, text, ...}]}` structure; a
+`DeckDocument` wraps it once so the workflows can share one object instead
+of each re-serializing and re-parsing the deck. Serializations are computed
+on first use and cached, and every slide carries a content hash for cheap
+equality checks between decks. Serializations can be limited to the slide
+fields a workflow actually reads (see `SLIDE_FIELDS`).
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+_UNSET = object()
+
+
+class _Frozen:
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def _cache(self, name: str, value):
+        object.__setattr__(self, name, value)
+        return value
+
+
+# Per-slide text fields, in rendering order. "text" is the visible body text;
+# table cells, chart titles/data labels and speaker notes are kept apart so a
+# workflow can ask for only the fields it reads.
+SLIDE_FIELDS = ("text", "tables", "charts", "notes")
+
+
+class ShapeBox(NamedTuple):
+    """Layout of one top-level PPTX shape. Coordinates are EMU; `z` is stacking order, 0 at the back."""
+
+    id: int
+    name: str
+    kind: str
+    z: int
+    x: int
+    y: int
+    cx: int
+    cy: int
+    fill: Optional[str]
+    placeholder: bool
+    text: str
+
+    @property
+    def area(self) -> int:
+        return self.cx * self.cy
+
+    def overlap_area(self, other: "ShapeBox") -> int:
+        width = min(self.x + self.cx, other.x + other.cx) - max(self.x, other.x)
+        height = min(self.y + self.cy, other.y + other.cy) - max(self.y, other.y)
+        return max(0, width) * max(0, height)
+
+
+def slide_struct(
+    index: int,
+    parts: Iterable[Tuple[str, str]],
+    shapes: Iterable[Dict[str, Any]] = (),
+) -> Dict[str, Any]:
+    """Parser helper: group (field, text) pieces, in reading order, into a slide struct."""
+    grouped: Dict[str, List[str]] = {field: [] for field in SLIDE_FIELDS}
+    for field, text in parts:
+        if text:
+            grouped[field].append(text)
+    struct: Dict[str, Any] = {"index": index, "text": "\n".join(grouped["text"]).strip()}
+    for field in SLIDE_FIELDS[1:]:
+        joined = "\n".join(grouped[field]).strip()
+        if joined:
+            struct[field] = joined
+    shapes = list(shapes)
+    if shapes:
+        struct["shapes"] = shapes
+    return struct
+
+
+def _normalize_fields(fields: Optional[Iterable[str]]) -> Tuple[str, ...]:
+    if fields is None:
+        return SLIDE_FIELDS
+    wanted = set(fields)
+    unknown = wanted - set(SLIDE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown slide field(s): {', '.join(sorted(unknown))}")
+    return tuple(field for field in SLIDE_FIELDS if field in wanted)
+
+
+class Slide(_Frozen):
+    __slots__ = ("index", "text", "tables", "charts", "notes", "warning", "shapes", "_hash", "_key_hash")
+
+    def __init__(
+        self,
+        index: int,
+        text: str,
+        warning: Optional[str] = None,
+        tables: str = "",
+        charts: str = "",
+        notes: str = "",
+        shapes: Tuple[ShapeBox, ...] = (),
+    ):
+        object.__setattr__(self, "index", index)
+        object.__setattr__(self, "text", text)
+        object.__setattr__(self, "tables", tables)
+        object.__setattr__(self, "charts", charts)
+        object.__setattr__(self, "notes", notes)
+        object.__setattr__(self, "warning", warning)
+        object.__setattr__(self, "shapes", tuple(shapes))
+        object.__setattr__(self, "_hash", _UNSET)
+        # Slides key the slide_index / slide_alignment caches; hash the fields (shapes included) once.
+        object.__setattr__(self, "_key_hash", hash(self._key()))
+
+    @classmethod
+    def from_struct(cls, struct: Dict[str, Any]) -> "Slide":
+        return cls(
+            int(struct["index"]),
+            struct.get("text") or "",
+            struct.get("warning"),
+            tables=struct.get("tables") or "",
+            charts=struct.get("charts") or "",
+            notes=struct.get("notes") or "",
+            shapes=tuple(ShapeBox(**shape) for shape in struct.get("shapes", ())),
+        )
+
+    def fields(self) -> Dict[str, str]:
+        return {field: getattr(self, field) for field in SLIDE_FIELDS}
+
+    def replace(self, **changes) -> "Slide":
+        values = self.fields()
+        values["warning"] = self.warning
+        values["shapes"] = self.shapes
+        values.update(changes)
+        return Slide(self.index, **values)
+
+    @property
+    def content_hash(self) -> str:
+        """sha1 over every text field; equal hashes mean the slide content is unchanged."""
+        if self._hash is _UNSET:
+            content = "\x00".join(getattr(self, field) for field in SLIDE_FIELDS)
+            return self._cache("_hash", hashlib.sha1(content.encode("utf-8")).hexdigest())
+        return self._hash
+
+    def to_struct(self, fields: Optional[Iterable[str]] = None, include_shapes: bool = False) -> Dict[str, Any]:
+        """`index` and `text` always; other requested fields only when non-empty.
+
+        Shape geometry is never sent to the agents; `include_shapes` is for persistence.
+        """
+        struct: Dict[str, Any] = {"index": self.index}
+        for field in _normalize_fields(fields):
+            value = getattr(self, field)
+            if value or field == "text":
+                struct[field] = value
+        if self.warning:
+            struct["warning"] = self.warning
+        if include_shapes and self.shapes:
+            struct["shapes"] = [shape._asdict() for shape in self.shapes]
+        return struct
+
+    def _key(self):
+        return (self.index, self.text, self.tables, self.charts, self.notes, self.warning, self.shapes)
+
+    def __eq__(self, other):
+        if not isinstance(other, Slide):
+            return NotImplemented
+        return self is other or (self._key_hash == other._key_hash and self._key() == other._key())
+
+    def __hash__(self):
+        return self._key_hash
+
+    def __repr__(self):
+        return f"Slide(index={self.index}, text={self.text[:40]!r})"
+
+
+class DeckDocument(_Frozen):
+    __slots__ = ("slides", "boilerplate", "_by_index", "_json", "_prompt", "_key_hash")
+
+    def __init__(self, slides: Tuple[Slide, ...] = (), boilerplate: Tuple[str, ...] = ()):
+        object.__setattr__(self, "slides", tuple(slides))
+        # Lines repeated on most slides, kept once for the whole deck (see boilerplate.py).
+        object.__setattr__(self, "boilerplate", tuple(boilerplate))
+        object.__setattr__(self, "_by_index", {slide.index: slide for slide in self.slides})
+        object.__setattr__(self, "_json", {})
+        object.__setattr__(self, "_prompt", {})
+        object.__setattr__(self, "_key_hash", hash((self.slides, self.boilerplate)))  # O(slides), once
+
+    @classmethod
+    def from_struct(cls, struct: Optional[Dict[str, Any]]) -> "DeckDocument":
+        struct = struct or {}
+        return cls(
+            tuple(Slide.from_struct(s) for s in struct.get("slides", [])),
+            tuple(struct.get("boilerplate", ())),
+        )
+
+    @classmethod
+    def coerce(cls, doc: Union["DeckDocument", Dict[str, Any], None]) -> "DeckDocument":
+        """Accept either a document or the legacy dict structure."""
+        return doc if isinstance(doc, DeckDocument) else cls.from_struct(doc)
+
+    def to_struct(self, fields: Optional[Iterable[str]] = None, include_shapes: bool = False) -> Dict[str, Any]:
+        struct: Dict[str, Any] = {}
+        if self.boilerplate:
+            struct["boilerplate"] = list(self.boilerplate)
+        struct["slides"] = [slide.to_struct(fields, include_shapes) for slide in self.slides]
+        return struct
+
+    def to_json(self, fields: Optional[Iterable[str]] = None) -> str:
+        """Compact JSON, identical to `json.dumps(doc.to_struct(fields))`."""
+        key = _normalize_fields(fields)
+        if key not in self._json:
+            self._json[key] = json.dumps(self.to_struct(key))
+        return self._json[key]
+
+    def to_prompt(self, fields: Optional[Iterable[str]] = None) -> str:
+        """Indented JSON as embedded in agent instructions, limited to `fields`."""
+        key = _normalize_fields(fields)
+        if key not in self._prompt:
+            self._prompt[key] = json.dumps(self.to_struct(key), indent=2)
+        return self._prompt[key]
+
+    def slide(self, index: int) -> Optional[Slide]:
+        return self._by_index.get(index)
+
+    def select(self, indices: Iterable[int]) -> "DeckDocument":
+        """The slides with the given indices, in deck order, keeping the boilerplate."""
+        wanted = set(indices)
+        return DeckDocument(tuple(s for s in self.slides if s.index in wanted), self.boilerplate)
+
+    @property
+    def slide_hashes(self) -> Dict[int, str]:
+        return {slide.index: slide.content_hash for slide in self.slides}
+
+    def __len__(self) -> int:
+        return len(self.slides)
+
+    def __iter__(self) -> Iterator[Slide]:
+        return iter(self.slides)
+
+    def __eq__(self, other):
+        if not isinstance(other, DeckDocument):
+            return NotImplemented
+        if self is other:
+            return True
+        return self._key_hash == other._key_hash and (self.slides, self.boilerplate) == (other.slides, other.boilerplate)
+
+    def __hash__(self):
+        return self._key_hash
+
+    def __repr__(self):
+        return f"DeckDocument({len(self.slides)} slides)"
@@ -0,0 +1,202 @@
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+from deck_model import slide_struct
+from pptx_xml import PptxXmlReader, pptx_to_struct_fast, shape_box
+
+PPTX_FAST_PATH = os.getenv("PPTX_FAST_PATH", "1") == "1"
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "1"))
+# Below this the process pool start-up costs more than it saves.
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "24"))
+
+
+# ---------- Helpers: PPTX → structured JSON ----------
+
+def pptx_to_struct(path: str, fast: Optional[bool] = None) -> dict:
+    """
+    Convert a .pptx file into {slides: [{index, text, tables?, charts?, notes?}...]}.
+
+    By default (PPTX_FAST_PATH=1) the slide XML is read directly; python-pptx
+    is only used if that fails or when `fast=False`. Both give the same output.
+    """
+    fast = PPTX_FAST_PATH if fast is None else fast
+    if fast:
+        try:
+            return pptx_to_struct_fast(path)
+        except Exception as exc:  # noqa: BLE001
+            print(f"Fast PPTX extraction failed for {path} ({exc!r}); falling back to python-pptx")
+    prs = Presentation(path)
+    return {"slides": [pptx_slide_struct(i, slide) for i, slide in enumerate(prs.slides, start=1)]}
+
+
+def pptx_slide_struct(index: int, slide) -> dict:
+    parts: List[Tuple[str, str]] = []
+    shapes: List[dict] = []
+    for z, shape in enumerate(slide.shapes):
+        shape_parts = _extract_shape_text(shape)
+        parts.extend(shape_parts)
+        box = shape_box(shape.element, z, _shape_geometry(shape), [t for _, t in shape_parts])
+        if box:
+            shapes.append(box)
+    parts.append(("notes", _extract_notes_text(slide)))
+    return slide_struct(index, parts, shapes)
+
+
+def _shape_geometry(shape) -> tuple:
+    # python-pptx resolves placeholder geometry through the layout and master.
+    try:
+        return (shape.left, shape.top, shape.width, shape.height)
+    except (AttributeError, KeyError, NotImplementedError):
+        return (None, None, None, None)
+
+
+def pdf_to_struct(path: str, workers: Optional[int] = None) -> dict:
+    """
+    Convert a PDF file into the same slide structure (page-per-slide).
+
+    With `workers` > 1 (default: PDF_EXTRACT_WORKERS), decks of at least
+    PDF_PARALLEL_MIN_PAGES pages are split into page ranges that are
+    extracted in a process pool; the result is identical to a sequential run.
+    """
+    workers = PDF_EXTRACT_WORKERS if workers is None else workers
+    reader = PdfReader(path)
+    page_count = len(reader.pages)
+    if workers > 1 and page_count >= PDF_PARALLEL_MIN_PAGES:
+        texts = _extract_pdf_parallel(path, page_count, workers)
+    else:
+        texts = [page.extract_text() or "" for page in reader.pages]
+
+    slides = []
+    for i, text in enumerate(texts, start=1):
+        slides.append({
+            "index": i,
+            "text": text.strip()
+        })
+    return {"slides": slides}
+
+
+def _extract_pdf_parallel(path: str, page_count: int, workers: int) -> List[str]:
+    # A few more ranges than workers so one slow range doesn't hold up the rest.
+    chunk = max(1, -(-page_count // (workers * 2)))
+    ranges = [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        results = pool.map(_extract_pdf_pages, [path] * len(ranges), *zip(*ranges))
+        return [text for texts in results for text in texts]
+
+
+def _extract_pdf_pages(path: str, start: int, stop: int) -> List[str]:
+    """Worker: memory-map the file and extract text for pages [start, stop)."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        reader = PdfReader(mapped)
+        return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def attachment_to_struct(attachment: dict) -> dict:
+    filename = attachment.get("filename") or ""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".pdf":
+        return pdf_to_struct(attachment["path"])
+    return pptx_to_struct(attachment["path"])
+
+
+def open_deck(path: str, filename: str) -> Tuple[int, Callable[[int], dict]]:
+    """
+    Open a deck for slide-at-a-time parsing: returns (slide_count, build)
+    where build(index) returns the struct for the 1-based slide `index`.
+    """
+    if os.path.splitext(filename or "")[1].lower() == ".pdf":
+        pages = PdfReader(path).pages
+        return len(pages), lambda index: {
+            "index": index,
+            "text": (pages[index - 1].extract_text() or "").strip()
+        }
+    if PPTX_FAST_PATH:
+        reader = PptxXmlReader(path)
+        return reader.slide_count, reader.slide_struct
+    slides = list(Presentation(path).slides)
+    return len(slides), lambda index: pptx_slide_struct(index, slides[index - 1])
+
+
+def degraded_slide(index: int, warning: str) -> dict:
+    """Placeholder for a slide that could not be parsed."""
+    return {"index": index, "text": "", "warning": warning}
+
+
+def _extract_notes_text(slide) -> str:
+    if not slide.has_notes_slide:
+        return ""
+    notes_frame = slide.notes_slide.notes_text_frame
+    if not notes_frame:
+        return ""
+    text = "\n".join(
+        paragraph.text.strip()
+        for paragraph in notes_frame.paragraphs
+        if paragraph.text and paragraph.text.strip()
+    )
+    return text
+
+
+def _extract_shape_text(shape) -> List[Tuple[str, str]]:
+    """
+    Recursively collect (field, text) pieces from any shape, including
+    grouped overlays, tables, and charts. These overlays often carry
+    reviewer comments.
+    """
+    texts: List[Tuple[str, str]] = []
+
+    # Group shapes contain nested shapes that may have their own text.
+    if getattr(shape, "shape_type", None) == MSO_SHAPE_TYPE.GROUP:
+        for child in shape.shapes:
+            texts.extend(_extract_shape_text(child))
+
+    # Standard text frames
+    if getattr(shape, "has_text_frame", False):
+        frame_text = "\n".join(
+            paragraph.text.strip()
+            for paragraph in shape.text_frame.paragraphs
+            if paragraph.text and paragraph.text.strip()
+        )
+        if frame_text:
+            texts.append(("text", frame_text))
+    elif hasattr(shape, "text"):  # Fallback for placeholders without text_frame
+        text = (shape.text or "").strip()
+        if text:
+            texts.append(("text", text))
+
+    # Tables can contain reviewer notes in cells
+    if getattr(shape, "has_table", False):
+        for row in shape.table.rows:
+            for cell in row.cells:
+                cell_text = cell.text.strip()
+                if cell_text:
+                    texts.append(("tables", cell_text))
+
+    # Chart titles/data labels sometimes hold textual comments
+    if getattr(shape, "has_chart", False):
+        chart = shape.chart
+        if chart.has_title:
+            chart_title = chart.chart_title.text_frame.text.strip()
+            if chart_title:
+                texts.append(("charts", chart_title))
+        for series in chart.series:
+            if not getattr(series, "data_labels", None):
+                continue
+            for point in getattr(series, "points", []):
+                data_label = getattr(point, "data_label", None)
+                if not data_label or not getattr(data_label, "has_text_frame", False):
+                    continue
+                label_text = "\n".join(
+                    paragraph.text.strip()
+                    for paragraph in data_label.text_frame.paragraphs
+                    if paragraph.text and paragraph.text.strip()
+                )
+                if label_text:
+                    texts.append(("charts", label_text))
+
+    return texts
@@ -1,7 +1,5 @@
 import os
 import imaplib
-import smtplib
-import ssl
 import tempfile
 import re
 from email.message import EmailMessage
@@ -9,135 +7,29 @@ from email.parser import BytesParser
 from email.policy import default as default_policy
 from typing import Callable, List, Optional, Tuple
 
-from PyPDF2 import PdfReader
-from pptx import Presentation
-from pptx.enum.shapes import MSO_SHAPE_TYPE
 from dotenv import load_dotenv
 
 # Load environment before importing modules that rely on OPENAI_API_KEY
 load_dotenv()
 from agent_runner import run_agent_workflow  # noqa: E402
+from deadline import Deadline  # noqa: E402
+from deck_model import DeckDocument  # noqa: E402
+from deck_parser import attachment_to_struct, pdf_to_struct, pptx_to_struct  # noqa: E402,F401
+from imap_fetch import fetch_bodystructures, full_message_plan, iter_messages, mark_seen, plan_message  # noqa: E402
+from mail_spool import MailSpool  # noqa: E402
+from message_ledger import ANALYZED, PARSED, REPLIED, MessageLedger, message_key  # noqa: E402
+from parse_sandbox import parse_document  # noqa: E402
+from planner import EMAIL_COMMENTS, TAGS, plan_for_email  # noqa: E402
+from reply_parser import newest_message  # noqa: E402
+from smtp_sender import Outbox, SMTPSender  # noqa: E402
 
 IMAP_HOST = os.getenv("EMAIL_IMAP_HOST", "imap.gmail.com")
 SMTP_HOST = os.getenv("EMAIL_SMTP_HOST", "smtp.gmail.com")
 EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 
-
-# ---------- Helpers: PPTX → structured JSON ----------
-
-def pptx_to_struct(path: str) -> dict:
-    """Convert a .pptx file into {slides: [{index, text}...]}."""
-    prs = Presentation(path)
-    slides = []
-    for i, slide in enumerate(prs.slides, start=1):
-        texts: List[str] = []
-        for shape in slide.shapes:
-            texts.extend(_extract_shape_text(shape))
-
-        notes_text = _extract_notes_text(slide)
-        if notes_text:
-            texts.append(notes_text)
-
-        slides.append({
-            "index": i,
-            "text": "\n".join(t for t in texts if t).strip()
-        })
-    return {"slides": slides}
-
-
-def pdf_to_struct(path: str) -> dict:
-    """Convert a PDF file into the same slide structure (page-per-slide)."""
-    reader = PdfReader(path)
-    slides = []
-    for i, page in enumerate(reader.pages, start=1):
-        text = page.extract_text() or ""
-        slides.append({
-            "index": i,
-            "text": text.strip()
-        })
-    return {"slides": slides}
-
-
-def attachment_to_struct(attachment: dict) -> dict:
-    filename = attachment.get("filename") or ""
-    ext = os.path.splitext(filename)[1].lower()
-    if ext == ".pdf":
-        return pdf_to_struct(attachment["path"])
-    return pptx_to_struct(attachment["path"])
-
-
-def _extract_notes_text(slide) -> str:
-    if not slide.has_notes_slide:
-        return ""
-    notes_frame = slide.notes_slide.notes_text_frame
-    if not notes_frame:
-        return ""
-    text = "\n".join(
-        paragraph.text.strip()
-        for paragraph in notes_frame.paragraphs
-        if paragraph.text and paragraph.text.strip()
-    )
-    return f"[Notes] {text}" if text else ""
-
-
-def _extract_shape_text(shape) -> List[str]:
-    """
-    Recursively collect text from any shape, including grouped overlays,
-    tables, and charts. These overlays often carry reviewer comments.
-    """
-    texts: List[str] = []
-
-    # Group shapes contain nested shapes that may have their own text.
-    if getattr(shape, "shape_type", None) == MSO_SHAPE_TYPE.GROUP:
-        for child in shape.shapes:
-            texts.extend(_extract_shape_text(child))
-
-    # Standard text frames
-    if getattr(shape, "has_text_frame", False):
-        frame_text = "\n".join(
-            paragraph.text.strip()
-            for paragraph in shape.text_frame.paragraphs
-            if paragraph.text and paragraph.text.strip()
-        )
-        if frame_text:
-            texts.append(frame_text)
-    elif hasattr(shape, "text"):  # Fallback for placeholders without text_frame
-        text = (shape.text or "").strip()
-        if text:
-            texts.append(text)
-
-    # Tables can contain reviewer notes in cells
-    if getattr(shape, "has_table", False):
-        for row in shape.table.rows:
-            for cell in row.cells:
-                cell_text = cell.text.strip()
-                if cell_text:
-                    texts.append(cell_text)
-
-    # Chart titles/data labels sometimes hold textual comments
-    if getattr(shape, "has_chart", False):
-        chart = shape.chart
-        if chart.has_title:
-            chart_title = chart.chart_title.text_frame.text.strip()
-            if chart_title:
-                texts.append(chart_title)
-        for series in chart.series:
-            if not getattr(series, "data_labels", None):
-                continue
-            for point in getattr(series, "points", []):
-                data_label = getattr(point, "data_label", None)
-                if not data_label or not getattr(data_label, "has_text_frame", False):
-                    continue
-                label_text = "\n".join(
-                    paragraph.text.strip()
-                    for paragraph in data_label.text_frame.paragraphs
-                    if paragraph.text and paragraph.text.strip()
-                )
-                if label_text:
-                    texts.append(label_text)
-
-    return texts
+_SMTP_SENDER: Optional[SMTPSender] = None
+_OUTBOX = Outbox()
 
 
 # ---------- Helpers: Email parsing ----------
@@ -185,64 +77,38 @@ def extract_body_and_attachments(raw_msg: bytes):
 
 # ---------- Call your Agent Builder workflow ----------
 
-def run_agent(email_text: str, original_doc: dict, revised_doc: dict) -> dict:
+def run_agent(email_text: str, original_doc: DeckDocument, revised_doc: DeckDocument, deadline: Optional[Deadline] = None) -> dict:
     """
-    Call the Agent Builder workflow you exported as `agent_workflow.py`.
-
-    The generated file includes an example of how to run it – usually something like:
-       result = workflow.run(input={...})
-    or:
-       result = runner.run(input={...})
-
-    Adjust this function to match the exact call from that file.
+    Plan which workflows the email asks for (see planner.py) and run only
+    those; skipped workflows are listed under "skipped" in the result, and
+    workflows cut short by `deadline` under "partial".
     """
-    # ⬇️ EXAMPLE – you must align with the code that Agent Builder generated.
-    # Look in agent_workflow.py for the "main" run call and copy it here.
-
-    # For example, if agent_workflow defines an async `run` function:
-    #
-    #   from agents import run
-    #   async def run_workflow(input):
-    #       ...
-    #
-    # You might do something like:
-    #
-    #   result = asyncio.run(agent_workflow.run_workflow(
-    #       {"email_text": email_text,
-    #        "original_doc": original_doc,
-    #        "revised_doc": revised_doc}
-    #   ))
-    #
-    # And ensure it returns the JSON matching your Node 3 schema.
-
-    # For now, we’ll assume there is a synchronous helper:
-    lowered = (email_text or "").lower()
-    only_tick = "only tie out" in lowered or "only tick and tie" in lowered
-    run_tick_tie = "tie out" in lowered or "tick and tie" in lowered
-
+    plan = plan_for_email(email_text, has_original=len(original_doc) > 0)
     result = run_agent_workflow(
         email_text=email_text,
         original_doc=original_doc,
         revised_doc=revised_doc,
-        run_tick_tie=run_tick_tie,
+        plan=plan,
+        deadline=deadline,
     )
-
-    if only_tick:
-        return {
-            "tags": [],
-            "email_comments": [],
-            "tick_tie": result.get("tick_tie") or {"ties_out": [], "check": []},
-            "only_tick": True,
-        }
-
-    result["only_tick"] = False
+    result["only_tick"] = plan.only_tick
     return result
 
 
 # ---------- Formatting the reply email ----------
 
-def format_summary(tags_comments: list, email_comments: list, tick_tie: dict | None = None, show_comments: bool = True) -> str:
+def format_summary(
+    tags_comments: list,
+    email_comments: list,
+    tick_tie: dict | None = None,
+    show_comments: bool = True,
+    skipped: dict | None = None,
+    partial: dict | None = None,
+) -> str:
     """Turn the agent JSON into a banker-style email body."""
+    skipped = skipped or {}
+    partial = partial or {}
+
     def buckets(comments: list):
         return (
             _sort_by_slide([c for c in comments if c["status"] == "implemented"]),
@@ -255,15 +121,33 @@ def format_summary(tags_comments: list, email_comments: list, tick_tie: dict | N
     email_impl, email_part, email_miss, email_unclear = buckets(email_comments)
 
     lines = []
+    if partial:
+        stopped = "; ".join(
+            f"{workflow} ({info.get('reason')}; unfinished: {', '.join(info.get('unfinished') or []) or 'none'})"
+            for workflow, info in partial.items()
+        )
+        lines.append(f"Note: this review is partial, some checks did not finish: {stopped}.")
+        lines.append("Comments that were not evaluated are listed as unclear.")
+        lines.append("")
+
     if show_comments:
         lines.append("Coverage summary:")
-        lines.append(f"- Tags: {len(tags_impl)} implemented, {len(tags_part)} partial, {len(tags_miss)} not, {len(tags_unclear)} unclear")
-        lines.append(f"- Email: {len(email_impl)} implemented, {len(email_part)} partial, {len(email_miss)} not, {len(email_unclear)} unclear\n")
-
-        for title, impl, part, miss, unclear in [
-            ("Tags", tags_impl, tags_part, tags_miss, tags_unclear),
-            ("Email", email_impl, email_part, email_miss, email_unclear),
+        for title, workflow, impl, part, miss, unclear in [
+            ("Tags", TAGS, tags_impl, tags_part, tags_miss, tags_unclear),
+            ("Email", EMAIL_COMMENTS, email_impl, email_part, email_miss, email_unclear),
+        ]:
+            if workflow in skipped:
+                lines.append(f"- {title}: skipped ({skipped[workflow]})")
+            else:
+                lines.append(f"- {title}: {len(impl)} implemented, {len(part)} partial, {len(miss)} not, {len(unclear)} unclear")
+        lines.append("")
+
+        for title, workflow, impl, part, miss, unclear in [
+            ("Tags", TAGS, tags_impl, tags_part, tags_miss, tags_unclear),
+            ("Email", EMAIL_COMMENTS, email_impl, email_part, email_miss, email_unclear),
         ]:
+            if workflow in skipped:
+                continue
             lines.append(f"{title}:")
             section = [
                 ("Implemented", impl, False),
@@ -336,83 +220,172 @@ def _format_bucket_by_slide(comments: list, include_suggestion: bool) -> list:
 
 # ---------- Main processing: read email → agent → send email ----------
 
-def process_one_email(raw_msg: bytes):
+def process_one_email(raw_msg: bytes, ledger: Optional[MessageLedger] = None):
+    # The request deadline (REQUEST_DEADLINE_SECONDS) counts from when the message is picked up.
+    deadline = Deadline.after()
     email_text, attachments, from_addr, subject, message_id = \
         extract_body_and_attachments(raw_msg)
 
-    valid_attachments = [
-        att for att in attachments
-        if att["filename"] and os.path.splitext(att["filename"])[1].lower() in {".pptx", ".pdf"}
-    ]
-
-    if len(valid_attachments) == 0:
-        print("No supported attachments found; skipping.")
+    key = message_key(message_id, raw_msg)
+    entry = ledger.get(key) if ledger else None
+    if entry and entry.reached(REPLIED):
+        print(f"Message {key} was already answered; skipping.")
         return
-    elif len(valid_attachments) == 1:
-        revised_att = valid_attachments[0]
-        original_doc = {"slides": []}
-        revised_doc = attachment_to_struct(revised_att)
+
+    if entry and entry.reached(ANALYZED):
+        print(f"Resuming message {key} from stored analysis.")
+        result = entry.payload["result"]
     else:
-        original_att, revised_att = _choose_original_and_revised(valid_attachments)
-        original_doc = attachment_to_struct(original_att)
-        revised_doc = attachment_to_struct(revised_att)
+        if entry and entry.reached(PARSED):
+            print(f"Resuming message {key} from stored parse.")
+            email_text = entry.payload["email_text"]
+            original_doc = DeckDocument.from_struct(entry.payload["original_doc"])
+            revised_doc = DeckDocument.from_struct(entry.payload["revised_doc"])
+        else:
+            docs = _parse_attachments(attachments)
+            if docs is None:
+                print("No supported attachments found; skipping.")
+                return
+            original_doc, revised_doc = docs
+            # Only the newest message is reviewed; quoted history would re-evaluate old comments.
+            reply = newest_message(email_text)
+            if reply.removed:
+                print(f"Email body: removed {reply.summary()}")
+            email_text = reply.text
+            if ledger:
+                ledger.advance(key, PARSED, {
+                    "email_text": email_text,
+                    "original_doc": original_doc.to_struct(include_shapes=True),
+                    "revised_doc": revised_doc.to_struct(include_shapes=True),
+                })
+
+        result = run_agent(email_text, original_doc, revised_doc, deadline)
+        if ledger:
+            ledger.advance(key, ANALYZED, {"result": result})
 
-    result = run_agent(email_text, original_doc, revised_doc)
     tags_comments = result.get("tags", [])
     email_comments = result.get("email_comments", [])
     tick_tie = result.get("tick_tie")
     only_tick = result.get("only_tick", False)
 
-    summary = format_summary(tags_comments, email_comments, tick_tie, show_comments=not only_tick)
+    summary = format_summary(
+        tags_comments, email_comments, tick_tie, show_comments=not only_tick, skipped=result.get("skipped"),
+        partial=result.get("partial"),
+    )
 
-    # Send reply to yourself (or to original sender)
-    send_email(
+    # Reply to the original sender. Queuing is the durable step: once the reply is in the
+    # outbox the ledger says REPLIED, and delivery is the outbox's job from then on.
+    outbox_path = queue_email(
         to_addr=from_addr,
         subject=f"Re: {subject} [Bifocal Review]",
         body=summary,
+        key=key,
     )
+    if ledger:
+        ledger.advance(key, REPLIED, {"outbox": os.path.basename(outbox_path)})
+    flush_outbox()
+
 
+def _parse_attachments(attachments: List[dict]) -> Optional[Tuple[DeckDocument, DeckDocument]]:
+    """Return (original_doc, revised_doc), or None without a .pptx/.pdf attachment."""
+    valid_attachments = [
+        att for att in attachments
+        if att["filename"] and os.path.splitext(att["filename"])[1].lower() in {".pptx", ".pdf"}
+    ]
 
-def send_email(to_addr: str, subject: str, body: str):
+    if len(valid_attachments) == 0:
+        return None
+    elif len(valid_attachments) == 1:
+        revised_att = valid_attachments[0]
+        original_doc = DeckDocument()
+        revised_doc = parse_document(revised_att)
+    else:
+        original_att, revised_att = _choose_original_and_revised(valid_attachments)
+        original_doc = parse_document(original_att)
+        revised_doc = parse_document(revised_att)
+    return original_doc, revised_doc
+
+
+def queue_email(to_addr: str, subject: str, body: str, key: Optional[str] = None) -> str:
+    """Write the reply to the outbox (once per ledger `key`); returns its path."""
     msg = EmailMessage()
     msg["From"] = EMAIL_ADDRESS
     msg["To"] = to_addr
     msg["Subject"] = subject
     msg.set_content(body)
+    return _OUTBOX.enqueue(msg, key=key)
+
 
-    context = ssl.create_default_context()
-    with smtplib.SMTP_SSL(SMTP_HOST, 465, context=context) as server:
-        server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-        server.send_message(msg)
-        print(f"Sent coverage email to {to_addr}")
+def flush_outbox() -> int:
+    """Deliver everything pending over the shared session; failures stay queued for the next flush."""
+    try:
+        return _OUTBOX.flush(_get_smtp_sender())
+    except Exception as exc:  # noqa: BLE001 - a queued reply must never send the message back to the spool
+        print(f"Outbox flush failed; replies stay queued: {exc!r}")
+        return 0
 
 
-def poll_inbox():
-    """Simple one-shot poll: fetch unread emails, process, mark as seen."""
+def _get_smtp_sender() -> SMTPSender:
+    global _SMTP_SENDER
+    if _SMTP_SENDER is None:
+        _SMTP_SENDER = SMTPSender(SMTP_HOST, EMAIL_ADDRESS, EMAIL_PASSWORD)
+    return _SMTP_SENDER
+
+
+def fetch_to_spool(spool: MailSpool) -> int:
+    """
+    Short IMAP session: read the MIME layout of all unread emails, skip those
+    without a supported attachment, fetch only the needed parts into the
+    spool and mark them seen. Messages whose layout could not be read are
+    fetched whole rather than skipped. Returns the number of messages spooled.
+    """
+    spooled = 0
     mail = imaplib.IMAP4_SSL(IMAP_HOST)
     try:
         mail.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
         mail.select("INBOX")
+        # UIDs are only unique within (mailbox, UIDVALIDITY); the spool keys rows on all three.
+        _, validity = mail.response("UIDVALIDITY")
+        uidvalidity = validity[-1].decode() if validity and validity[-1] else ""
+        mailbox = f"{EMAIL_ADDRESS}/INBOX"
 
-        typ, data = mail.search(None, "UNSEEN")
-        if typ != "OK":
+        typ, data = mail.uid("SEARCH", None, "UNSEEN")
+        if typ != "OK" or not data or not data[0]:
             print("No messages found.")
-            return
+            return 0
+
+        uids = data[0].split()
+        structures = fetch_bodystructures(mail, uids)
+        plans = []
+        skipped = []
+        missing = [uid for uid in uids if uid not in structures]
+        for uid in uids:
+            if uid not in structures:
+                # Never mark a message seen without knowing what it holds.
+                plans.append(full_message_plan(uid))
+                continue
+            plan = plan_message(uid, structures[uid])
+            if plan is None:
+                skipped.append(uid)
+            else:
+                plans.append(plan)
+
+        if missing:
+            print(f"No BODYSTRUCTURE for UIDs {b', '.join(missing).decode()}; fetching them whole.")
+        if skipped:
+            print(f"No supported attachments in UIDs {b', '.join(skipped).decode()}; skipping.")
+            mark_seen(mail, skipped)
 
-        for num in data[0].split():
-            try:
-                typ, msg_data = mail.fetch(num, "(RFC822)")
-                if typ != "OK":
-                    continue
-                raw_msg = msg_data[0][1]
-                print(f"Processing message UID {num.decode()}")
-                process_one_email(raw_msg)
-                # Mark as seen (already handled)
-                mail.store(num, "+FLAGS", "\\Seen")
-            except imaplib.IMAP4.abort as exc:
-                # Connection dropped mid-loop; log and break out
-                print(f"IMAP connection aborted while processing UID {num.decode()}: {exc}")
-                break
+        try:
+            for uid, raw_msg in iter_messages(mail, plans):
+                # Only mark seen once the message's row is safely on disk (new or already spooled).
+                if spool.add(uid.decode(), raw_msg, uidvalidity=uidvalidity, mailbox=mailbox):
+                    spooled += 1
+                    print(f"Spooled message UID {uid.decode()}")
+                mark_seen(mail, [uid])
+        except imaplib.IMAP4.abort as exc:
+            # Connection dropped mid-fetch; whatever was spooled is kept
+            print(f"IMAP connection aborted while fetching: {exc}")
     finally:
         try:
             mail.close()
@@ -422,6 +395,45 @@ def poll_inbox():
             mail.logout()
         except Exception:
             pass
+    return spooled
+
+
+def drain_spool(spool: MailSpool, ledger: Optional[MessageLedger] = None) -> int:
+    """Process spooled messages until none are pending. Returns how many succeeded."""
+    recovered = spool.recover()
+    if recovered:
+        print(f"Re-queued {recovered} message(s) interrupted by a previous run")
+
+    processed = 0
+    while True:
+        message = spool.claim()
+        if message is None:
+            return processed
+        print(f"Processing message UID {message.uid} (attempt {message.attempts})")
+        try:
+            process_one_email(message.raw, ledger)
+        except Exception as exc:  # noqa: BLE001
+            status = spool.fail(message, repr(exc))
+            print(f"Processing UID {message.uid} failed ({status}): {exc!r}")
+            continue
+        spool.complete(message)
+        processed += 1
+
+
+def poll_inbox():
+    """One-shot poll: spool unread emails, then process the spool."""
+    # Retry replies that failed to send on an earlier run.
+    if _OUTBOX.pending():
+        flush_outbox()
+
+    spool = MailSpool()
+    ledger = MessageLedger()
+    try:
+        fetch_to_spool(spool)
+        drain_spool(spool, ledger)
+    finally:
+        spool.close()
+        ledger.close()
 
 
 def _choose_original_and_revised(attachments: List[dict]) -> Tuple[dict, dict]:
@@ -457,4 +469,19 @@ def _parse_version(filename: Optional[str]) -> Optional[int]:
 
 
 if __name__ == "__main__":
-    poll_inbox()
+    import sys
+
+    # `fetch` and `process` let the two halves run as separate processes.
+    mode = sys.argv[1] if len(sys.argv) > 1 else "poll"
+    if mode == "fetch":
+        _spool = MailSpool()
+        fetch_to_spool(_spool)
+        _spool.close()
+    elif mode == "process":
+        _spool = MailSpool()
+        _ledger = MessageLedger()
+        drain_spool(_spool, _ledger)
+        _spool.close()
+        _ledger.close()
+    else:
+        poll_inbox()
@@ -0,0 +1,350 @@
+"""
+BODYSTRUCTURE-first IMAP retrieval.
+
+Instead of downloading every unseen message with `FETCH (RFC822)`, the poller
+asks the server for the MIME layout of all unseen messages in one command,
+drops messages without a supported attachment, and then fetches only the
+plain-text body and the attachment parts it needs. The selected parts are
+reassembled into a small multipart message so `extract_body_and_attachments`
+can parse it exactly like a full download.
+"""
+
+import hashlib
+import os
+import re
+from dataclasses import dataclass, field
+from email.header import decode_header, make_header
+from email.utils import collapse_rfc2231_value, decode_params, quote, unquote
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+SUPPORTED_EXTENSIONS = {".pptx", ".pdf"}
+FETCH_BATCH_SIZE = int(os.getenv("EMAIL_IMAP_FETCH_BATCH", "20"))
+
+_TOKEN_RE = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))', re.DOTALL)
+_LITERAL_RE = re.compile(rb"\{(\d+)\}\s*$")
+_RESPONSE_START_RE = re.compile(rb"^\s*\d+ \(")
+_UID_RE = re.compile(rb"UID (\d+)")
+_SECTION_RE = re.compile(rb"BODY\[([^\]]*)\](?:<\d+>)? \{\d+\}\s*$")
+_LITERAL = object()
+
+
+@dataclass
+class BodyPart:
+    section: str
+    content_type: str
+    params: Dict[str, str]
+    encoding: str
+    size: int
+    disposition: Optional[str] = None
+    disposition_params: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def filename(self) -> Optional[str]:
+        name = self.disposition_params.get("filename") or self.params.get("name")
+        return _decode_header_value(name) if name else None
+
+
+@dataclass
+class FetchPlan:
+    """Parts of one message worth downloading (None body = no plain-text part)."""
+    uid: bytes
+    body: Optional[BodyPart]
+    attachments: List[BodyPart]
+    whole_message: bool = False
+
+    @property
+    def sections(self) -> Tuple[str, ...]:
+        if self.whole_message:
+            return ("",)
+        parts = ([self.body] if self.body else []) + self.attachments
+        return tuple(["HEADER"] + [part.section for part in parts])
+
+
+# ---------- BODYSTRUCTURE parsing ----------
+
+def _segments(data: Sequence) -> Iterator[Tuple[bytes, Optional[bytes]]]:
+    """Flatten imaplib's response list into (text, literal) pairs."""
+    for item in data:
+        if isinstance(item, tuple):
+            head, literal = item[0], item[1]
+            yield _LITERAL_RE.sub(b"", head), literal
+        elif item:
+            yield item, None
+
+
+def _tokens(data: Sequence) -> Iterator:
+    for text, literal in _segments(data):
+        pos = 0
+        while pos < len(text):
+            match = _TOKEN_RE.match(text, pos)
+            if not match or match.end() == pos:
+                break
+            pos = match.end()
+            open_paren, close_paren, quoted, atom = match.groups()
+            if open_paren:
+                yield "("
+            elif close_paren:
+                yield ")"
+            elif quoted is not None:
+                yield (_LITERAL, re.sub(rb"\\(.)", rb"\1", quoted).decode("utf-8", "replace"))
+            elif atom is not None:
+                yield atom.decode("utf-8", "replace")
+        if literal is not None:
+            yield (_LITERAL, literal.decode("utf-8", "replace"))
+
+
+def _parse(tokens: Iterator) -> list:
+    """Parse IMAP tokens into nested lists; NIL becomes None."""
+    stack: List[list] = [[]]
+    for token in tokens:
+        if token == "(":
+            stack.append([])
+        elif token == ")":
+            if len(stack) == 1:
+                continue
+            finished = stack.pop()
+            stack[-1].append(finished)
+        elif isinstance(token, tuple):
+            stack[-1].append(token[1])
+        else:
+            stack[-1].append(None if token.upper() == "NIL" else token)
+    while len(stack) > 1:
+        finished = stack.pop()
+        stack[-1].append(finished)
+    return stack[0]
+
+
+def parse_bodystructure_response(data: Sequence) -> Dict[bytes, list]:
+    """Map UID -> raw BODYSTRUCTURE tree from a `UID FETCH ... (BODYSTRUCTURE)` response."""
+    parsed = _parse(_tokens(data))
+    structures: Dict[bytes, list] = {}
+    # Responses arrive as: <seq> (UID <uid> BODYSTRUCTURE (...)) repeated.
+    for item in parsed:
+        if not isinstance(item, list):
+            continue
+        uid = None
+        structure = None
+        for key, value in zip(item[::2], item[1::2]):
+            if not isinstance(key, str):
+                continue
+            if key.upper() == "UID":
+                uid = str(value).encode()
+            elif key.upper() == "BODYSTRUCTURE":
+                structure = value
+        if uid is not None and isinstance(structure, list):
+            structures[uid] = structure
+    return structures
+
+
+def _param_dict(values) -> Dict[str, str]:
+    """Turn a flat (k v k v) list into a dict, folding RFC 2231 `name*N*` pieces."""
+    if not isinstance(values, list):
+        return {}
+    pairs = [("", "")] + [
+        (key.lower(), value)
+        for key, value in zip(values[::2], values[1::2])
+        if isinstance(key, str) and isinstance(value, str)
+    ]
+    return {key: unquote(collapse_rfc2231_value(value)) for key, value in decode_params(pairs)[1:]}
+
+
+def _decode_header_value(value: str) -> str:
+    try:
+        return str(make_header(decode_header(value)))
+    except Exception:  # noqa: BLE001
+        return value
+
+
+def iter_body_parts(structure: list, prefix: str = "") -> Iterator[BodyPart]:
+    """Yield leaf parts in the same order as `EmailMessage.walk()`."""
+    if structure and isinstance(structure[0], list):
+        index = 0
+        while index < len(structure) and isinstance(structure[index], list):
+            section = f"{prefix}.{index + 1}" if prefix else str(index + 1)
+            yield from iter_body_parts(structure[index], section)
+            index += 1
+        return
+
+    section = prefix or "1"
+    ctype = f"{(structure[0] or '').lower()}/{(structure[1] or '').lower()}"
+    ext_start = 7
+    if ctype.startswith("text/"):
+        ext_start = 8
+    elif ctype == "message/rfc822":
+        ext_start = 10
+    ext = structure[ext_start:]
+    disposition = ext[1] if len(ext) > 1 else None
+    disp_type = None
+    disp_params: Dict[str, str] = {}
+    if isinstance(disposition, list) and disposition:
+        disp_type = (disposition[0] or "").lower() or None
+        disp_params = _param_dict(disposition[1] if len(disposition) > 1 else None)
+
+    try:
+        size = int(structure[6] or 0)
+    except (TypeError, ValueError, IndexError):
+        size = 0
+
+    yield BodyPart(
+        section=section,
+        content_type=ctype,
+        params=_param_dict(structure[2]),
+        encoding=(structure[5] or "7bit").lower(),
+        size=size,
+        disposition=disp_type,
+        disposition_params=disp_params,
+    )
+
+    # Forwarded messages: walk() descends into the embedded message too.
+    if ctype == "message/rfc822" and len(structure) > 8 and isinstance(structure[8], list):
+        inner = structure[8]
+        yield from iter_body_parts(inner, section if inner and isinstance(inner[0], list) else f"{section}.1")
+
+
+def plan_message(uid: bytes, structure: list) -> Optional[FetchPlan]:
+    """Pick the parts to download, or None when there is no supported attachment."""
+    body: Optional[BodyPart] = None
+    attachments: List[BodyPart] = []
+    for part in iter_body_parts(structure):
+        if body is None and part.content_type == "text/plain" and part.disposition is None:
+            body = part
+        if part.disposition == "attachment" and part.filename:
+            if os.path.splitext(part.filename)[1].lower() in SUPPORTED_EXTENSIONS:
+                attachments.append(part)
+
+    if not attachments:
+        return None
+    # A single-part message that *is* the attachment has no separate body part.
+    whole = not (structure and isinstance(structure[0], list))
+    return FetchPlan(uid=uid, body=body, attachments=attachments, whole_message=whole)
+
+
+# ---------- Batched retrieval ----------
+
+def fetch_bodystructures(mail, uids: Sequence[bytes]) -> Dict[bytes, list]:
+    """One `UID FETCH` for the MIME layout of every UID."""
+    if not uids:
+        return {}
+    typ, data = mail.uid("FETCH", b",".join(uids).decode(), "(UID BODYSTRUCTURE)")
+    if typ != "OK":
+        print(f"BODYSTRUCTURE fetch failed: {typ}")
+        return {}
+    return parse_bodystructure_response(data)
+
+
+def full_message_plan(uid: bytes) -> FetchPlan:
+    """Fallback for a UID whose BODYSTRUCTURE is missing or unparseable: download all of it."""
+    return FetchPlan(uid=uid, body=None, attachments=[], whole_message=True)
+
+
+def parse_section_response(data: Sequence) -> Dict[bytes, Dict[str, bytes]]:
+    """Map UID -> {section: bytes} from a multi-section `UID FETCH` response."""
+    messages: List[Tuple[Optional[bytes], Dict[str, bytes]]] = []
+    for item in data:
+        head = item[0] if isinstance(item, tuple) else item
+        if not isinstance(head, bytes):
+            continue
+        if _RESPONSE_START_RE.match(head) or not messages:
+            messages.append((None, {}))
+        uid_match = _UID_RE.search(head)
+        if uid_match:
+            messages[-1] = (uid_match.group(1), messages[-1][1])
+        if isinstance(item, tuple):
+            section_match = _SECTION_RE.search(head)
+            if section_match:
+                messages[-1][1][section_match.group(1).decode()] = item[1] or b""
+    return {uid: sections for uid, sections in messages if uid is not None}
+
+
+def _header_without_mime_fields(header: bytes) -> bytes:
+    lines = header.replace(b"\r\n", b"\n").split(b"\n")
+    kept: List[bytes] = []
+    skipping = False
+    for line in lines:
+        if not line.strip():
+            continue
+        if line[:1] in (b" ", b"\t"):
+            if not skipping:
+                kept.append(line)
+            continue
+        name = line.split(b":", 1)[0].strip().lower()
+        skipping = name.startswith(b"content-") or name == b"mime-version"
+        if not skipping:
+            kept.append(line)
+    return b"\r\n".join(kept)
+
+
+def _part_header(part: BodyPart) -> bytes:
+    ctype = part.content_type
+    for key, value in part.params.items():
+        if key == "boundary":
+            continue
+        ctype += f'; {key}="{quote(value)}"'
+    lines = [f"Content-Type: {ctype}", f"Content-Transfer-Encoding: {part.encoding}"]
+    if part.disposition:
+        disp = part.disposition
+        filename = part.filename
+        if filename:
+            disp += f'; filename="{quote(filename)}"'
+        lines.append(f"Content-Disposition: {disp}")
+    return "\r\n".join(lines).encode("utf-8")
+
+
+def assemble_message(plan: FetchPlan, sections: Dict[str, bytes]) -> bytes:
+    """Rebuild a minimal multipart message from the fetched sections."""
+    if plan.whole_message:
+        return sections.get("", b"")
+
+    # Derived from the content, so the same message always rebuilds to the same bytes
+    # (message_ledger.message_key hashes them when there is no Message-ID).
+    digest = hashlib.sha256()
+    for section in plan.sections:
+        digest.update(section.encode() + b"\0" + sections.get(section, b"") + b"\0")
+    boundary = f"bifocal-{digest.hexdigest()[:32]}".encode()
+    chunks = [
+        _header_without_mime_fields(sections.get("HEADER", b"")),
+        b"\r\nMIME-Version: 1.0\r\nContent-Type: multipart/mixed; boundary=\"" + boundary + b"\"\r\n\r\n",
+    ]
+    for part in ([plan.body] if plan.body else []) + plan.attachments:
+        chunks.append(b"--" + boundary + b"\r\n")
+        chunks.append(_part_header(part) + b"\r\n\r\n")
+        chunks.append(sections.get(part.section, b""))
+        chunks.append(b"\r\n")
+    chunks.append(b"--" + boundary + b"--\r\n")
+    return b"".join(chunks)
+
+
+def _batched(items: List[FetchPlan], size: int) -> Iterable[List[FetchPlan]]:
+    for start in range(0, len(items), max(size, 1)):
+        yield items[start:start + size]
+
+
+def iter_messages(mail, plans: Iterable[FetchPlan], batch_size: int = FETCH_BATCH_SIZE) -> Iterator[Tuple[bytes, bytes]]:
+    """
+    Yield (uid, raw_message) for each plan, fetching `batch_size` UIDs per
+    round-trip. UIDs are grouped by their section list so a batch never
+    downloads a part another message in the same command doesn't need.
+    """
+    groups: Dict[Tuple[str, ...], List[FetchPlan]] = {}
+    for plan in plans:
+        groups.setdefault(plan.sections, []).append(plan)
+
+    for sections, group in groups.items():
+        items = " ".join(f"BODY.PEEK[{section}]" for section in sections)
+        for batch in _batched(group, batch_size):
+            uid_set = b",".join(plan.uid for plan in batch).decode()
+            typ, data = mail.uid("FETCH", uid_set, f"(UID {items})")
+            if typ != "OK":
+                print(f"Failed to fetch UIDs {uid_set}: {typ}")
+                continue
+            fetched = parse_section_response(data)
+            for plan in batch:
+                if plan.uid not in fetched:
+                    print(f"Server returned no data for UID {plan.uid.decode()}")
+                    continue
+                yield plan.uid, assemble_message(plan, fetched[plan.uid])
+
+
+def mark_seen(mail, uids: Sequence[bytes]) -> None:
+    if uids:
+        mail.uid("STORE", b",".join(uids).decode(), "+FLAGS", "(\\Seen)")
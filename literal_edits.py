@@ -0,0 +1,179 @@
+"""
+Check literal-edit comments against the slide text, without a model.
+
+Many comments spell out the exact edit: "change 25% to 27%", "rename
+'Company XYZ' to 'XYZ Corp'", "replace 'FY23' with 'FY24'", "delete the
+footnote". `parse_edit` recognizes these with a small pattern library. Both
+sides of a replacement must be quoted or look like a value (numbers,
+currency, percentages, "FY24"). "Update the margin to 27%" names a label,
+not the old value, so it is left to the model. `check_edit` then
+compares the original and revised text of the referenced slides:
+
+- replace: implemented when the old value was there and is gone and the new
+  value is present; not_implemented when neither count moved.
+- delete (quoted text): implemented when the text is gone; not_implemented
+  when it is all still there.
+- delete the footnote/source/note: implemented when every footnote-style
+  line of the original slide is gone; not_implemented when they all remain.
+
+Anything in between returns None and is left to the model. The comment's own
+text is removed before counting, so an overlay tag that says "change 25% to
+27%" does not count as either value.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+IMPLEMENTED = "implemented"
+NOT_IMPLEMENTED = "not_implemented"
+
+REPLACE = "replace"
+DELETE = "delete"
+DELETE_FOOTNOTE = "delete_footnote"
+
+MAX_VALUE_WORDS = 6
+
+_QUOTE_CHARS = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'", "–": "-", "—": "-", " ": " "})
+_QUOTED = r"[\"']([^\"']{1,80})[\"']"
+_VALUE = r"[\"']?([^\"'\n]{1,80}?)[\"']?"
+_END = r"(?=\s*(?:[.;!?]\s|[.;!?]?$|,|\s+(?:on|in|across|throughout|for|at)\s+(?:the\s+)?(?:slides?|pages?|chart|table|title|header|footer|deck)\b))"
+_VERB = r"(?:change|update|revise|correct|fix|amend|edit|switch|rename|replace)"
+
+_REPLACE_PATTERNS = [
+    re.compile(rf"\b{_VERB}\b.{{0,60}}?\bfrom\s+{_VALUE}\s+(?:to|into|with)\s+{_VALUE}{_END}", re.IGNORECASE),
+    re.compile(rf"\breplace\s+(?:the\s+)?{_VALUE}\s+with\s+{_VALUE}{_END}", re.IGNORECASE),
+    re.compile(rf"\b(?:change|update|revise|correct|amend|edit|switch|rename)\s+(?:the\s+)?{_VALUE}\s+(?:to|into)\s+{_VALUE}{_END}", re.IGNORECASE),
+    re.compile(rf"{_VALUE}\s*(?:->|=>|→)\s*{_VALUE}{_END}"),
+    re.compile(rf"^\s*{_VALUE}\s+should\s+(?:be|read|say)\s+{_VALUE}{_END}", re.IGNORECASE),
+]
+_DELETE_QUOTED = re.compile(rf"\b(?:delete|remove|drop|strike|take out|get rid of)\s+(?:the\s+)?(?:\w+\s+)?{_QUOTED}", re.IGNORECASE)
+_DELETE_FOOTNOTE = re.compile(r"\b(?:delete|remove|drop|strike|take out|get rid of)\s+(?:the\s+|all\s+)?(?:\w+\s+)?(footnotes?|source(?:\s+line)?s?|notes?)\b(?!\s+(?:about|regarding|on\s+(?!slides?|pages?)))", re.IGNORECASE)
+_FOOTNOTE_LINE = re.compile(r"^\s*(?:\(?\d{1,2}[).]\s|\(?[a-z][).]\s|[*†‡]+\s*|sources?:|notes?:|footnotes?:)", re.IGNORECASE)
+_UNIT_GAP = re.compile(r"(\d)\s+(%|x\b|mm\b|bn\b|m\b|k\b)")
+# Descriptions rather than literal values ("change the title to ...").
+_UNIT_WORD = re.compile(r"^(?:[$€£]|usd|eur|gbp|%|x|bps|mm|bn|m|k)$", re.IGNORECASE)
+_DESCRIPTIVE = re.compile(r"^(?:it|this|that|these|those|them|the\s+\w+|title|header|heading|colou?r|font|format|chart|table|wording|text|number|figure)$", re.IGNORECASE)
+
+
+@dataclass
+class LiteralEdit:
+    kind: str
+    old: str = ""
+    new: str = ""
+
+
+def normalize(text: str) -> str:
+    text = re.sub(r"\s+", " ", text.translate(_QUOTE_CHARS)).strip().lower()
+    return _UNIT_GAP.sub(r"\1\2", text)
+
+
+def _clean_value(value: str) -> Optional[str]:
+    value = value.strip().strip("\"'").strip(" .,:;")
+    if not value or len(value.split()) > MAX_VALUE_WORDS or _DESCRIPTIVE.match(value):
+        return None
+    return value
+
+
+def _value_like(value: str) -> bool:
+    """Every word is a number-ish token ("$150mm", "27.0%", "FY24", "Q3") or a currency/unit."""
+    return all(any(ch.isdigit() for ch in word) or _UNIT_WORD.match(word) for word in value.split())
+
+
+def _literal_value(match: "re.Match[str]", group: int) -> Optional[str]:
+    """The captured value when it is quoted or value-like; None for labels and descriptions."""
+    value = _clean_value(match.group(group))
+    if value is None:
+        return None
+    start, end, text = match.start(group), match.end(group), match.string
+    raw = match.group(group).strip()
+    quoted = (start > 0 and text[start - 1] in "\"'" and end < len(text) and text[end] in "\"'") or (
+        len(raw) > 1 and raw[0] in "\"'" and raw[-1] in "\"'"
+    )
+    return value if quoted or _value_like(value) else None
+
+
+def parse_edit(comment_text: str) -> Optional[LiteralEdit]:
+    text = (comment_text or "").translate(_QUOTE_CHARS).strip()
+    match = _DELETE_FOOTNOTE.search(text)
+    if match:
+        return LiteralEdit(DELETE_FOOTNOTE)
+    match = _DELETE_QUOTED.search(text)
+    if match:
+        return LiteralEdit(DELETE, match.group(1))
+    for pattern in _REPLACE_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            old, new = _literal_value(match, 1), _literal_value(match, 2)
+            if old and new and normalize(old) != normalize(new):
+                return LiteralEdit(REPLACE, old, new)
+    return None
+
+
+def _count(value: str, text: str) -> int:
+    """Occurrences of `value` in `text` not glued to neighbouring letters or digits."""
+    needle = re.escape(normalize(value))
+    return len(re.findall(rf"(?<![\w.]){needle}(?![\w])" if needle[-1:].isalnum() else rf"(?<![\w.]){needle}", text))
+
+
+def _without(text: str, *values: str) -> str:
+    for value in values:
+        if value:
+            text = text.replace(normalize(value), " ")
+    return text
+
+
+def _footnotes(text: str) -> List[str]:
+    return [normalize(line) for line in text.split("\n") if _FOOTNOTE_LINE.match(line)]
+
+
+def check_edit(edit: LiteralEdit, before: str, after: str, comment_text: str = "") -> Optional[Tuple[str, str]]:
+    """
+    (status, reason) for `edit` given the referenced slides' original and
+    revised text, or None when the text does not settle it.
+    """
+    if edit.kind == DELETE_FOOTNOTE:
+        notes = _footnotes(before)
+        if not notes:
+            return None
+        remaining = set(_footnotes(after))
+        kept = [line for line in notes if line in remaining]
+        if not kept:
+            return IMPLEMENTED, "The footnote lines on the original slide are gone from the revised slide."
+        if len(kept) == len(notes):
+            return NOT_IMPLEMENTED, "The footnote lines on the original slide are still on the revised slide."
+        return None
+
+    # The comment may itself sit on the slide (overlay tags); don't count its own wording.
+    own = normalize(comment_text)
+    before_text = _without(normalize(before), own)
+    after_text = _without(normalize(after), own)
+
+    if edit.kind == DELETE:
+        old_before, old_after = _count(edit.old, before_text), _count(edit.old, after_text)
+        if not old_before:
+            return None
+        if not old_after:
+            return IMPLEMENTED, f'"{edit.old}" no longer appears in the revised slide.'
+        if old_after >= old_before:
+            return NOT_IMPLEMENTED, f'"{edit.old}" still appears in the revised slide.'
+        return None
+
+    old_before = _count(edit.old, _without(before_text, edit.new))
+    old_after = _count(edit.old, _without(after_text, edit.new))
+    new_before, new_after = _count(edit.new, before_text), _count(edit.new, after_text)
+    if not old_before:
+        return None
+    if not old_after and new_after:
+        return IMPLEMENTED, f'"{edit.old}" was replaced by "{edit.new}" in the revised slide.'
+    if old_after == old_before and new_after == new_before:
+        return NOT_IMPLEMENTED, f'"{edit.old}" still appears in the revised slide and "{edit.new}" was not added.'
+    return None
+
+
+def suggestion_for(edit: LiteralEdit) -> str:
+    if edit.kind == REPLACE:
+        return f'Change "{edit.old}" to "{edit.new}".'
+    if edit.kind == DELETE:
+        return f'Delete "{edit.old}".'
+    return "Delete the footnote."
@@ -0,0 +1,178 @@
+"""
+Durable local spool between IMAP fetching and email processing.
+
+The fetcher writes each raw message here and marks it seen once its row is
+stored, so the IMAP session only lives as long as the downloads. Rows are
+keyed on (mailbox, UIDVALIDITY, UID): after a UIDVALIDITY reset or a
+mailbox change, a reused UID is a new message, not a duplicate.
+
+The processor then drains the spool independently. A claim holds a lease
+of `EMAIL_SPOOL_LEASE_SECONDS`. A message still 'processing' after its
+lease ran out was left by a run that died, and it is picked up again. A
+run that is still working keeps its message. Every claim counts as an
+attempt, and a message is marked 'failed' after `EMAIL_SPOOL_MAX_ATTEMPTS`
+attempts, including ones that crashed the worker.
+"""
+
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+SPOOL_PATH = os.getenv("EMAIL_SPOOL_PATH", os.path.join(".bifocal", "spool.sqlite3"))
+SPOOL_MAX_ATTEMPTS = int(os.getenv("EMAIL_SPOOL_MAX_ATTEMPTS", "3"))
+# Longer than a message can take to process (see REQUEST_DEADLINE_SECONDS).
+SPOOL_LEASE_SECONDS = float(os.getenv("EMAIL_SPOOL_LEASE_SECONDS", "1800"))
+
+_TABLE = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    mailbox TEXT NOT NULL DEFAULT '',
+    uidvalidity TEXT NOT NULL DEFAULT '',
+    uid TEXT NOT NULL,
+    raw BLOB,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (mailbox, uidvalidity, uid)
+);
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS messages_status ON messages (status, id);"
+_COLUMNS = ("mailbox", "uidvalidity", "uid", "raw", "status", "attempts", "lease_until", "last_error", "created_at", "updated_at")
+
+
+@dataclass
+class SpooledMessage:
+    id: int
+    uid: str
+    raw: bytes
+    attempts: int
+
+
+class MailSpool:
+    """SQLite-backed queue of raw messages: pending -> processing -> done | failed."""
+
+    def __init__(
+        self,
+        path: str = SPOOL_PATH,
+        max_attempts: int = SPOOL_MAX_ATTEMPTS,
+        lease_seconds: float = SPOOL_LEASE_SECONDS,
+    ):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._transaction():
+            self._migrate()
+            self._conn.execute(_TABLE)
+            self._conn.execute(_INDEX)
+
+    def _migrate(self) -> None:
+        """Rebuild a spool created before rows were keyed on (mailbox, UIDVALIDITY, UID)."""
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(messages)")]
+        if not columns or "uidvalidity" in columns:
+            return
+        self._conn.execute("ALTER TABLE messages RENAME TO messages_old")
+        self._conn.execute("DROP INDEX IF EXISTS messages_status")
+        self._conn.execute(_TABLE)
+        copied = ", ".join(["id"] + [column for column in _COLUMNS if column in columns])
+        self._conn.execute(f"INSERT INTO messages ({copied}) SELECT {copied} FROM messages_old")
+        self._conn.execute("DROP TABLE messages_old")
+
+    def add(self, uid: str, raw: bytes, uidvalidity: str = "", mailbox: str = "") -> bool:
+        """
+        Store a fetched message; returns False if it was already spooled. Either
+        way its row is stored once this returns, so it can be marked seen.
+        """
+        now = time.time()
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO messages (mailbox, uidvalidity, uid, raw, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (mailbox, uidvalidity, uid, raw, now, now),
+        )
+        return cursor.rowcount == 1
+
+    def recover(self) -> int:
+        """
+        Return messages whose lease ran out while 'processing' (their run died)
+        to the queue, or mark them failed once they are out of attempts.
+        Returns how many were re-queued.
+        """
+        now = time.time()
+        with self._transaction():
+            self._conn.execute(
+                "UPDATE messages SET status = 'failed', last_error = COALESCE(last_error, 'interrupted'), "
+                "lease_until = NULL, updated_at = ? "
+                "WHERE status = 'processing' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            cursor = self._conn.execute(
+                "UPDATE messages SET status = 'pending', lease_until = NULL, updated_at = ? "
+                "WHERE status = 'processing' AND lease_until < ?",
+                (now, now),
+            )
+        return cursor.rowcount
+
+    def claim(self) -> Optional[SpooledMessage]:
+        """Take the oldest pending message and mark it as processing under a lease."""
+        with self._transaction():
+            row = self._conn.execute(
+                "SELECT id, uid, raw, attempts FROM messages "
+                "WHERE status = 'pending' AND attempts < ? ORDER BY id LIMIT 1",
+                (self.max_attempts,),
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            self._conn.execute(
+                "UPDATE messages SET status = 'processing', attempts = attempts + 1, lease_until = ?, "
+                "updated_at = ? WHERE id = ?",
+                (now + self.lease_seconds, now, row[0]),
+            )
+        return SpooledMessage(id=row[0], uid=row[1], raw=row[2], attempts=row[3] + 1)
+
+    def complete(self, message: SpooledMessage) -> None:
+        # Keep the row (without the payload) so a re-fetched message is not spooled twice.
+        self._conn.execute(
+            "UPDATE messages SET status = 'done', raw = NULL, last_error = NULL, lease_until = NULL, updated_at = ? "
+            "WHERE id = ?",
+            (time.time(), message.id),
+        )
+
+    def fail(self, message: SpooledMessage, error: str) -> str:
+        """Record a failure; the message is retried until it runs out of attempts."""
+        status = "failed" if message.attempts >= self.max_attempts else "pending"
+        self._conn.execute(
+            "UPDATE messages SET status = ?, last_error = ?, lease_until = NULL, updated_at = ? WHERE id = ?",
+            (status, error, time.time(), message.id),
+        )
+        return status
+
+    def pending_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM messages WHERE status = 'pending'").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _transaction(self):
+        return _Transaction(self._conn)
+
+
+class _Transaction:
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
@@ -0,0 +1,80 @@
+"""
+Persistent ledger of processed emails, keyed by Message-ID.
+
+Each message moves through parsed -> analyzed -> replied, and the output of
+every finished stage is stored with it. When a message is seen again (a
+crash before it was marked seen, a spool retry, a re-delivered copy), the
+processor resumes from the last finished stage instead of re-running the
+LLM workflows or sending a second reply.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+LEDGER_PATH = os.getenv("EMAIL_LEDGER_PATH", os.path.join(".bifocal", "ledger.sqlite3"))
+
+PARSED = "parsed"
+ANALYZED = "analyzed"
+REPLIED = "replied"
+_STAGE_ORDER = {PARSED: 1, ANALYZED: 2, REPLIED: 3}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledger (
+    message_key TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    payload TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+@dataclass
+class LedgerEntry:
+    key: str
+    state: str
+    payload: Dict[str, Any]
+
+    def reached(self, state: str) -> bool:
+        return _STAGE_ORDER[self.state] >= _STAGE_ORDER[state]
+
+
+def message_key(message_id: Optional[str], raw_msg: bytes) -> str:
+    """Message-ID when present, otherwise a hash of the raw message."""
+    if message_id and message_id.strip():
+        return message_id.strip()
+    return "sha256:" + hashlib.sha256(raw_msg).hexdigest()
+
+
+class MessageLedger:
+    def __init__(self, path: str = LEDGER_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, key: str) -> Optional[LedgerEntry]:
+        row = self._conn.execute(
+            "SELECT state, payload FROM ledger WHERE message_key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return LedgerEntry(key=key, state=row[0], payload=json.loads(row[1]) if row[1] else {})
+
+    def advance(self, key: str, state: str, payload: Optional[Dict[str, Any]] = None) -> None:
+        """Record that `state` finished; the stored payload replaces the previous stage's."""
+        self._conn.execute(
+            "INSERT INTO ledger (message_key, state, payload, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(message_key) DO UPDATE SET state = excluded.state, "
+            "payload = excluded.payload, updated_at = excluded.updated_at",
+            (key, state, json.dumps(payload) if payload is not None else None, time.time()),
+        )
+
+    def close(self) -> None:
+        self._conn.close()
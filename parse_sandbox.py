@@ -0,0 +1,127 @@
+"""
+Parse decks in a separate, resource-limited process.
+
+A malformed PDF content stream or a chart with thousands of points can keep
+the parser busy for minutes. Here each file is parsed in a child process
+with an address-space limit, a per-slide time limit and an overall
+per-file deadline. A slide that runs out of time or memory degrades to an
+empty slide carrying a `warning`, and slides the worker never reached
+(because it was killed or crashed) are filled in the same way, so one bad
+page never fails the whole analysis.
+
+With PDF_EXTRACT_WORKERS > 1, PDFs of at least PDF_PARALLEL_MIN_PAGES pages
+are split across that many sandboxed workers (see deck_parser.py). Each
+worker has the same limits and extracts every n-th page. A worker that dies
+only degrades its own pages.
+
+Workers run parse_worker.py as a plain subprocess, so each one only pays
+for importing the parser, not for whatever the calling process imported.
+"""
+
+import os
+import subprocess
+import sys
+import time
+from multiprocessing.connection import Connection, wait
+from typing import Dict, Optional
+
+from deck_model import DeckDocument
+from deck_parser import PDF_EXTRACT_WORKERS, attachment_to_struct, degraded_slide
+from parse_worker import owner
+
+PARSE_ISOLATED = os.getenv("PARSE_ISOLATED", "1") == "1"
+PARSE_FILE_TIMEOUT = float(os.getenv("PARSE_FILE_TIMEOUT", "180"))
+PARSE_PAGE_TIMEOUT = float(os.getenv("PARSE_PAGE_TIMEOUT", "20"))
+PARSE_MEMORY_LIMIT_MB = int(os.getenv("PARSE_MEMORY_LIMIT_MB", "2048"))
+_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parse_worker.py")
+
+
+class DeckParseError(Exception):
+    """The worker could not even open the deck."""
+
+
+def parse_attachment_isolated(
+    attachment: dict,
+    file_timeout: float = PARSE_FILE_TIMEOUT,
+    page_timeout: float = PARSE_PAGE_TIMEOUT,
+    memory_mb: int = PARSE_MEMORY_LIMIT_MB,
+    workers: int = PDF_EXTRACT_WORKERS,
+) -> dict:
+    """Same result as `attachment_to_struct`, parsed in sandboxed child processes."""
+    filename = attachment.get("filename") or ""
+    parts = max(1, workers) if os.path.splitext(filename)[1].lower() == ".pdf" else 1
+    processes = []
+    receivers: Dict[Connection, int] = {}
+    try:
+        for part in range(parts):
+            read_fd, write_fd = os.pipe()
+            receivers[Connection(read_fd, writable=False)] = part
+            try:
+                args = [write_fd, attachment["path"], filename, page_timeout, memory_mb, part, parts]
+                processes.append(subprocess.Popen([sys.executable, _WORKER_SCRIPT, *map(str, args)], pass_fds=(write_fd,)))
+            finally:
+                os.close(write_fd)
+    except BaseException:
+        _stop(receivers, processes)
+        raise
+
+    count: Optional[int] = None
+    slides: Dict[int, dict] = {}
+    failures: Dict[int, str] = {}
+    running = list(receivers)
+    deadline = time.monotonic() + file_timeout
+    try:
+        while running:
+            remaining = deadline - time.monotonic()
+            ready = wait(running, remaining) if remaining > 0 else []
+            if not ready:
+                failures.update({receivers[receiver]: "file_timeout" for receiver in running})
+                break
+            for receiver in ready:
+                part = receivers[receiver]
+                try:
+                    kind, value = receiver.recv()
+                except EOFError:
+                    kind, value = "error", "worker_crashed"
+                if kind == "count":
+                    count = value
+                elif kind == "slide":
+                    slides[value["index"]] = value
+                if kind == "error":
+                    failures[part] = value
+                if kind in ("error", "done"):
+                    running.remove(receiver)
+    finally:
+        _stop(receivers, processes)
+
+    if count is None:
+        raise DeckParseError(f"Could not parse {filename}: {next(iter(failures.values()), 'no output')}")
+
+    result = [
+        slides.get(index) or degraded_slide(index, failures.get(owner(index, count, parts), "missing"))
+        for index in range(1, count + 1)
+    ]
+    degraded = [slide["index"] for slide in result if slide.get("warning")]
+    if degraded:
+        print(f"{filename}: {len(degraded)} of {count} slide(s) degraded, first: {result[degraded[0] - 1]['warning']}")
+    return {"slides": result}
+
+
+def _stop(receivers: Dict[Connection, int], processes: list) -> None:
+    for receiver in receivers:
+        receiver.close()
+    for process in processes:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+
+def parse_attachment(attachment: dict) -> dict:
+    """Parse in the sandbox unless PARSE_ISOLATED=0."""
+    if PARSE_ISOLATED:
+        return parse_attachment_isolated(attachment)
+    return attachment_to_struct(attachment)
+
+
+def parse_document(attachment: dict) -> DeckDocument:
+    return DeckDocument.from_struct(parse_attachment(attachment))
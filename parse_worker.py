@@ -0,0 +1,80 @@
+"""
+Entry point of a parse_sandbox worker process.
+
+parse_sandbox starts this file directly with the interpreter rather than
+through multiprocessing, whose spawn and forkserver children re-import the
+parent's `__main__` (for email_bot that is the agents SDK and numpy) before
+any limit applies. Here only the parser is imported. The worker applies
+its memory limit, then streams ("count", n), ("slide", struct)...,
+("done", None) for its share of the slides over the pipe it inherited, or
+("error", message) when the deck cannot be opened.
+
+    python parse_worker.py <fd> <path> <filename> <page_timeout> <memory_mb> <part> <parts>
+"""
+
+import signal
+import sys
+from multiprocessing.connection import Connection
+
+from deck_parser import PDF_PARALLEL_MIN_PAGES, degraded_slide, open_deck
+
+
+class _PageTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _PageTimeout()
+
+
+def _limit_memory(limit_mb: int) -> None:
+    try:
+        import resource
+    except ImportError:  # Windows: no rlimits, rely on the file deadline
+        return
+    limit = limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def owner(index: int, count: int, parts: int) -> int:
+    """The worker that extracts slide `index` of `count` when the deck is split `parts` ways."""
+    return (index - 1) % parts if count >= PDF_PARALLEL_MIN_PAGES else 0
+
+
+def run(path: str, filename: str, page_timeout: float, memory_mb: int, conn: Connection, part: int = 0, parts: int = 1) -> None:
+    try:
+        _limit_memory(memory_mb)
+        signal.signal(signal.SIGALRM, _on_alarm)
+        try:
+            count, build = open_deck(path, filename)
+        except MemoryError:
+            conn.send(("error", "memory limit exceeded while opening the deck"))
+            return
+        except Exception as exc:  # noqa: BLE001
+            conn.send(("error", f"{type(exc).__name__}: {exc}"))
+            return
+        conn.send(("count", count))
+
+        for index in range(1, count + 1):
+            if owner(index, count, parts) != part:
+                continue
+            signal.setitimer(signal.ITIMER_REAL, page_timeout)
+            try:
+                slide = build(index)
+            except _PageTimeout:
+                slide = degraded_slide(index, "page_timeout")
+            except MemoryError:
+                slide = degraded_slide(index, "page_memory_limit")
+            except Exception as exc:  # noqa: BLE001
+                slide = degraded_slide(index, f"page_error: {type(exc).__name__}")
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+            conn.send(("slide", slide))
+        conn.send(("done", None))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    fd, path, filename, page_timeout, memory_mb, part, parts = sys.argv[1:8]
+    run(path, filename, float(page_timeout), int(memory_mb), Connection(int(fd), readable=False), int(part), int(parts))
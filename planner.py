@@ -0,0 +1,170 @@
+"""
+Decide which workflows an analysis needs before running any of them.
+
+`parse_intent` reads the reviewer's email with fixed rules (no model call):
+whether tick-and-tie was asked for, whether it was the *only* thing asked
+for, which slides are referenced, and whether the email carries any
+actionable text at all. `build_plan` turns that, plus any explicit flags
+from the API, into the set of workflows to run; every workflow left out is
+recorded with the reason so the output can show it as skipped.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+TAGS = "tags"
+EMAIL_COMMENTS = "email_comments"
+TICK_TIE = "tick_tie"
+WORKFLOWS = (TAGS, EMAIL_COMMENTS, TICK_TIE)
+
+_TICK_TIE = re.compile(r"\btick\s*(?:-|and|&|n'?)?\s*tie(?:[\s-]*out)?\b|\btie[\s-]*out\b")
+_ONLY_BEFORE = re.compile(r"\b(?:only|just)\s+(?:\w+\s+){0,3}$")
+_ONLY_AFTER = re.compile(r"^\s*(?:only|alone)\b")
+_NEGATED = re.compile(r"\b(?:no|not|don'?t|do not|skip|without|no need to)\s+(?:\w+\s+){0,3}$")
+_SLIDE_REF = re.compile(
+    r"\b(?:slides?|pages?|pgs?|pp?\.)\s*#?\s*(\d+(?:\s*(?:-|–|to|through|and|&|,)\s*\d+)*)",
+    re.IGNORECASE,
+)
+_REF_NUMBER = re.compile(r"\d+|-|–|to|through")
+# Verbs a reviewer opens an edit request with; comment_merge splits comments on them too.
+EDIT_VERBS = (
+    r"change|update|add|remove|delete|drop|make|use|move|fix|replace|rename|align|bold|"
+    r"increase|decrease|round|check|confirm|show|include|insert|split|merge|reword|rephrase|shorten|highlight|format|"
+    r"resize|swap|label|cite|source|spell|capitali[sz]e|clarify|correct|ensure|double-check|revise|reorder|tie|"
+    r"recolou?r|colou?r|put|set|switch|flip|adjust|standardi[sz]e|consolidate|expand|condense"
+)
+_EDIT_VERB = re.compile(rf"\b(?:{EDIT_VERBS})\b", re.IGNORECASE)
+# A greeting or sign-off line is the word itself plus at most a name (capitalized words) or
+# an addressee like "team"; anything more is treated as a comment.
+_ADDRESSEE = r"(?i:team|all|everyone|guys|folks|again|so much|in advance)|[A-Z][\w.'-]*"
+_GREETING = re.compile(
+    rf"^(?:(?i:hi|hello|hey|dear|good morning|good afternoon)(?:\s+(?:{_ADDRESSEE})){{0,3}}"
+    rf"|(?i:team|all|guys|folks|everyone))\s*[,!:.]?$"
+)
+_CLOSING = re.compile(
+    rf"^(?i:thanks|thank you|thx|best|regards|best regards|kind regards|cheers|many thanks|br)"
+    rf"(?:\s*[,!.]?\s*(?:{_ADDRESSEE})){{0,3}}\s*[,!.]?$"
+)
+_NO_OP = re.compile(r"^(?:see attached|attached|please see attached|pfa|fyi|see below)\W*$", re.IGNORECASE)
+_WORD = re.compile(r"[A-Za-z]{2,}")
+_CLAUSE_BREAK = re.compile(r"[.;!?\n]+|\b(?:and|also|but|plus|then)\b")
+_TICK_TIE_ANY_CASE = re.compile(_TICK_TIE.pattern, re.IGNORECASE)
+_TICK_TIE_MARK = "\x00"
+MAX_RANGE = 200  # ignore "pages 1-2000"-style ranges
+
+
+@dataclass
+class EmailIntent:
+    tick_tie: bool = False
+    only_tick: bool = False
+    slide_refs: List[int] = field(default_factory=list)
+    actionable: bool = False
+
+
+def _slide_refs(text: str) -> List[int]:
+    refs = set()
+    for match in _SLIDE_REF.finditer(text):
+        tokens = _REF_NUMBER.findall(match.group(1))
+        previous: Optional[int] = None
+        pending_range = False
+        for token in tokens:
+            if not token.isdigit():
+                pending_range = previous is not None
+                continue
+            number = int(token)
+            if pending_range and previous is not None and 0 < number - previous <= MAX_RANGE:
+                refs.update(range(previous, number + 1))
+            else:
+                refs.add(number)
+            previous, pending_range = number, False
+    return sorted(ref for ref in refs if ref > 0)
+
+
+def has_actionable_text(text: str) -> bool:
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or _GREETING.match(line) or _CLOSING.match(line) or _NO_OP.match(line):
+            continue
+        if len(_WORD.findall(line)) >= 2:
+            return True
+    return False
+
+
+def mentions_edit(text: str) -> bool:
+    """Whether `text` references a slide/page or uses an edit verb ("remove", "fix", ...)."""
+    return bool(_SLIDE_REF.search(text) or _EDIT_VERB.search(text))
+
+
+def _asks_more_than_tick_tie(text: str) -> bool:
+    """Whether anything actionable is left once the clauses asking for tick-and-tie are dropped."""
+    marked = _TICK_TIE_ANY_CASE.sub(_TICK_TIE_MARK, text)
+    rest = [clause for clause in _CLAUSE_BREAK.split(marked) if _TICK_TIE_MARK not in clause]
+    return has_actionable_text("\n".join(rest))
+
+
+def parse_intent(email_text: Optional[str]) -> EmailIntent:
+    text = email_text or ""
+    lowered = text.lower()
+    intent = EmailIntent(slide_refs=_slide_refs(text), actionable=has_actionable_text(text))
+    only = False
+    for match in _TICK_TIE.finditer(lowered):
+        before = lowered[max(0, match.start() - 40):match.start()]
+        if _NEGATED.search(before):
+            continue
+        intent.tick_tie = True
+        if _ONLY_BEFORE.search(before) or _ONLY_AFTER.match(lowered[match.end():]):
+            only = True
+    # "Tick and tie only the EBITDA figures, and fix the title" still asks for the fix.
+    intent.only_tick = only and not _asks_more_than_tick_tie(text)
+    return intent
+
+
+@dataclass
+class ExecutionPlan:
+    intent: EmailIntent
+    run: Tuple[str, ...]
+    skipped: Dict[str, str]
+
+    @property
+    def only_tick(self) -> bool:
+        return self.run == (TICK_TIE,)
+
+    def runs(self, workflow: str) -> bool:
+        return workflow in self.run
+
+    def to_dict(self) -> dict:
+        return {"run": list(self.run), "skipped": dict(self.skipped), "slide_refs": list(self.intent.slide_refs)}
+
+
+def build_plan(
+    intent: EmailIntent,
+    has_original: bool = True,
+    run_tick_tie: Optional[bool] = None,
+    only_tick: Optional[bool] = None,
+) -> ExecutionPlan:
+    """
+    Workflows to run for `intent`. `run_tick_tie`/`only_tick` are explicit
+    requests (e.g. API form fields); when True they add to what the email asks.
+    """
+    wants_only_tick = bool(only_tick) or intent.only_tick
+    wants_tick_tie = wants_only_tick or bool(run_tick_tie) or intent.tick_tie
+
+    skipped: Dict[str, str] = {}
+    if wants_only_tick:
+        skipped[TAGS] = "only tick-and-tie requested"
+        skipped[EMAIL_COMMENTS] = "only tick-and-tie requested"
+    else:
+        if not has_original:
+            skipped[TAGS] = "no original deck to read tags from"
+        if not intent.actionable:
+            skipped[EMAIL_COMMENTS] = "email has no comments to check"
+    if not wants_tick_tie:
+        skipped[TICK_TIE] = "tick-and-tie not requested"
+
+    run = tuple(workflow for workflow in WORKFLOWS if workflow not in skipped)
+    return ExecutionPlan(intent, run, skipped)
+
+
+def plan_for_email(email_text: Optional[str], has_original: bool = True, **flags) -> ExecutionPlan:
+    return build_plan(parse_intent(email_text), has_original, **flags)
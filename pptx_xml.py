@@ -0,0 +1,397 @@
+"""
+Direct-XML PPTX text extraction.
+
+python-pptx builds a full object model for every part in the package,
+including media we never read. This reader opens the .pptx zip, follows
+the relationships from presentation.xml to each slide, its notes slide and
+its charts, and streams just those XML parts with lxml `iterparse`. The text
+it collects, and the order it collects it in, mirror `deck_parser`'s
+python-pptx walk exactly (`pptx_slide_struct`), as does the shape geometry,
+including placeholders that inherit their position from the layout/master.
+"""
+
+import posixpath
+import zipfile
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from lxml import etree
+
+from deck_model import slide_struct
+
+_NS = {
+    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+    "c": "http://schemas.openxmlformats.org/drawingml/2006/chart",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+_RT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+_TABLE_URI = "http://schemas.openxmlformats.org/drawingml/2006/table"
+_CHART_URI = "http://schemas.openxmlformats.org/drawingml/2006/chart"
+
+
+def _qn(tag: str) -> str:
+    prefix, local = tag.split(":")
+    return f"{{{_NS[prefix]}}}{local}"
+
+
+_SP = _qn("p:sp")
+_GRP_SP = _qn("p:grpSp")
+_GRAPHIC_FRAME = _qn("p:graphicFrame")
+_SP_TREE = _qn("p:spTree")
+_SHAPE_TAGS = {_SP, _GRP_SP, _GRAPHIC_FRAME, _qn("p:cxnSp"), _qn("p:pic"), _qn("p:contentPart")}
+_A_P = _qn("a:p")
+_A_R = _qn("a:r")
+_A_BR = _qn("a:br")
+_A_FLD = _qn("a:fld")
+_A_T = _qn("a:t")
+_R_ID = _qn("r:id")
+
+# Chart types python-pptx exposes data labels for (category series).
+_CATEGORY_CHART_TAGS = {
+    _qn(f"c:{name}") for name in (
+        "areaChart", "barChart", "doughnutChart", "lineChart", "pieChart", "radarChart",
+    )
+}
+_XY_CHART_TAGS = {_qn("c:scatterChart"), _qn("c:bubbleChart")}
+
+_CONTENT_PART = _qn("p:contentPart")
+_PIC = _qn("p:pic")
+# Layout placeholder type -> master placeholder type it inherits geometry from (python-pptx's table).
+_MASTER_PH_TYPE = {
+    "body": "body", "chart": "body", "clipArt": "body", "ctrTitle": "title", "dgm": "body",
+    "dt": "dt", "ftr": "ftr", "media": "body", "obj": "body", "pic": "body",
+    "sldNum": "sldNum", "subTitle": "body", "tbl": "body", "title": "title",
+}
+_NO_GEOMETRY = (None, None, None, None)
+
+
+def _paragraph_text(p) -> str:
+    """Same as python-pptx `_Paragraph.text`: runs and fields, `a:br` as \\v."""
+    parts: List[str] = []
+    for child in p:
+        if child.tag == _A_R or child.tag == _A_FLD:
+            t = child.find(_A_T)
+            parts.append((t.text or "") if t is not None else "")
+        elif child.tag == _A_BR:
+            parts.append("\v")
+    return "".join(parts)
+
+
+def _frame_lines(body) -> str:
+    """Non-empty stripped paragraphs joined by newlines (the shape-text rule)."""
+    if body is None:
+        return ""
+    return "\n".join(
+        text.strip()
+        for text in (_paragraph_text(p) for p in body.iterchildren(_A_P))
+        if text and text.strip()
+    )
+
+
+def _frame_text(body) -> str:
+    """Same as python-pptx `TextFrame.text`: every paragraph joined by newlines."""
+    if body is None:
+        return ""
+    return "\n".join(_paragraph_text(p) for p in body.iterchildren(_A_P))
+
+
+def _placeholder(element):
+    """The `p:ph` element of a shape (under its nv*Pr/p:nvPr), or None."""
+    return element.find("./*/p:nvPr/p:ph", _NS)
+
+
+def _own_geometry(element) -> tuple:
+    """(x, y, cx, cy) from the shape's own xfrm; None where not set."""
+    if element.tag == _GRAPHIC_FRAME:
+        xfrm = element.find("p:xfrm", _NS)
+    elif element.tag == _GRP_SP:
+        xfrm = element.find("p:grpSpPr/a:xfrm", _NS)
+    else:
+        xfrm = element.find("p:spPr/a:xfrm", _NS)
+    if xfrm is None:
+        return _NO_GEOMETRY
+    off = xfrm.find("a:off", _NS)
+    ext = xfrm.find("a:ext", _NS)
+    return (
+        int(off.get("x")) if off is not None else None,
+        int(off.get("y")) if off is not None else None,
+        int(ext.get("cx")) if ext is not None else None,
+        int(ext.get("cy")) if ext is not None else None,
+    )
+
+
+def _merge_geometry(own: tuple, base: tuple) -> tuple:
+    return tuple(value if value is not None else inherited for value, inherited in zip(own, base))
+
+
+def _color(parent) -> Optional[str]:
+    """Hex value or scheme colour name of the first colour child of `parent`."""
+    for child in parent:
+        if child.get("lastClr"):  # a:sysClr
+            return child.get("lastClr")
+        if child.get("val"):
+            return child.get("val")
+    return None
+
+
+def _shape_fill(element) -> Optional[str]:
+    """Solid fill colour, from the shape properties or, failing that, its style."""
+    fill_ref = element.find("p:style/a:fillRef", _NS)
+    style_color = None
+    if fill_ref is not None and fill_ref.get("idx", "0") != "0":
+        style_color = _color(fill_ref)
+    props = element.find("p:grpSpPr" if element.tag == _GRP_SP else "p:spPr", _NS)
+    if props is not None:
+        if props.find("a:noFill", _NS) is not None:
+            return None
+        solid = props.find("a:solidFill", _NS)
+        if solid is not None:
+            return _color(solid) or style_color or "solid"
+    return style_color
+
+
+def shape_box(element, z: int, geometry: tuple, texts: List[str]) -> Optional[dict]:
+    """Geometry record for one top-level shape, or None if its position is unknown."""
+    if element.tag == _CONTENT_PART or None in geometry:
+        return None
+    c_nv_pr = element.find("./*/p:cNvPr", _NS)
+    x, y, cx, cy = geometry
+    return {
+        "id": int(c_nv_pr.get("id", "0")) if c_nv_pr is not None else 0,
+        "name": c_nv_pr.get("name", "") if c_nv_pr is not None else "",
+        "kind": etree.QName(element).localname,
+        "z": z,
+        "x": x,
+        "y": y,
+        "cx": cx,
+        "cy": cy,
+        "fill": _shape_fill(element),
+        "placeholder": _placeholder(element) is not None,
+        "text": "\n".join(t for t in texts if t),
+    }
+
+
+class PptxXmlReader:
+    """Slide-at-a-time reader over the raw package."""
+
+    def __init__(self, path: str):
+        self._zip = zipfile.ZipFile(path)
+        self._names = set(self._zip.namelist())
+        self._placeholder_cache: Dict[str, list] = {}
+        self.slide_parts = self._slide_parts()
+
+    @property
+    def slide_count(self) -> int:
+        return len(self.slide_parts)
+
+    def close(self) -> None:
+        self._zip.close()
+
+    # ---------- Package plumbing ----------
+
+    def _rels(self, part: str) -> Dict[str, tuple]:
+        directory, name = posixpath.split(part)
+        rels_name = posixpath.join(directory, "_rels", f"{name}.rels")
+        if rels_name not in self._names:
+            return {}
+        rels: Dict[str, tuple] = {}
+        root = etree.fromstring(self._zip.read(rels_name))
+        for rel in root.iterchildren(_qn("rel:Relationship")):
+            if rel.get("TargetMode") == "External":
+                continue
+            target = rel.get("Target", "")
+            if target.startswith("/"):
+                resolved = target.lstrip("/")
+            else:
+                resolved = posixpath.normpath(posixpath.join(directory, target))
+            rels[rel.get("Id")] = (rel.get("Type", ""), resolved)
+        return rels
+
+    def _slide_parts(self) -> List[str]:
+        presentation = "ppt/presentation.xml"
+        rels = self._rels(presentation)
+        root = etree.fromstring(self._zip.read(presentation))
+        parts = []
+        for sld_id in root.iterfind("p:sldIdLst/p:sldId", _NS):
+            rel = rels.get(sld_id.get(_R_ID))
+            if rel and rel[1] in self._names:
+                parts.append(rel[1])
+        return parts
+
+    def _related(self, rels: Dict[str, tuple], rel_type: str) -> Optional[str]:
+        return next((target for kind, target in rels.values() if kind == _RT + rel_type), None)
+
+    def _placeholders(self, part: Optional[str]) -> list:
+        """(idx, type, element) for each top-level placeholder of a layout or master part."""
+        if part is None or part not in self._names:
+            return []
+        if part not in self._placeholder_cache:
+            found = []
+            tree = etree.fromstring(self._zip.read(part)).find("p:cSld/p:spTree", _NS)
+            for element in tree if tree is not None else ():
+                ph = _placeholder(element) if element.tag in _SHAPE_TAGS else None
+                if ph is not None:
+                    found.append((int(ph.get("idx", "0")), ph.get("type", "obj"), element))
+            self._placeholder_cache[part] = found
+        return self._placeholder_cache[part]
+
+    def _geometry(self, element, layout_part: Optional[str]) -> tuple:
+        """Effective geometry; slide placeholders fall back to layout, then master."""
+        own = _own_geometry(element)
+        ph = _placeholder(element)
+        if None not in own or ph is None or element.tag not in (_SP, _PIC):
+            return own
+        idx = int(ph.get("idx", "0"))
+        layout_ph = next((el for i, _, el in self._placeholders(layout_part) if i == idx), None)
+        if layout_ph is None:
+            return own
+        base = _own_geometry(layout_ph)
+        if None in base and layout_ph.tag == _SP:
+            master_type = _MASTER_PH_TYPE.get(_placeholder(layout_ph).get("type", "obj"))
+            if master_type is None:
+                return _NO_GEOMETRY
+            master_part = self._related(self._rels(layout_part), "slideMaster")
+            master_ph = next((el for _, t, el in self._placeholders(master_part) if t == master_type), None)
+            if master_ph is not None:
+                base = _merge_geometry(base, _own_geometry(master_ph))
+        return _merge_geometry(own, base)
+
+    def _iter_top_level_shapes(self, part: str) -> Iterator:
+        """Stream the part; yield each complete child element of `p:spTree`, then free it."""
+        depth_of_tree: Optional[int] = None
+        depth = 0
+        with self._zip.open(part) as stream:
+            for event, elem in etree.iterparse(stream, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if elem.tag == _SP_TREE and depth_of_tree is None:
+                        depth_of_tree = depth
+                    continue
+                depth -= 1
+                if depth_of_tree is not None and depth == depth_of_tree and elem.tag in _SHAPE_TAGS:
+                    yield elem
+                    elem.clear(keep_tail=True)
+                    parent = elem.getparent()
+                    while parent is not None and elem.getprevious() is not None:
+                        del parent[0]
+
+    # ---------- Text collection ----------
+
+    def _shape_texts(self, shape, rels: Dict[str, tuple]) -> List[Tuple[str, str]]:
+        texts: List[Tuple[str, str]] = []
+        tag = shape.tag
+        if tag == _GRP_SP:
+            for child in shape.iterchildren():
+                if child.tag in _SHAPE_TAGS:
+                    texts.extend(self._shape_texts(child, rels))
+        elif tag == _SP:
+            frame_text = _frame_lines(shape.find("p:txBody", _NS))
+            if frame_text:
+                texts.append(("text", frame_text))
+        elif tag == _GRAPHIC_FRAME:
+            graphic_data = shape.find("a:graphic/a:graphicData", _NS)
+            uri = graphic_data.get("uri") if graphic_data is not None else None
+            if uri == _TABLE_URI:
+                for tc in graphic_data.iterfind("a:tbl/a:tr/a:tc", _NS):
+                    cell_text = _frame_text(tc.find("a:txBody", _NS)).strip()
+                    if cell_text:
+                        texts.append(("tables", cell_text))
+            elif uri == _CHART_URI:
+                chart = graphic_data.find("c:chart", _NS)
+                rel = rels.get(chart.get(_R_ID)) if chart is not None else None
+                if rel and rel[1] in self._names:
+                    texts.extend(("charts", text) for text in self._chart_texts(rel[1]))
+        return texts
+
+    def _chart_texts(self, part: str) -> List[str]:
+        texts: List[str] = []
+        with self._zip.open(part) as stream:
+            root = etree.parse(stream).getroot()
+        chart = root.find("c:chart", _NS)
+        if chart is None:
+            return texts
+
+        title = chart.find("c:title", _NS)
+        if title is not None:
+            chart_title = _frame_text(title.find("c:tx/c:rich", _NS)).strip()
+            if chart_title:
+                texts.append(chart_title)
+
+        plot_area = chart.find("c:plotArea", _NS)
+        if plot_area is None:
+            return texts
+        for x_chart in plot_area.iterchildren():
+            if x_chart.tag in _XY_CHART_TAGS:
+                continue  # XY series expose no data labels in python-pptx
+            if x_chart.tag not in _CATEGORY_CHART_TAGS:
+                continue
+            sers = sorted(x_chart.iterfind("c:ser", _NS), key=_ser_order)
+            for ser in sers:
+                texts.extend(_data_label_texts(ser))
+        return texts
+
+    def _notes_text(self, rels: Dict[str, tuple]) -> str:
+        notes_part = self._related(rels, "notesSlide")
+        if notes_part is None or notes_part not in self._names:
+            return ""
+        for shape in self._iter_top_level_shapes(notes_part):
+            if shape.tag != _SP:
+                continue
+            ph = shape.find("p:nvSpPr/p:nvPr/p:ph", _NS)
+            if ph is None or ph.get("type") != "body":
+                continue
+            text = _frame_lines(shape.find("p:txBody", _NS))
+            return text
+        return ""
+
+    def slide_struct(self, index: int) -> dict:
+        """Struct for the 1-based slide `index`, identical to `pptx_slide_struct`."""
+        part = self.slide_parts[index - 1]
+        rels = self._rels(part)
+        layout_part = self._related(rels, "slideLayout")
+        parts: List[Tuple[str, str]] = []
+        shapes: List[dict] = []
+        for z, shape in enumerate(self._iter_top_level_shapes(part)):
+            shape_parts = self._shape_texts(shape, rels)
+            parts.extend(shape_parts)
+            box = shape_box(shape, z, self._geometry(shape, layout_part), [t for _, t in shape_parts])
+            if box:
+                shapes.append(box)
+        parts.append(("notes", self._notes_text(rels)))
+        return slide_struct(index, parts, shapes)
+
+
+def _ser_order(ser) -> int:
+    order = ser.find("c:order", _NS)
+    return int(order.get("val")) if order is not None else 0
+
+
+def _data_label_texts(ser) -> List[str]:
+    counts = ser.xpath("./c:cat//c:ptCount/@val", namespaces=_NS)
+    point_count = int(counts[0]) if counts else 0
+    labels = {}
+    for d_lbl in ser.iterfind("c:dLbls/c:dLbl", _NS):
+        idx = d_lbl.find("c:idx", _NS)
+        if idx is None:
+            continue
+        labels.setdefault(int(idx.get("val")), d_lbl)
+
+    texts: List[str] = []
+    for idx in range(point_count):
+        d_lbl = labels.get(idx)
+        rich = d_lbl.find("c:tx/c:rich", _NS) if d_lbl is not None else None
+        if rich is None:
+            continue
+        label_text = _frame_lines(rich)
+        if label_text:
+            texts.append(label_text)
+    return texts
+
+
+def pptx_to_struct_fast(path: str) -> dict:
+    reader = PptxXmlReader(path)
+    try:
+        return {"slides": [reader.slide_struct(i) for i in range(1, reader.slide_count + 1)]}
+    finally:
+        reader.close()
@@ -0,0 +1,191 @@
+"""
+Keep only the newest message of a reply email.
+
+Reviewers answer in-thread, so the plain-text body usually carries the whole
+quoted history, a signature block and a legal footer after the few lines of
+new comments. `parse_reply` removes, in one pass over the lines:
+
+- everything from a reply header on ("On ... wrote:", "-----Original
+  Message-----", an Outlook "From:/Sent:/To:" block or its underscore rule);
+- interleaved ">"-quoted lines (the unquoted answers between them are kept);
+- a signature after "-- ", "Sent from my ...", or after a sign-off line
+  ("Thanks," / "Best,") followed by a few name, title or contact lines.
+  Lines that mention a slide or an edit verb are never part of one;
+- a confidentiality/disclaimer footer.
+
+Forwarded messages are kept, since a forward is often how comments reach
+the bot: a "Forwarded message" / "Begin forwarded message" marker, or a
+header block whose subject starts with FW:/Fwd:, is not a reply header.
+Signatures and footers are stripped per message, so the forwarder's
+signature does not cut the forwarded body. If stripping would leave nothing
+actionable, the original text is kept. Every removed block is recorded so it
+can be logged.
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from planner import has_actionable_text, mentions_edit
+
+EMAIL_STRIP_QUOTED = os.getenv("EMAIL_STRIP_QUOTED", "1") == "1"
+
+QUOTED = "quoted"
+SIGNATURE = "signature"
+DISCLAIMER = "disclaimer"
+
+_ON_WROTE = re.compile(r"^\s*On\b.{0,300}\bwrote:\s*$", re.IGNORECASE)
+_ORIGINAL_MESSAGE = re.compile(r"^\s*-{2,}\s*Original Message\s*-{2,}\s*$", re.IGNORECASE)
+_RULE = re.compile(r"^\s*_{10,}\s*$")
+_HEADER_FROM = re.compile(r"^\s*\*?From:\*?\s+\S", re.IGNORECASE)
+_HEADER_FIELD = re.compile(r"^\s*\*?(Sent|Date|To|Cc|Subject):\*?\s", re.IGNORECASE)
+_FORWARD_MARKER = re.compile(r"^\s*(-{2,}\s*Forwarded message\s*-{2,}|Begin forwarded message:?)\s*$", re.IGNORECASE)
+_FORWARD_SUBJECT = re.compile(r"^\s*\*?Subject:\*?\s*(FW|FWD):", re.IGNORECASE)
+_QUOTE = re.compile(r"^\s*>")
+_SIG_DELIMITER = re.compile(r"^--\s?$")
+_MOBILE = re.compile(r"^\s*(Sent from my\b|Get Outlook for\b|Sent from Outlook\b)", re.IGNORECASE)
+_DISCLAIMER = re.compile(
+    r"^\s*(confidentiality notice|disclaimer\b|important notice|"
+    r"this (e-?mail|message|communication)\b.{0,80}\b(confidential|privileged|intended (only|solely))|"
+    r"the information (contained )?in this (e-?mail|message|communication))",
+    re.IGNORECASE,
+)
+_SIGN_OFF = re.compile(
+    r"^\s*(thanks|thank you|thx|best|best regards|kind regards|regards|cheers|many thanks|br)\s*[,!.]?\s*$",
+    re.IGNORECASE,
+)
+# Lines a signature block is made of: contact details, or a name / title / company line of
+# capitalized words ("Jane Doe", "Managing Director | XYZ Capital").
+_SIG_CONTACT = re.compile(
+    r"@|https?://|\bwww\.|\b(tel|phone|mobile|cell|fax|direct|office)\b|^\s*[A-Za-z]{1,2}:\s*[+(\d]|^[\s+().\d/-]{7,}$",
+    re.IGNORECASE,
+)
+_SIG_NAME_WORD = re.compile(r"^(?:[A-Z0-9][\w.'&-]*|of|and|&|at|the|for|[|,/–-])$")
+SIGNATURE_MAX_LINES = 6
+SIGNATURE_MAX_LINE_CHARS = 60
+
+
+@dataclass
+class Removed:
+    kind: str
+    text: str
+
+
+@dataclass
+class ParsedReply:
+    text: str
+    removed: List[Removed] = field(default_factory=list)
+
+    @property
+    def chars_removed(self) -> int:
+        return sum(len(block.text) for block in self.removed)
+
+    def summary(self) -> str:
+        parts = [f"{block.kind} ({len(block.text)} chars)" for block in self.removed]
+        return ", ".join(parts) if parts else "nothing"
+
+
+def _forward_at(lines: List[str], i: int) -> bool:
+    """A forward marker, or a header block that belongs to one (marker above it, or a FW:/Fwd: subject)."""
+    line = lines[i]
+    if _FORWARD_MARKER.match(line):
+        return True
+    if not (_HEADER_FROM.match(line) or _RULE.match(line) or _ORIGINAL_MESSAGE.match(line)):
+        return False
+    previous = [prev for prev in lines[max(0, i - 2):i] if prev.strip()]
+    if previous and _FORWARD_MARKER.match(previous[-1]):
+        return True
+    return any(_FORWARD_SUBJECT.match(following) for following in lines[i + 1:i + 7])
+
+
+def _reply_header_at(lines: List[str], i: int) -> bool:
+    line = lines[i]
+    if _forward_at(lines, i):
+        return False
+    if _ON_WROTE.match(line) or _ORIGINAL_MESSAGE.match(line):
+        return True
+    # Gmail wraps long "On ..., Name <addr> wrote:" headers onto a second line.
+    if line.strip().startswith("On ") and i + 1 < len(lines) and _ON_WROTE.match(f"{line} {lines[i + 1]}"):
+        return True
+    if _RULE.match(line) or _HEADER_FROM.match(line):
+        start = i + 1 if _RULE.match(line) else i
+        if start < len(lines) and _RULE.match(line) and not _HEADER_FROM.match(lines[start]):
+            return False
+        following = lines[start + 1:start + 5]
+        return sum(bool(_HEADER_FIELD.match(f)) for f in following) >= 2
+    return False
+
+
+def _signature_line(line: str) -> bool:
+    if len(line) > SIGNATURE_MAX_LINE_CHARS or mentions_edit(line):
+        return False
+    if _SIG_CONTACT.search(line):
+        return True
+    words = line.replace("|", " | ").replace(",", " , ").split()
+    return all(_SIG_NAME_WORD.match(word) for word in words)
+
+
+def _signature_start(lines: List[str]) -> Optional[int]:
+    """Index of the last sign-off line if only a short block of name/title/contact lines follows it."""
+    for i in range(len(lines) - 1, -1, -1):
+        if _SIGN_OFF.match(lines[i]):
+            tail = [line for line in lines[i + 1:] if line.strip()]
+            if 0 < len(tail) <= SIGNATURE_MAX_LINES and all(_signature_line(line) for line in tail):
+                return i + 1
+            return None
+    return None
+
+
+def _strip_footer(lines: List[str], removed: List[Removed]) -> List[str]:
+    """`lines` without a disclaimer footer and signature; what was cut is appended to `removed`."""
+    for i, line in enumerate(lines):
+        if _DISCLAIMER.match(line):
+            removed.append(Removed(DISCLAIMER, "\n".join(lines[i:])))
+            lines = lines[:i]
+            break
+    for i, line in enumerate(lines):
+        if _SIG_DELIMITER.match(line) or _MOBILE.match(line):
+            removed.append(Removed(SIGNATURE, "\n".join(lines[i:])))
+            return lines[:i]
+    start = _signature_start(lines)
+    if start is not None:
+        removed.append(Removed(SIGNATURE, "\n".join(lines[start:])))
+        return lines[:start]
+    return lines
+
+
+def parse_reply(text: Optional[str]) -> ParsedReply:
+    original = text or ""
+    lines = original.splitlines()
+    removed: List[Removed] = []
+
+    kept: List[str] = []
+    quoted: List[str] = []
+    for i, line in enumerate(lines):
+        if _reply_header_at(lines, i):
+            removed.append(Removed(QUOTED, "\n".join(lines[i:])))
+            break
+        if _QUOTE.match(line):
+            quoted.append(line)
+            continue
+        kept.append(line)
+    if quoted:
+        removed.insert(0, Removed(QUOTED, "\n".join(quoted)))
+
+    # The newest message and each message forwarded in it end in their own signature/footer.
+    starts = [0] + [i for i in range(1, len(kept)) if _forward_at(kept, i)]
+    messages = [kept[start:end] for start, end in zip(starts, starts[1:] + [len(kept)])]
+    kept = [line for message in messages for line in _strip_footer(message, removed)]
+
+    newest = "\n".join(kept).strip()
+    if not removed or (not has_actionable_text(newest) and has_actionable_text(original)):
+        return ParsedReply(original.strip())
+    return ParsedReply(newest, [block for block in removed if block.text.strip()])
+
+
+def newest_message(text: Optional[str]) -> ParsedReply:
+    """`parse_reply`, unless EMAIL_STRIP_QUOTED=0."""
+    if not EMAIL_STRIP_QUOTED:
+        return ParsedReply((text or "").strip())
+    return parse_reply(text)
@@ -0,0 +1,168 @@
+"""
+Order-aware alignment of original and revised slides.
+
+Revisions insert, delete and reorder slides, so original slide N is not
+necessarily revised slide N. `align_decks` scores every slide pair by
+TF-IDF cosine similarity over slide words (titles weighted up, identical
+slides scored 1.0). It then runs a weighted sequence alignment, an LCS-style
+DP vectorized one row at a time, to find the order-preserving matching with
+the highest total similarity. Slides left over on both sides are paired
+greedily as moved when they are still clearly similar. The rest are
+reported as deleted (original) or inserted (revised). Two 200-slide decks
+align in a few tens of milliseconds.
+"""
+
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from deck_model import SLIDE_FIELDS, DeckDocument, Slide
+
+# Minimum similarity for two slides to be aligned in order, and (stricter) to count as moved.
+ALIGN_MIN_SIMILARITY = float(os.getenv("ALIGN_MIN_SIMILARITY", "0.3"))
+MOVE_MIN_SIMILARITY = float(os.getenv("MOVE_MIN_SIMILARITY", "0.5"))
+TITLE_WEIGHT = 2
+
+_TOKEN = re.compile(r"[a-z]+|\d+(?:[.,]\d+)*")
+
+
+@lru_cache(maxsize=4096)
+def _slide_terms(slide: Slide) -> Counter:
+    tokens: List[str] = []
+    for name in SLIDE_FIELDS:
+        text = getattr(slide, name).lower()
+        if name == "text" and text:
+            title = text.split("\n", 1)[0]
+            tokens.extend(_TOKEN.findall(title) * (TITLE_WEIGHT - 1))
+        tokens.extend(_TOKEN.findall(text))
+    return Counter(tokens)
+
+
+def similarity_matrix(original: DeckDocument, revised: DeckDocument) -> np.ndarray:
+    """Cosine similarity of TF-IDF slide vectors, shape (len(original), len(revised))."""
+    slides = original.slides + revised.slides
+    vocab: Dict[str, int] = {}
+    rows: List[int] = []
+    ids: List[int] = []
+    counts: List[int] = []
+    for row, slide in enumerate(slides):
+        terms = _slide_terms(slide)
+        rows.extend([row] * len(terms))
+        ids.extend([vocab.setdefault(term, len(vocab)) for term in terms])
+        counts.extend(terms.values())
+    matrix = np.zeros((len(slides), max(1, len(vocab))), dtype=np.float32)
+    matrix[rows, ids] = counts
+    df = np.count_nonzero(matrix, axis=0)
+    matrix *= np.log((1 + len(slides)) / (1 + df)) + 1.0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1.0, norms)
+
+    n = len(original.slides)
+    sim = matrix[:n] @ matrix[n:].T
+    by_hash: Dict[str, List[int]] = {}
+    for j, slide in enumerate(revised.slides):
+        by_hash.setdefault(slide.content_hash, []).append(j)
+    for i, slide in enumerate(original.slides):
+        for j in by_hash.get(slide.content_hash, ()):
+            sim[i, j] = 1.0
+    return sim
+
+
+def _ordered_pairs(sim: np.ndarray, min_similarity: float) -> List[Tuple[int, int]]:
+    """Order-preserving matching (row, col) maximizing total similarity."""
+    n, m = sim.shape
+    gain = np.where(sim >= min_similarity, sim, -np.inf)
+    dp = np.zeros((n + 1, m + 1), dtype=np.float64)
+    for i in range(1, n + 1):
+        candidate = np.maximum(dp[i - 1, 1:], dp[i - 1, :-1] + gain[i - 1])
+        dp[i, 1:] = np.maximum.accumulate(np.maximum(candidate, dp[i, 0]))
+
+    pairs: List[Tuple[int, int]] = []
+    i, j = n, m
+    while i > 0 and j > 0:
+        if dp[i, j] == dp[i - 1, j]:
+            i -= 1
+        elif dp[i, j] == dp[i, j - 1]:
+            j -= 1
+        else:
+            pairs.append((i - 1, j - 1))
+            i, j = i - 1, j - 1
+    pairs.reverse()
+    return pairs
+
+
+@dataclass
+class SlideAlignment:
+    mapping: Dict[int, int] = field(default_factory=dict)       # original index -> revised index
+    similarity: Dict[int, float] = field(default_factory=dict)  # original index -> pair similarity
+    moved: List[Tuple[int, int]] = field(default_factory=list)
+    inserted: List[int] = field(default_factory=list)           # revised indices
+    deleted: List[int] = field(default_factory=list)            # original indices
+
+    def revised_for(self, original_index: int) -> Optional[int]:
+        return self.mapping.get(original_index)
+
+    def is_identity(self) -> bool:
+        return not (self.moved or self.inserted or self.deleted) and all(o == r for o, r in self.mapping.items())
+
+    def to_dict(self) -> dict:
+        return {
+            "mapping": {str(o): r for o, r in sorted(self.mapping.items())},
+            "moved": [list(pair) for pair in self.moved],
+            "inserted": list(self.inserted),
+            "deleted": list(self.deleted),
+        }
+
+    def summary(self) -> str:
+        shifted = sum(1 for o, r in self.mapping.items() if o != r)
+        return (
+            f"{len(self.mapping)} slide(s) aligned ({shifted} renumbered), {len(self.moved)} moved, "
+            f"{len(self.inserted)} inserted, {len(self.deleted)} deleted"
+        )
+
+
+def align(original: DeckDocument, revised: DeckDocument) -> SlideAlignment:
+    if not original.slides or not revised.slides:
+        return SlideAlignment(
+            inserted=[s.index for s in revised.slides],
+            deleted=[s.index for s in original.slides],
+        )
+    sim = similarity_matrix(original, revised)
+    result = SlideAlignment()
+    matched_rows, matched_cols = set(), set()
+    for row, col in _ordered_pairs(sim, ALIGN_MIN_SIMILARITY):
+        result.mapping[original.slides[row].index] = revised.slides[col].index
+        result.similarity[original.slides[row].index] = float(sim[row, col])
+        matched_rows.add(row)
+        matched_cols.add(col)
+
+    leftovers = sorted(
+        ((float(sim[r, c]), r, c)
+         for r in range(sim.shape[0]) if r not in matched_rows
+         for c in range(sim.shape[1]) if c not in matched_cols and sim[r, c] >= MOVE_MIN_SIMILARITY),
+        reverse=True,
+    )
+    for score, row, col in leftovers:
+        if row in matched_rows or col in matched_cols:
+            continue
+        o, r = original.slides[row].index, revised.slides[col].index
+        result.mapping[o], result.similarity[o] = r, score
+        result.moved.append((o, r))
+        matched_rows.add(row)
+        matched_cols.add(col)
+
+    result.moved.sort()
+    result.deleted = [s.index for i, s in enumerate(original.slides) if i not in matched_rows]
+    result.inserted = [s.index for i, s in enumerate(revised.slides) if i not in matched_cols]
+    return result
+
+
+@lru_cache(maxsize=8)
+def align_decks(original: DeckDocument, revised: DeckDocument) -> SlideAlignment:
+    """`align`, memoized so the tags and email workflows share one alignment per deck pair."""
+    return align(original, revised)
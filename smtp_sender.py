@@ -0,0 +1,166 @@
+"""
+Reusable SMTP session and durable outbox for review replies.
+
+`SMTPSender` keeps one authenticated SMTP_SSL connection open between
+replies and reconnects when the server has dropped it. Replies are first
+written to an outbox directory as .eml files and only removed once the
+server has accepted them, so a failed send is retried on the next flush
+instead of being lost.
+"""
+
+import hashlib
+import os
+import smtplib
+import ssl
+import threading
+import time
+import uuid
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from typing import List, Optional
+
+SMTP_PORT = int(os.getenv("EMAIL_SMTP_PORT", "465"))
+SMTP_TIMEOUT = float(os.getenv("EMAIL_SMTP_TIMEOUT", "30"))
+# Servers typically drop idle sessions after a few minutes; probe with NOOP past this.
+SMTP_IDLE_SECONDS = float(os.getenv("EMAIL_SMTP_IDLE_SECONDS", "120"))
+OUTBOX_DIR = os.getenv("EMAIL_OUTBOX_DIR", os.path.join(".bifocal", "outbox"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+
+_ATTEMPTS_HEADER = "X-Bifocal-Attempts"
+_RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError, ssl.SSLError)
+_SESSION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, smtplib.SMTPAuthenticationError)
+
+
+def _is_session_error(exc: BaseException) -> bool:
+    """The session itself failed, so every later message would fail the same way."""
+    # SMTPException subclasses OSError; only non-SMTP OSErrors are network failures.
+    return isinstance(exc, _SESSION_ERRORS) or (isinstance(exc, OSError) and not isinstance(exc, smtplib.SMTPException))
+
+
+class SMTPSender:
+    """A single long-lived, authenticated SMTP_SSL session."""
+
+    def __init__(self, host: str, username: str, password: str, port: int = SMTP_PORT):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self._server: Optional[smtplib.SMTP_SSL] = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP_SSL:
+        context = ssl.create_default_context()
+        server = smtplib.SMTP_SSL(self.host, self.port, context=context, timeout=SMTP_TIMEOUT)
+        try:
+            server.login(self.username, self.password)
+        except BaseException:
+            server.close()
+            raise
+        return server
+
+    def _session(self) -> smtplib.SMTP_SSL:
+        if self._server is not None and time.monotonic() - self._last_used > SMTP_IDLE_SECONDS:
+            try:
+                code, _ = self._server.noop()
+                if code != 250:
+                    raise smtplib.SMTPServerDisconnected(f"NOOP returned {code}")
+            except (smtplib.SMTPException, OSError):
+                self._drop()
+        if self._server is None:
+            self._server = self._connect()
+        return self._server
+
+    def _drop(self) -> None:
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def send(self, msg: EmailMessage) -> None:
+        """Send through the open session, reconnecting once if it went away."""
+        with self._lock:
+            try:
+                self._session().send_message(msg)
+            except _RECONNECT_ERRORS:
+                self._drop()
+                self._session().send_message(msg)
+            self._last_used = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            self._drop()
+
+
+class Outbox:
+    """Directory of pending replies; each file is removed once it has been sent."""
+
+    def __init__(self, directory: str = OUTBOX_DIR, max_attempts: int = OUTBOX_MAX_ATTEMPTS):
+        self.directory = directory
+        self.failed_directory = os.path.join(directory, "failed")
+        self.max_attempts = max_attempts
+
+    def enqueue(self, msg: EmailMessage, key: Optional[str] = None) -> str:
+        """
+        Write `msg` to the outbox and return its path. With a `key` (the
+        message ledger key), a reply for that key that is still pending is
+        replaced rather than queued twice.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        suffix = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] if key else uuid.uuid4().hex
+        existing = [path for path in self.pending() if path.endswith(f"-{suffix}.eml")]
+        path = existing[0] if existing else os.path.join(self.directory, f"{time.time_ns()}-{suffix}.eml")
+        self._write(path, msg)
+        return path
+
+    def pending(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".eml")
+        )
+
+    def flush(self, sender: SMTPSender) -> int:
+        """Send queued replies in order; returns how many were delivered."""
+        sent = 0
+        for path in self.pending():
+            with open(path, "rb") as f:
+                msg = BytesParser(policy=policy.default).parse(f)
+            attempts = int(msg.get(_ATTEMPTS_HEADER, "0"))
+            del msg[_ATTEMPTS_HEADER]
+            try:
+                sender.send(msg)
+            except (smtplib.SMTPException, OSError) as exc:
+                if _is_session_error(exc):
+                    # The server is unreachable or refusing us; that is not this reply's fault,
+                    # so leave it and the rest queued as they are.
+                    print(f"Failed to send {msg['Subject']!r} to {msg['To']}; leaving the outbox queued: {exc}")
+                    break
+                attempts += 1
+                print(f"Failed to send {msg['Subject']!r} to {msg['To']} (attempt {attempts}): {exc}")
+                msg[_ATTEMPTS_HEADER] = str(attempts)
+                if attempts >= self.max_attempts:
+                    os.makedirs(self.failed_directory, exist_ok=True)
+                    self._write(os.path.join(self.failed_directory, os.path.basename(path)), msg)
+                    os.unlink(path)
+                else:
+                    self._write(path, msg)
+                # Rejected message (e.g. refused recipient, 5xx on DATA): go on with the rest.
+                continue
+            os.unlink(path)
+            sent += 1
+            print(f"Sent coverage email to {msg['To']}")
+        return sent
+
+    @staticmethod
+    def _write(path: str, msg: EmailMessage) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(msg.as_bytes(policy=policy.SMTP))
+        os.replace(tmp_path, path)
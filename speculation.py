@@ -0,0 +1,20 @@
+"""
+Speculative start of extract_comments while comment_finder is still running.
+
+Most decks that reach comment_finder do contain tags, and extract_comments
+only starts once the finder says so. With TAGS_SPECULATIVE_EXTRACT=1 the
+tags graph (agent_workflow.py) declares the extraction node with
+`discard_if` on the finder (see workflow_engine.py), so both start together:
+
+- the finder says yes: the extraction's result is used, and the part of it
+  that overlapped the finder is latency saved;
+- the finder says no: the extraction is cancelled, or its finished result
+  thrown away. Those tokens are the cost of speculating.
+
+Each outcome is printed with its timings so the trade-off can be read off
+the logs. TAGS_SPECULATIVE_EXTRACT=0 restores the sequential flow.
+"""
+
+import os
+
+TAGS_SPECULATIVE_EXTRACT = os.getenv("TAGS_SPECULATIVE_EXTRACT", "1") == "1"
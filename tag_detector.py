@@ -0,0 +1,117 @@
+"""
+Find review tags from slide geometry.
+
+Reviewers mark up a deck by dropping small filled boxes ("tags") on top of
+the content they want changed. That layering is visible in the PPTX shape
+tree, so the tags can be found without a model: a tag is a filled, non-
+placeholder shape with text that sits above, and mostly on, a larger piece
+of content. Each tag is reported with the shape it covers.
+
+An ordinary callout ("10% CAGR" on a bar chart) has the same geometry, so
+by default (TAG_SEED_MODE=hint) the tags only point extract_comments at
+likely comments, and the model still decides. With shrink or skip they
+become the workflow's initial comment list and replace the model
+extraction.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+from deck_model import DeckDocument, ShapeBox
+
+# off: ignore geometry; hint: tags are passed to extract_comments as candidates;
+# shrink: tags replace comment_finder + extract_comments and missed_comments looks
+# for the rest; skip: tags are the whole extracted list.
+TAG_SEED_MODE = os.getenv("TAG_SEED_MODE", "hint")
+# Share of the tag's own area that must lie on the covered shape.
+TAG_MIN_OVERLAP = float(os.getenv("TAG_MIN_OVERLAP", "0.3"))
+
+_TAG_KINDS = {"sp"}
+_CONTENT_KINDS = {"graphicFrame", "pic"}
+
+
+@dataclass
+class OverlayTag:
+    slide_index: int
+    shape: ShapeBox
+    covers: ShapeBox
+    overlap: float
+
+    def to_comment(self, number: int) -> dict:
+        """Comment item in the shape the extraction agents produce, plus what the tag covers."""
+        covered = self.covers.text.replace("\n", " ").strip()
+        return {
+            "id": f"C{number}",
+            "text": self.shape.text,
+            "slide_refs": [self.slide_index],
+            "covers": f"{self.covers.name}: {covered[:120]}" if covered else self.covers.name,
+        }
+
+
+def _is_candidate(shape: ShapeBox) -> bool:
+    return (
+        shape.kind in _TAG_KINDS
+        and not shape.placeholder
+        and shape.fill is not None
+        and bool(shape.text.strip())
+        and shape.area > 0
+    )
+
+
+def _has_content(shape: ShapeBox) -> bool:
+    return bool(shape.text.strip()) or shape.kind in _CONTENT_KINDS
+
+
+def _covered_shape(tag: ShapeBox, shapes: List[ShapeBox], min_overlap: float) -> Optional[ShapeBox]:
+    best, best_area = None, 0
+    for shape in shapes:
+        if shape.z >= tag.z or shape.area <= tag.area or not _has_content(shape):
+            continue
+        area = tag.overlap_area(shape)
+        if area >= min_overlap * tag.area and (area > best_area or (area == best_area and shape.z > best.z)):
+            best, best_area = shape, area
+    return best
+
+
+def detect_tags(doc: DeckDocument, min_overlap: float = TAG_MIN_OVERLAP) -> List[OverlayTag]:
+    tags: List[OverlayTag] = []
+    for slide in doc.slides:
+        for shape in slide.shapes:
+            if not _is_candidate(shape):
+                continue
+            covered = _covered_shape(shape, list(slide.shapes), min_overlap)
+            if covered is not None:
+                tags.append(OverlayTag(slide.index, shape, covered, shape.overlap_area(covered) / shape.area))
+    return tags
+
+
+def _tag_comments(doc: DeckDocument) -> List[dict]:
+    tags = detect_tags(doc)
+    if tags:
+        slides = sorted({tag.slide_index for tag in tags})
+        print(f"Geometry: {len(tags)} overlay tag(s) on slide(s) {', '.join(map(str, slides))}")
+    return [tag.to_comment(number) for number, tag in enumerate(tags, start=1)]
+
+
+def tag_seed_comments(doc: DeckDocument, mode: str = TAG_SEED_MODE) -> List[dict]:
+    """Comment items for the tags workflow to start from (shrink/skip modes); empty otherwise."""
+    return _tag_comments(doc) if mode in ("shrink", "skip") else []
+
+
+def tag_hint_comments(doc: DeckDocument, mode: str = TAG_SEED_MODE) -> List[dict]:
+    """Tags to show extract_comments as candidates (hint mode); empty otherwise."""
+    return _tag_comments(doc) if mode == "hint" else []
+
+
+def hints_message(hints: List[dict]) -> dict:
+    """History item pointing extract_comments at the geometry tags."""
+    return {
+        "role": "user",
+        "content": (
+            "These filled boxes sit on top of slide content and may be review tags. Some may be ordinary "
+            "callouts or labels: include only the ones that are review comments, and keep looking for "
+            f"others: {json.dumps(hints)}"
+        ),
+    }
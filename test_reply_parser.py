@@ -0,0 +1,32 @@
+# test_reply_parser.py
+#
+# Cases for reply_parser.newest_message that have cut reviewer comments.
+
+from reply_parser import SIGNATURE, newest_message
+
+
+def test_comments_after_sign_off_are_kept():
+    text = (
+        "Please change the title on slide 3 to Q3 results.\n\n"
+        "Thanks,\n"
+        "Also on slide 5 remove the legend.\n"
+        "And fix the typo on slide 7.\n"
+    )
+    parsed = newest_message(text)
+    assert "remove the legend" in parsed.text
+    assert "fix the typo on slide 7" in parsed.text
+    assert all(block.kind != SIGNATURE for block in parsed.removed)
+
+
+def test_name_and_contact_block_is_a_signature():
+    text = (
+        "Please change the title on slide 3 to Q3 results.\n\n"
+        "Thanks,\n"
+        "Jane Doe\n"
+        "Managing Director | XYZ Capital\n"
+        "+1 (212) 555-0100\n"
+        "jane@xyz.com\n"
+    )
+    parsed = newest_message(text)
+    assert parsed.text == "Please change the title on slide 3 to Q3 results.\n\nThanks,"
+    assert [block.kind for block in parsed.removed] == [SIGNATURE]
@@ -0,0 +1,186 @@
+# train_comment_classifier.py
+#
+# Train and evaluate the local internal-comment classifier (comment_classifier.py).
+#
+#   python train_comment_classifier.py train labels.jsonl --out models/comment_classifier.npz
+#   python train_comment_classifier.py eval labels.jsonl --model models/comment_classifier.npz
+#
+# labels.jsonl holds one record per line, either a labeled line
+#   {"text": "pls update to Q3 numbers", "label": 1, "field": "text"}
+# or a labeled deck, whose lines are positive when they match one of its comments
+#   {"path": "decks/project_x_v3.pptx", "comments": ["pls update to Q3 numbers", ...]}
+#
+# Training needs TensorFlow/Keras (requirements.txt); evaluation and the
+# exported model only need numpy. Records are split into train/held-out by a
+# hash of their deck (or text), so lines of one deck never straddle the split.
+
+import argparse
+import json
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from comment_classifier import CommentClassifier, densify, featurize, iter_lines, normalize_text
+from deck_model import DeckDocument
+from deck_parser import attachment_to_struct
+
+HELD_OUT_BUCKETS = 5  # 1 in 5 groups is held out
+
+
+@dataclass
+class Example:
+    text: str
+    field: str
+    label: int
+    group: str
+
+
+def _is_comment(line: str, comments: List[str]) -> bool:
+    normalized = normalize_text(line).strip()
+    if len(normalized) < 4:
+        return False
+    return any(normalized == c or normalized in c or (len(c) >= 4 and c in normalized) for c in comments)
+
+
+def load_examples(path: str) -> List[Example]:
+    examples: List[Example] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "path" in record:
+                comments = [normalize_text(c).strip() for c in record.get("comments", [])]
+                struct = attachment_to_struct({"path": record["path"], "filename": record["path"]})
+                for _, field, text in iter_lines(DeckDocument.from_struct(struct)):
+                    examples.append(Example(text, field, int(_is_comment(text, comments)), record["path"]))
+            else:
+                text = record["text"]
+                examples.append(Example(text, record.get("field", "text"), int(record["label"]), record.get("group", text)))
+    return examples
+
+
+def split(examples: List[Example]) -> Tuple[List[Example], List[Example]]:
+    train, held_out = [], []
+    for example in examples:
+        bucket = zlib.crc32(example.group.encode("utf-8")) % HELD_OUT_BUCKETS
+        (held_out if bucket == 0 else train).append(example)
+    return train, held_out
+
+
+def _metrics(labels: np.ndarray, scores: np.ndarray, threshold: float) -> Dict[str, float]:
+    predicted = scores >= threshold
+    tp = int(np.sum(predicted & (labels == 1)))
+    fp = int(np.sum(predicted & (labels == 0)))
+    fn = int(np.sum(~predicted & (labels == 1)))
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+
+def best_threshold(labels: np.ndarray, scores: np.ndarray) -> float:
+    candidates = np.arange(0.05, 0.96, 0.05)
+    return float(max(candidates, key=lambda t: (_metrics(labels, scores, t)["f1"], -t)))
+
+
+def report(classifier: CommentClassifier, examples: List[Example]) -> None:
+    labels = np.array([e.label for e in examples])
+    start = time.perf_counter()
+    scores = classifier.predict_proba([e.text for e in examples], [e.field for e in examples])
+    elapsed = time.perf_counter() - start
+
+    m = _metrics(labels, scores, classifier.threshold)
+    print(f"{len(examples)} lines ({int(labels.sum())} comments), threshold {classifier.threshold:.2f}")
+    print(f"  precision {m['precision']:.3f}  recall {m['recall']:.3f}  f1 {m['f1']:.3f}")
+    print(f"  scoring: {elapsed * 1000:.1f} ms ({elapsed / max(1, len(examples)) * 1e6:.1f} us/line)")
+
+    decks: Dict[str, List[int]] = {}
+    for example, score in zip(examples, scores):
+        if example.group.lower().endswith((".pptx", ".pdf")):
+            deck = decks.setdefault(example.group, [0, 0])
+            deck[0] |= example.label
+            deck[1] |= int(score >= classifier.threshold)
+    if decks:
+        correct = sum(actual == predicted for actual, predicted in decks.values())
+        print(f"  has_internal_comments: {correct}/{len(decks)} decks correct")
+
+
+def train(examples: List[Example], dim: int, hidden: int, epochs: int, batch_size: int, seed: int) -> CommentClassifier:
+    import keras
+
+    keras.utils.set_random_seed(seed)
+    train_set, held_out = split(examples)
+    if not held_out:
+        train_set, held_out = examples, examples
+
+    features = featurize([e.text for e in train_set], [e.field for e in train_set], dim)
+    labels = np.array([e.label for e in train_set], dtype=np.float32)
+    positives = max(1.0, float(labels.sum()))
+    class_weight = {0: 1.0, 1: max(1.0, (len(labels) - positives) / positives)}
+
+    def batches():
+        rng = np.random.default_rng(seed)
+        while True:
+            order = rng.permutation(len(labels))
+            for start in range(0, len(order), batch_size):
+                rows = order[start:start + batch_size]
+                yield densify(*features, rows, dim), labels[rows]
+
+    model = keras.Sequential([
+        keras.Input(shape=(dim,)),
+        keras.layers.Dense(hidden, activation="relu", name="hidden"),
+        keras.layers.Dropout(0.2),
+        keras.layers.Dense(1, activation="sigmoid", name="output"),
+    ])
+    model.compile(optimizer=keras.optimizers.Adam(1e-3), loss="binary_crossentropy")
+    model.fit(
+        batches(),
+        steps_per_epoch=-(-len(labels) // batch_size),
+        epochs=epochs,
+        class_weight=class_weight,
+        verbose=2,
+    )
+
+    w1, b1 = model.get_layer("hidden").get_weights()
+    w2, b2 = model.get_layer("output").get_weights()
+    classifier = CommentClassifier(w1, b1, w2, b2)
+
+    held_labels = np.array([e.label for e in held_out])
+    held_scores = classifier.predict_proba([e.text for e in held_out], [e.field for e in held_out])
+    classifier.threshold = best_threshold(held_labels, held_scores)
+    print("Held-out evaluation:")
+    report(classifier, held_out)
+    return classifier
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train/evaluate the internal-comment classifier.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = sub.add_parser("train", help="train with Keras and export numpy weights")
+    train_parser.add_argument("labels")
+    train_parser.add_argument("--out", default="models/comment_classifier.npz")
+    train_parser.add_argument("--dim", type=int, default=1 << 14)
+    train_parser.add_argument("--hidden", type=int, default=32)
+    train_parser.add_argument("--epochs", type=int, default=8)
+    train_parser.add_argument("--batch-size", type=int, default=256)
+    train_parser.add_argument("--seed", type=int, default=7)
+
+    eval_parser = sub.add_parser("eval", help="score a labeled set with an exported model")
+    eval_parser.add_argument("labels")
+    eval_parser.add_argument("--model", default="models/comment_classifier.npz")
+    eval_parser.add_argument("--all", action="store_true", help="evaluate every record, not just the held-out split")
+
+    args = parser.parse_args()
+    examples = load_examples(args.labels)
+    if args.command == "train":
+        classifier = train(examples, args.dim, args.hidden, args.epochs, args.batch_size, args.seed)
+        classifier.save(args.out)
+        print(f"Saved {args.out}")
+    elif args.command == "eval":
+        classifier = CommentClassifier.load(args.model)
+        report(classifier, examples if args.all else (split(examples)[1] or examples))
@@ -0,0 +1,148 @@
+"""
+Single-pass, windowed tag extraction.
+
+The default tags pipeline makes two sequential full-deck passes:
+extract_comments, then missed_comments to catch what the first pass
+dropped. Most misses come from one pass reading a long deck at once. In
+windowed mode the original deck is cut into windows of TAGS_WINDOW_SLIDES
+slides instead. extract_comments runs on every window concurrently (at
+most TAGS_WINDOW_CONCURRENCY at a time), and the missed_comments pass is
+dropped. Each window's comments are tagged with their window, and the
+local compiler (comment_merge.py) merges the lists.
+
+Consecutive windows share TAGS_WINDOW_OVERLAP slides, so a tag near a
+window edge is read together with the slides around it. Every window
+still has a small output, so the 4096-token cap no longer cuts off the
+end of the comment list on 100+ slide decks. A comment found on a shared
+slide by both neighbouring windows is kept once. The result is in slide
+order, and each window's slides, comment count and time are printed.
+
+Two-pass stays the default (TAGS_EXTRACTION_MODE=two_pass) until
+`check_extraction_recall.py` shows windowed recall matching it on the
+stored decks. Then set TAGS_EXTRACTION_MODE=windowed.
+TAGS_EXTRACTION_MODE=auto windows only decks of at least
+TAGS_WINDOWED_MIN_SLIDES slides, where the single pass truncates.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Set, Tuple
+
+from comment_merge import COMMENT_DUPLICATE_SIMILARITY, content_words, similarity
+from deck_model import DeckDocument
+
+TWO_PASS = "two_pass"
+WINDOWED = "windowed"
+AUTO = "auto"
+TAGS_EXTRACTION_MODE = os.getenv("TAGS_EXTRACTION_MODE", TWO_PASS)
+TAGS_WINDOW_SLIDES = int(os.getenv("TAGS_WINDOW_SLIDES", "6"))
+TAGS_WINDOW_OVERLAP = int(os.getenv("TAGS_WINDOW_OVERLAP", "1"))
+TAGS_WINDOW_CONCURRENCY = int(os.getenv("TAGS_WINDOW_CONCURRENCY", "4"))
+TAGS_WINDOWED_MIN_SLIDES = int(os.getenv("TAGS_WINDOWED_MIN_SLIDES", "60"))
+
+ExtractWindow = Callable[[DeckDocument], Awaitable[List[Dict[str, Any]]]]
+
+
+def uses_windows(doc: DeckDocument, mode: str = TAGS_EXTRACTION_MODE) -> bool:
+    return mode == WINDOWED or (mode == AUTO and len(doc) >= TAGS_WINDOWED_MIN_SLIDES)
+
+
+def slide_windows(doc: DeckDocument, size: int = TAGS_WINDOW_SLIDES, overlap: int = TAGS_WINDOW_OVERLAP) -> List[DeckDocument]:
+    """Windows of `size` slides; consecutive windows share `overlap` slides."""
+    size = max(1, size)
+    step = max(1, size - max(0, overlap))
+    windows = []
+    for start in range(0, len(doc.slides), step):
+        windows.append(DeckDocument(doc.slides[start:start + size], doc.boilerplate))
+        if start + size >= len(doc.slides):
+            break
+    return windows
+
+
+def window_message(window: DeckDocument, total: int) -> dict:
+    """First input item of a window's extract_comments call (the slides themselves are in its instructions)."""
+    first, last = window.slides[0].index, window.slides[-1].index
+    return {
+        "role": "user",
+        "content": (
+            f"The original document you are given is slides {first}-{last} of a {total}-slide deck. Extract every comment "
+            "on these slides; slide_refs must use the slide numbers shown."
+        ),
+    }
+
+
+def _refs(comment: Dict[str, Any]) -> Set[int]:
+    refs = set()
+    for ref in comment.get("slide_refs") or []:
+        try:
+            refs.add(int(ref))
+        except (TypeError, ValueError):
+            continue
+    return refs
+
+
+def _same_comment(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    words_a, words_b = content_words(str(a.get("text") or "")), content_words(str(b.get("text") or ""))
+    return words_a == words_b or similarity(words_a, words_b)[0] >= COMMENT_DUPLICATE_SIMILARITY
+
+
+def merge_windows(windows: Sequence[DeckDocument], results: Sequence[List[Dict[str, Any]]]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    (comments in slide order, number dropped as boundary duplicates). A
+    comment on slides shared with the previous window is dropped when that
+    window already returned it. Comments without slide_refs sort at the
+    start of their window.
+    """
+    ordered: List[Tuple[int, int, Dict[str, Any]]] = []
+    dropped = 0
+    previous: List[Dict[str, Any]] = []
+    previous_slides: Set[int] = set()
+    for k, (window, items) in enumerate(zip(windows, results), start=1):
+        slides = {slide.index for slide in window.slides}
+        shared = previous_slides & slides
+        current = []
+        for n, comment in enumerate(items, start=1):
+            comment = {**comment, "id": f"W{k}-{n}"}
+            refs = _refs(comment)
+            if refs and refs <= shared and any(refs & _refs(other) and _same_comment(comment, other) for other in previous):
+                dropped += 1
+                continue
+            current.append(comment)
+            ordered.append((min(refs) if refs else window.slides[0].index, len(ordered), comment))
+        previous, previous_slides = current, slides
+    ordered.sort(key=lambda entry: entry[:2])
+    return [comment for _, _, comment in ordered], dropped
+
+
+async def extract_windowed(
+    doc: DeckDocument,
+    extract_window: ExtractWindow,
+    size: int = TAGS_WINDOW_SLIDES,
+    concurrency: int = TAGS_WINDOW_CONCURRENCY,
+    overlap: int = TAGS_WINDOW_OVERLAP,
+) -> List[Dict[str, Any]]:
+    """Comments from running `extract_window` over every window of `doc`, in slide order."""
+    windows = slide_windows(doc, size, overlap)
+    if not windows:
+        return []
+    limit = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(window: DeckDocument) -> List[Dict[str, Any]]:
+        async with limit:
+            started = time.perf_counter()
+            items = await extract_window(window)
+            print(
+                f"  window slides {window.slides[0].index}-{window.slides[-1].index}: "
+                f"{len(items)} comment(s) in {time.perf_counter() - started:.1f}s"
+            )
+            return items
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run(window) for window in windows))
+    comments, dropped = merge_windows(windows, results)
+    print(
+        f"Windowed extraction: {len(windows)} window(s) of up to {size} slides ({overlap} shared), "
+        f"{len(comments)} comment(s), {dropped} boundary duplicate(s) dropped, in {time.perf_counter() - start:.1f}s"
+    )
+    return comments
@@ -0,0 +1,308 @@
+"""
+Small DAG executor for the agent pipelines.
+
+Each pipeline (tags, email comments, tick & tie) is declared as a list of
+`Node`s. A node names the nodes (or run parameters) it reads, and it is
+called with their outputs as keyword arguments. `Workflow.run` starts every
+node at once, and each node waits only for its own inputs, so independent
+nodes run concurrently. Changing how a pipeline is scheduled means changing
+its graph, not its control flow.
+
+Per node:
+
+- `when`: a predicate over the inputs. When it is false the node is
+  skipped, and its output is None;
+- `timeout` and `retries`: agent nodes default to WORKFLOW_NODE_TIMEOUT
+  seconds (0 = none) and WORKFLOW_NODE_RETRIES retries, with
+  WORKFLOW_RETRY_BACKOFF seconds between attempts;
+- `cache_key`: when set, the output is kept in a process-wide LRU of
+  WORKFLOW_CACHE_SIZE entries under that key, and later runs reuse it.
+  Runs from concurrent API threads share it under a lock. Keys are kept
+  for the life of the entry, so use a digest rather than a whole deck;
+- `discard_if`: (guard node, predicate). The node starts without waiting
+  for the guard, and its output is published only once the guard has
+  finished. If the predicate holds for the guard's output, the node is
+  cancelled (or its finished result dropped) and its output is None.
+  This is how extract_comments runs speculatively next to comment_finder.
+
+`Workflow.run(deadline=...)` caps every attempt at the time the request
+has left (deadline.py). When the deadline passes or the request is
+cancelled, the nodes still running are cancelled and the run returns with
+`partial` set. The outputs of the nodes that finished are kept.
+
+Every run records per-node status, attempts and timings, and prints one
+summary line.
+"""
+
+import asyncio
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+from agents import Agent, RunConfig, Runner, TResponseInputItem
+
+from deadline import Deadline, DeadlineExceeded
+
+WORKFLOW_NODE_RETRIES = int(os.getenv("WORKFLOW_NODE_RETRIES", "1"))
+WORKFLOW_NODE_TIMEOUT = float(os.getenv("WORKFLOW_NODE_TIMEOUT", "0"))
+WORKFLOW_RETRY_BACKOFF = float(os.getenv("WORKFLOW_RETRY_BACKOFF", "1.0"))
+WORKFLOW_CACHE_SIZE = int(os.getenv("WORKFLOW_CACHE_SIZE", "64"))
+
+OK = "ok"
+CACHED = "cached"
+SKIPPED = "skipped"
+DISCARDED = "discarded"
+CANCELLED = "cancelled"
+FAILED = "failed"
+UNFINISHED = "unfinished"
+
+_cache: "OrderedDict[Tuple[str, str, Hashable], Any]" = OrderedDict()
+_cache_lock = threading.Lock()  # each /analyze thread runs its own event loop
+
+
+def _cache_get(key: Tuple[str, str, Hashable]) -> Tuple[bool, Any]:
+    with _cache_lock:
+        if key not in _cache:
+            return False, None
+        _cache.move_to_end(key)
+        return True, _cache[key]
+
+
+def _cache_put(key: Tuple[str, str, Hashable], value: Any) -> None:
+    with _cache_lock:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > WORKFLOW_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+@dataclass
+class Node:
+    name: str
+    run: Callable[..., Any]  # sync or async; called with the outputs of `inputs` as keywords
+    inputs: Tuple[str, ...] = ()
+    when: Optional[Callable[..., bool]] = None
+    timeout: Optional[float] = None
+    retries: int = 0
+    cache_key: Optional[Callable[..., Hashable]] = None
+    discard_if: Optional[Tuple[str, Callable[[Any], bool]]] = None
+
+
+def agent_node(name: str, run: Callable[..., Any], inputs: Tuple[str, ...] = (), **options: Any) -> Node:
+    """A node that calls a model: retried and timed out per the WORKFLOW_NODE_* settings."""
+    options.setdefault("retries", WORKFLOW_NODE_RETRIES)
+    options.setdefault("timeout", WORKFLOW_NODE_TIMEOUT or None)
+    return Node(name, run, inputs, **options)
+
+
+@dataclass
+class AgentOutput:
+    parsed: Dict[str, Any]
+    items: List[TResponseInputItem]  # new conversation items, for downstream inputs
+
+
+def user_message(text: str) -> TResponseInputItem:
+    return {"role": "user", "content": [{"type": "input_text", "text": text}]}
+
+
+async def run_agent(agent: Agent, input: Sequence[TResponseInputItem], workflow_id: str, context: Any = None) -> AgentOutput:
+    result = await Runner.run(
+        agent,
+        input=[*input],
+        run_config=RunConfig(trace_metadata={
+            "__trace_source__": "agent-builder",
+            "workflow_id": workflow_id,
+        }),
+        context=context,
+    )
+    return AgentOutput(result.final_output.model_dump(), [item.to_input_item() for item in result.new_items])
+
+
+@dataclass
+class NodeTiming:
+    status: str
+    started: float = 0.0  # seconds after the run started
+    seconds: float = 0.0
+    attempts: int = 0
+
+    def describe(self, name: str) -> str:
+        if self.status in (SKIPPED, UNFINISHED) and not self.attempts:
+            return f"{name} {self.status}"
+        retried = f", {self.attempts} attempts" if self.attempts > 1 else ""
+        status = "" if self.status == OK else f" {self.status}"
+        return f"{name} {self.seconds:.1f}s{status}{retried}"
+
+
+@dataclass
+class WorkflowRun:
+    outputs: Dict[str, Any]
+    timings: Dict[str, NodeTiming] = field(default_factory=dict)
+    seconds: float = 0.0
+    deadline: Optional[Deadline] = None
+    stopped: Optional[str] = None  # why the run ended early, when it did
+
+    @property
+    def partial(self) -> bool:
+        return self.stopped is not None
+
+    def partial_info(self) -> Dict[str, Any]:
+        """What a partial response reports: the reason and the stages that did / did not finish."""
+        return {
+            "reason": self.stopped,
+            "finished": [name for name, timing in self.timings.items() if timing.status != UNFINISHED],
+            "unfinished": [name for name, timing in self.timings.items() if timing.status == UNFINISHED],
+        }
+
+
+class Workflow:
+    def __init__(self, name: str, nodes: Sequence[Node]):
+        self.name = name
+        self.nodes = {node.name: node for node in nodes}
+        for node in nodes:
+            refs = list(node.inputs) + ([node.discard_if[0]] if node.discard_if else [])
+            for ref in refs:
+                if ref in self.nodes and list(self.nodes).index(ref) >= list(self.nodes).index(node.name):
+                    raise ValueError(f"{self.name}: node {node.name!r} reads {ref!r}, which is declared after it")
+
+    async def run(self, deadline: Optional[Deadline] = None, **params: Any) -> WorkflowRun:
+        """
+        Run every node. A node failure cancels the rest and is raised; the
+        deadline passing cancels the rest and returns a partial run.
+        """
+        run = WorkflowRun(outputs=dict(params), deadline=deadline)
+        done = {name: asyncio.Event() for name in self.nodes}
+        failed = set()
+        start = time.perf_counter()
+
+        async def execute(node: Node) -> None:
+            try:
+                await self._execute(node, run, done, failed, start)
+            except BaseException:
+                failed.add(node.name)
+                raise
+            finally:
+                done[node.name].set()
+
+        tasks = [asyncio.ensure_future(execute(node)) for node in self.nodes.values()]
+        gathered = asyncio.gather(*tasks)
+        try:
+            if deadline is not None:
+                watcher = asyncio.ensure_future(deadline.wait())
+                try:
+                    await asyncio.wait({gathered, watcher}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    watcher.cancel()
+                if not gathered.done():
+                    raise DeadlineExceeded(deadline.reason())
+            await gathered
+        except DeadlineExceeded as exc:
+            await self._cancel(tasks)
+            await asyncio.gather(gathered, return_exceptions=True)  # retrieve its CancelledError
+            run.stopped = str(exc)
+            for name in self.nodes:
+                if name not in run.outputs:
+                    run.timings.setdefault(name, NodeTiming(UNFINISHED, time.perf_counter() - start)).status = UNFINISHED
+            print(f"Workflow {self.name}: stopped early ({run.stopped})")
+        except BaseException:
+            await self._cancel(tasks)
+            raise
+        finally:
+            run.seconds = time.perf_counter() - start
+            summary = ", ".join(run.timings[name].describe(name) for name in self.nodes if name in run.timings)
+            print(f"Workflow {self.name}: {summary}; total {run.seconds:.1f}s")
+        return run
+
+    @staticmethod
+    async def _cancel(tasks: List["asyncio.Future[Any]"]) -> None:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _execute(self, node: Node, run: WorkflowRun, done: Dict[str, asyncio.Event], failed: Set[str], start: float) -> None:
+        for name in node.inputs:
+            if name in done:
+                await done[name].wait()
+        if failed.intersection(node.inputs):
+            return  # the run is being torn down
+        kwargs = {name: run.outputs.get(name) for name in node.inputs}
+        if node.when is not None and not node.when(**kwargs):
+            run.outputs[node.name] = None
+            run.timings[node.name] = NodeTiming(SKIPPED, time.perf_counter() - start)
+            return
+        timing = run.timings[node.name] = NodeTiming(OK, time.perf_counter() - start)
+        key = (self.name, node.name, node.cache_key(**kwargs)) if node.cache_key and WORKFLOW_CACHE_SIZE > 0 else None
+        if key is not None:
+            hit, cached = _cache_get(key)
+            if hit:
+                run.outputs[node.name] = cached
+                timing.status = CACHED
+                return
+
+        work = asyncio.ensure_future(self._attempts(node, kwargs, timing, run.deadline))
+        if node.discard_if is not None:
+            guard, predicate = node.discard_if
+            try:
+                await done[guard].wait()
+            except BaseException:
+                work.cancel()
+                raise
+            if predicate(run.outputs.get(guard)):
+                finished = work.done()
+                work.cancel()
+                await asyncio.gather(work, return_exceptions=True)
+                run.outputs[node.name] = None
+                timing.status = DISCARDED if finished else CANCELLED
+                timing.seconds = time.perf_counter() - start - timing.started
+                print(
+                    f"Speculative {node.name}: {'result discarded' if finished else 'cancelled'} "
+                    f"after {timing.seconds:.1f}s ({guard} said it was not needed)"
+                )
+                return
+            output = await work
+            guard_timing = run.timings.get(guard)
+            if guard_timing is not None and guard_timing.status == OK:
+                guard_end = guard_timing.started + guard_timing.seconds
+                overlapped = max(0.0, min(guard_end, timing.started + timing.seconds) - timing.started)
+                print(f"Speculative {node.name}: used, {overlapped:.1f}s of {timing.seconds:.1f}s overlapped with {guard}")
+        else:
+            output = await work
+        run.outputs[node.name] = output
+        if key is not None:
+            _cache_put(key, output)
+
+    async def _attempts(self, node: Node, kwargs: Dict[str, Any], timing: NodeTiming, deadline: Optional[Deadline]) -> Any:
+        started = time.perf_counter()
+        try:
+            for attempt in range(node.retries + 1):
+                timing.attempts = attempt + 1
+                limit = node.timeout
+                if deadline is not None:
+                    deadline.check()
+                    limit = min(limit, deadline.remaining()) if limit else deadline.remaining()
+                try:
+                    result = node.run(**kwargs)
+                    if inspect.isawaitable(result):
+                        result = await asyncio.wait_for(result, limit) if limit else await result
+                    return result
+                except asyncio.TimeoutError:
+                    if deadline is not None:
+                        deadline.check()  # out of request time: no retry
+                    if attempt == node.retries:
+                        timing.status = FAILED
+                        raise
+                    print(f"Workflow {self.name}: {node.name} timed out after {limit:.1f}s; retrying")
+                except DeadlineExceeded:
+                    raise
+                except Exception as exc:
+                    if attempt == node.retries:
+                        timing.status = FAILED
+                        raise
+                    print(f"Workflow {self.name}: {node.name} attempt {attempt + 1} failed ({type(exc).__name__}: {exc}); retrying")
+                backoff = WORKFLOW_RETRY_BACKOFF * (attempt + 1)
+                await asyncio.sleep(min(backoff, deadline.remaining()) if deadline is not None else backoff)
+        finally:
+            timing.seconds = time.perf_counter() - started